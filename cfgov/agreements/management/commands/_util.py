@@ -1,11 +1,19 @@
+import hashlib
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from django.utils.encoding import force_str
 from django.utils.text import slugify
 
 import boto3
+from botocore.exceptions import ClientError
 
-from agreements.models import Issuer
+from agreements.models import Agreement, Issuer
+
+
+URI_HOSTNAME = 'https://files.consumerfinance.gov'
+S3_PREFIX = 'a/assets/credit-card-agreements/pdf/'
+BATCH_SIZE = 1000
 
 
 def s3_safe_key(path, prefix=''):
@@ -17,18 +25,63 @@ def s3_safe_key(path, prefix=''):
     return key
 
 
-def upload_to_s3(pdf_obj, s3_key):
-    AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME')
+def get_s3_client():
     AWS_S3_ACCESS_KEY_ID = os.environ.get('AWS_S3_ACCESS_KEY_ID')
     AWS_S3_SECRET_ACCESS_KEY = os.environ.get('AWS_S3_SECRET_ACCESS_KEY')
 
-    s3_client = boto3.client('s3',
-                             aws_access_key_id=AWS_S3_ACCESS_KEY_ID,
-                             aws_secret_access_key=AWS_S3_SECRET_ACCESS_KEY)
+    return boto3.client('s3',
+                        aws_access_key_id=AWS_S3_ACCESS_KEY_ID,
+                        aws_secret_access_key=AWS_S3_SECRET_ACCESS_KEY)
+
 
+def upload_to_s3(pdf_obj, s3_key):
+    AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME')
+    s3_client = get_s3_client()
     s3_client.upload_fileobj(pdf_obj, AWS_STORAGE_BUCKET_NAME, s3_key)
 
 
+def s3_object_matches(s3_client, bucket, s3_key, data):
+    """Check whether S3 already has this exact data at s3_key.
+
+    Compares the object's size and then its ETag, which is the MD5 of
+    objects uploaded in a single part.
+    """
+    try:
+        response = s3_client.head_object(Bucket=bucket, Key=s3_key)
+    except ClientError:
+        return False
+    if response['ContentLength'] != len(data):
+        return False
+    return response['ETag'].strip('"') == hashlib.md5(data).hexdigest()
+
+
+def upload_agreements(agreements_zip, uploads, max_workers, s3_client=None):
+    """Upload (pdf_path, s3_key) pairs from a zip file concurrently.
+
+    Up to max_workers threads read zip members and upload them through a
+    single shared S3 client. Files already on S3 with the same size and
+    ETag are skipped.
+
+    Yields (s3_key, uploaded) pairs as uploads finish, in order.
+    """
+    bucket = os.environ.get('AWS_STORAGE_BUCKET_NAME')
+    s3_client = s3_client or get_s3_client()
+
+    def upload(item):
+        pdf_path, s3_key = item
+        with agreements_zip.open(agreements_zip.getinfo(pdf_path)) as f:
+            data = f.read()
+        if s3_object_matches(s3_client, bucket, s3_key, data):
+            return s3_key, False
+        # A single-part upload keeps the ETag an MD5 of the content.
+        s3_client.put_object(Bucket=bucket, Key=s3_key, Body=data)
+        return s3_key, True
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for result in executor.map(upload, uploads):
+            yield result
+
+
 def get_issuer(name):
     slug = slugify(name)
     try:
@@ -41,8 +94,8 @@ def get_issuer(name):
 
 def save_agreement(agreements_zip, pdf_path, outfile,
                    upload=False):
-    uri_hostname = 'https://files.consumerfinance.gov'
-    s3_prefix = 'a/assets/credit-card-agreements/pdf/'
+    uri_hostname = URI_HOSTNAME
+    s3_prefix = S3_PREFIX
 
     zipinfo = agreements_zip.getinfo(pdf_path)
 
@@ -73,3 +126,58 @@ def save_agreement(agreements_zip, pdf_path, outfile,
         ))
 
     return agreement
+
+
+def save_agreements(agreements_zip, pdf_paths, outfile, upload=False,
+                    max_workers=8):
+    """Save agreements for many PDFs with bulk inserts.
+
+    Matches calling save_agreement for each PDF in an empty database, but
+    issuers and agreements are each inserted with bulk_create, and PDFs
+    are uploaded concurrently with upload_agreements.
+
+    Returns the saved agreements.
+    """
+    issuers = {}
+    agreements = []
+    uploads = []
+    for pdf_path in pdf_paths:
+        zipinfo = agreements_zip.getinfo(pdf_path)
+        path = force_str(pdf_path)
+
+        try:
+            issuer_name, filename = path.split('/')
+        except ValueError:
+            # too many slashes...
+            outfile.write("%s Does not match issuer/file.pdf pattern" % path)
+            continue
+
+        slug = slugify(issuer_name)
+        if slug not in issuers:
+            issuers[slug] = Issuer(slug=slug, name=issuer_name)
+        s3_key = s3_safe_key(path, prefix=S3_PREFIX)
+
+        agreements.append(Agreement(
+            issuer=issuers[slug],
+            file_name=filename,
+            size=int(zipinfo.file_size),
+            uri="{}/{}".format(URI_HOSTNAME, s3_key),
+            description=filename))
+        uploads.append((pdf_path, s3_key))
+
+    Issuer.objects.bulk_create(issuers.values(), batch_size=BATCH_SIZE)
+    for agreement in agreements:
+        # Point at the issuers' primary keys, set by bulk_create.
+        agreement.issuer = agreement.issuer
+    Agreement.objects.bulk_create(agreements, batch_size=BATCH_SIZE)
+
+    if upload:
+        for s3_key, uploaded in upload_agreements(
+            agreements_zip, uploads, max_workers
+        ):
+            outfile.write(u'{} {}'.format(
+                repr(s3_key),
+                'uploaded' if uploaded else 'unchanged',
+            ))
+
+    return agreements
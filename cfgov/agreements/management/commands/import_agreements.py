@@ -39,6 +39,18 @@ class Command(BaseCommand):
             help='DEPRECATED. Will process a zip file created via Windows, '
                  'assuming windows-1252 encoding.'
         )
+        parser.add_argument(
+            '--parallel',
+            action='store_true',
+            help='Insert agreements in bulk and upload PDFs concurrently, '
+                 'skipping PDFs that are unchanged on S3.'
+        )
+        parser.add_argument(
+            '--max-workers',
+            type=int,
+            default=8,
+            help='Number of concurrent uploads when using --parallel'
+        )
 
     def handle(self, *args, **options):
         # maybe this should be replaced with a CLI options:
@@ -73,6 +85,15 @@ class Command(BaseCommand):
         else:
             output_file = open(os.devnull, 'a')
 
+        if options['parallel']:
+            _util.save_agreements(
+                agreements_zip,
+                all_pdfs,
+                output_file,
+                upload=do_upload,
+                max_workers=options['max_workers'])
+            return
+
         for pdf_path in all_pdfs:
             _util.save_agreement(
                 agreements_zip,
@@ -9,9 +9,12 @@ from django.core import management
 from django.core.management.base import CommandError
 from django.test import TestCase
 
+import boto3
+import moto
+
 from agreements.management.commands import _util
 from agreements.management.commands.import_agreements import empty_folder_test
-from agreements.models import Issuer
+from agreements.models import Agreement, Issuer
 
 
 empty_folder_zip = os.path.dirname(__file__) + '/empty-folder-agreements.zip'
@@ -57,6 +60,78 @@ class TestDataLoad(TestCase):
         )
         self.assertIn('uploaded', buf.getvalue())
 
+    def test_import_parallel_no_s3(self):
+        management.call_command(
+            'import_agreements',
+            '--path=' + utf8_zip,
+            '--parallel',
+            verbosity=0
+        )
+        self.assertEqual(Issuer.objects.count(), 1)
+        agreement = Agreement.objects.get()
+        self.assertEqual(agreement.issuer.slug, 'utf_agreements')
+        self.assertEqual(agreement.size, 361432)
+        self.assertEqual(
+            agreement.uri,
+            'https://files.consumerfinance.gov/a/assets/'
+            'credit-card-agreements/pdf/UTF_agreements/'
+            'Visa_Cardholder_Agreement_and_Disclosures.pdf'
+        )
+
+
+class TestParallelUpload(TestCase):
+    key = (
+        'a/assets/credit-card-agreements/pdf/UTF_agreements/'
+        'Visa_Cardholder_Agreement_and_Disclosures.pdf'
+    )
+
+    def setUp(self):
+        environ = mock.patch.dict(os.environ, {
+            'AGREEMENTS_S3_UPLOAD_ENABLED': 'yes',
+            'AWS_S3_ACCESS_KEY_ID': 'fake',
+            'AWS_S3_SECRET_ACCESS_KEY': 'fake',
+            'AWS_STORAGE_BUCKET_NAME': 'agreements',
+        })
+        environ.start()
+        self.addCleanup(environ.stop)
+
+        mock_s3 = moto.mock_s3()
+        mock_s3.start()
+        self.addCleanup(mock_s3.stop)
+
+        self.bucket = boto3.resource('s3').Bucket('agreements')
+        self.bucket.create(ACL='private')
+
+    def call_command(self):
+        buf = io.StringIO()
+        management.call_command(
+            'import_agreements',
+            '--path=' + utf8_zip,
+            '--parallel',
+            '--max-workers=2',
+            stdout=buf
+        )
+        return buf.getvalue()
+
+    def test_uploads_pdf(self):
+        output = self.call_command()
+        self.assertIn('uploaded', output)
+        obj = self.bucket.Object(self.key)
+        self.assertEqual(obj.content_length, 361432)
+
+    def test_skips_unchanged_pdf(self):
+        self.call_command()
+        output = self.call_command()
+        self.assertIn('unchanged', output)
+        self.assertNotIn('uploaded', output)
+        self.assertEqual(Agreement.objects.count(), 1)
+
+    def test_uploads_changed_pdf(self):
+        self.bucket.put_object(Key=self.key, Body=b'Not a real PDF')
+        self.assertIn('uploaded', self.call_command())
+        obj = self.bucket.Object(self.key)
+        self.assertEqual(obj.content_length, 361432)
+
 
 class TestManagementUtils(TestCase):
 
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2020-09-15 14:02
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+def populate_search_tag_list(apps, schema_editor):
+    AnswerPage = apps.get_model('ask_cfpb', 'AnswerPage')
+    for page in AnswerPage.objects.exclude(search_tags='').only(
+        'pk', 'search_tags'
+    ).iterator():
+        page.search_tag_list = [
+            tag.strip() for tag in page.search_tags.split(',') if tag.strip()
+        ]
+        page.save(update_fields=['search_tag_list'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ask_cfpb', '0042_share_and_print_help'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answerpage',
+            name='search_tag_list',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=1000), blank=True, default=list, editable=False, help_text='Cleaned search tags, kept in sync with search_tags for indexed tag lookups', size=None),
+        ),
+        migrations.AddIndex(
+            model_name='answerpage',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_tag_list'], name='answerpage_search_tags_gin'),
+        ),
+        migrations.RunPython(
+            populate_search_tag_list, migrations.RunPython.noop
+        ),
+    ]
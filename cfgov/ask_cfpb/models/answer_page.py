@@ -1,4 +1,6 @@
 from django import forms
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.utils.html import strip_tags
 from django.utils.text import Truncator
@@ -149,6 +151,13 @@ class AnswerPage(CFGOVPage):
         max_length=1000,
         blank=True,
         help_text="Search words or phrases, separated by commas")
+    search_tag_list = ArrayField(
+        models.CharField(max_length=1000),
+        default=list,
+        blank=True,
+        editable=False,
+        help_text="Cleaned search tags, kept in sync with search_tags "
+                  "for indexed tag lookups")
     related_resource = models.ForeignKey(
         RelatedResource,
         blank=True,
@@ -253,6 +262,14 @@ class AnswerPage(CFGOVPage):
 
     objects = CFGOVPageManager()
 
+    class Meta:
+        indexes = [
+            GinIndex(
+                fields=['search_tag_list'],
+                name='answerpage_search_tags_gin'
+            ),
+        ]
+
     def get_sibling_url(self):
         if self.answer_base:
             if self.language == 'es':
@@ -356,6 +373,13 @@ class AnswerPage(CFGOVPage):
             for tag in self.search_tags.split(",")
         ]
 
+    def save(self, *args, **kwargs):
+        self.search_tag_list = [tag for tag in self.clean_search_tags if tag]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'search_tags' in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['search_tag_list']
+        return super(AnswerPage, self).save(*args, **kwargs)
+
     @property
     def status_string(self):
         if self.redirect_to_page:
@@ -23,6 +23,7 @@ from modelcluster.fields import ParentalKey
 from ask_cfpb.documents import AnswerPageDocument
 from ask_cfpb.models.answer_page import AnswerPage
 from ask_cfpb.models.search import AnswerPageSearch
+from search.elasticsearch_helpers import get_page_number
 from v1 import blocks as v1_blocks
 from v1.atomic_elements import molecules, organisms
 from v1.models import (
@@ -112,11 +113,7 @@ def validate_page_number(request, paginator):
     catching invalid page numbers and always returning
     a valid page number, defaulting to 1.
     """
-    raw_page = request.GET.get('page', 1)
-    try:
-        page_number = int(raw_page)
-    except ValueError:
-        page_number = 1
+    page_number = get_page_number(request, paginator.per_page)
     try:
         paginator.page(page_number)
     except InvalidPage:
@@ -209,6 +206,7 @@ class PortalSearchPage(
     query_base = None
     glossary_terms = None
     category_slug = None
+    results_per_page = 10
     overview = models.TextField(blank=True)
     content_panels = CFGOVPage.content_panels + [
         FieldPanel('portal_topic'),
@@ -326,15 +324,15 @@ class PortalSearchPage(
             search_term=search_term,
             base_query=self.query_base,
             language=self.language)
-        response = search.search()
-        if not response['results']:
-            response = search.suggest()
+        response = search.paged_search(
+            get_page_number(request, self.results_per_page),
+            per_page=self.results_per_page)
         results = response['results']
         search_message = self.results_message(
-            len(response['results']),
+            len(results),
             self.get_heading(),
             search.search_term)
-        paginator = Paginator(results, 10)
+        paginator = Paginator(results, self.results_per_page)
         page_number = validate_page_number(request, paginator)
         context.update({
             'search_term': search.search_term,
@@ -393,6 +391,7 @@ class AnswerResultsPage(CFGOVPage):
 
     objects = CFGOVPageManager()
     answers = []
+    results_per_page = 20
 
     edit_handler = TabbedInterface([
         ObjectList(CFGOVPage.content_panels, heading='Content'),
@@ -405,7 +404,7 @@ class AnswerResultsPage(CFGOVPage):
         context = super(
             AnswerResultsPage, self).get_context(request, **kwargs)
         context.update(**kwargs)
-        paginator = Paginator(self.answers, 20)
+        paginator = Paginator(self.answers, self.results_per_page)
         page_number = validate_page_number(request, paginator)
         results = paginator.page(page_number)
         context['current_page'] = page_number
@@ -451,18 +450,20 @@ class TagResultsPage(RoutablePageMixin, AnswerResultsPage):
         base_query = AnswerPage.objects.filter(
             language=self.language,
             redirect_to_page=None,
-            live=True)
-        answer_tuples = [
-            (page.url, page.question, page.answer_content_preview())
-            for page in base_query if tag in page.clean_search_tags
-        ]
-        paginator = Paginator(answer_tuples, 20)
+            live=True,
+            search_tag_list__contains=[tag]).order_by('path')
+        paginator = Paginator(base_query, 20)
         page_number = validate_page_number(request, paginator)
         page = paginator.page(page_number)
+        # Only build previews for the answers on this page of results.
+        page.object_list = [
+            (answer.url, answer.question, answer.answer_content_preview())
+            for answer in page.object_list
+        ]
         context = self.get_context(request)
         context['current_page'] = page_number
         context['results'] = page
-        context['results_count'] = len(answer_tuples)
+        context['results_count'] = paginator.count
         context['tag'] = tag
         context['paginator'] = paginator
         return TemplateResponse(
@@ -1,4 +1,10 @@
+import json
+
 from ask_cfpb.documents import AnswerPageDocument
+from core.utils import TTLCache
+from search.elasticsearch_helpers import (
+    MAX_RESULT_WINDOW, SearchResults, hits_total, normalize_term
+)
 
 
 UNSAFE_CHARACTERS = [
@@ -6,6 +12,14 @@ UNSAFE_CHARACTERS = [
     '<', '>', '[', ']', '{', '}', '\\'
 ]
 
+SEARCH_CACHE_SIZE = 512
+SEARCH_CACHE_TTL = 60
+
+# Pages of search hits, keyed by query. Shared by every request this
+# process serves and kept briefly, so paging back and forth and popular
+# searches don't hit Elasticsearch again.
+search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
 
 def make_safe(term):
     for char in UNSAFE_CHARACTERS:
@@ -31,49 +45,92 @@ class AnswerPageSearch:
         ]
         return results
 
-    def search(self):
+    def base_search(self):
+        search = self.base_query or AnswerPageDocument.search()
+        return search.filter("term", language=self.language)
+
+    def base_query_key(self):
         if not self.base_query:
-            search = AnswerPageDocument.search().filter(
-                "term", language=self.language)
-        else:
-            search = self.base_query.filter("term", language=self.language)
-        if self.search_term != '':
-            search = search.query(
-                "match", text={"query": self.search_term, "operator": "AND"}
-            )
-        total_results = search.count()
-        search = search[0:total_results]
-        self.results = search.execute()[0:total_results]
-        return {
-            'search_term': self.search_term,
-            'suggestion': self.suggestion,
-            'results': self.results
-        }
+            return ''
+        return json.dumps(
+            self.base_query.to_dict(), sort_keys=True, default=str)
 
-    def suggest(self):
-        s = AnswerPageDocument.search().filter(
-            "term", language=self.language).suggest(
-            'suggestion', self.search_term, term={'field': 'text'})
-        response = s.execute()
-        try:
-            self.suggestion = response.suggest.suggestion[0].options[0].text
-        except IndexError:
-            # No Suggestions Found
+    def fetch(self, query, start, size, suggest_text=None):
+        """Return (hits, total, suggestion) for one page of a text query.
+
+        The hits, the total hit count and, if suggest_text is given, a
+        spelling suggestion all come from a single Elasticsearch request.
+        Responses are cached briefly in search_cache.
+        """
+        key = (
+            self.language,
+            self.base_query_key(),
+            json.dumps(query, sort_keys=True),
+            start,
+            size,
+            suggest_text,
+        )
+        cached = search_cache.get(key)
+        if cached is not None:
+            return cached
+
+        search = self.base_search()
+        if query:
+            search = search.query("match", text=query)
+        search = search.extra(track_total_hits=True)[start:start + size]
+        if suggest_text:
+            search = search.suggest(
+                'suggestion', suggest_text, term={'field': 'text'})
+        response = search.execute()
+
+        suggestion = None
+        if suggest_text:
+            try:
+                suggestion = response.suggest.suggestion[0].options[0].text
+            except IndexError:
+                # No Suggestions Found
+                pass
+
+        result = (list(response), hits_total(response), suggestion)
+        search_cache.set(key, result)
+        return result
+
+    def paged_search(self, page_number=1, per_page=20, suggest=True):
+        """Search for one page of answers.
+
+        Returns the search term, suggestion and a SearchResults sequence of
+        every matching answer. Only the requested page is fetched up front,
+        in the same request as the total and, if suggest is True, a
+        spelling suggestion. If nothing matches the search term, results
+        for the suggestion are returned instead.
+        """
+        term = normalize_term(self.search_term)
+        query = {"query": term, "operator": "AND"} if term else None
+        suggest_text = term if suggest and term else None
+        start = (max(page_number, 1) - 1) * per_page
+        if start + per_page > MAX_RESULT_WINDOW:
+            # Elasticsearch won't return hits past its result window.
+            start = 0
+
+        _, total, suggestion = self.fetch(query, start, per_page, suggest_text)
+        if not total and suggestion:
+            self.suggestion = suggestion
+            query = suggestion
+            suggest_text = None
+            _, total, _ = self.fetch(query, start, per_page)
+
+        def fetch_page(page_start):
+            return self.fetch(query, page_start, per_page, suggest_text)[0]
+
+        self.results = SearchResults(fetch_page, total, per_page)
+        if self.suggestion:
             return {
-                'search_term': self.search_term,
-                'suggestion': None,
+                'search_term': self.suggestion,
+                'suggestion': self.search_term,
                 'results': self.results
             }
-
-        search = self.base_query or AnswerPageDocument.search()
-        suggest_results = search.query(
-            "match", text=self.suggestion).filter(
-            "term", language=self.language)
-        total = suggest_results.count()
-        suggest_results = suggest_results[0:total]
-        self.results = suggest_results.execute()[0:total]
         return {
-            'search_term': self.suggestion,
-            'suggestion': self.search_term,
+            'search_term': self.search_term,
+            'suggestion': None,
             'results': self.results
         }
@@ -2,7 +2,7 @@ import csv
 import datetime
 import html
 
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.utils import html as html_util
 
 from ask_cfpb.models.answer_page import AnswerPage
@@ -31,89 +31,93 @@ def clean_and_strip(data):
     return html_util.strip_tags(unescaped).strip()
 
 
-def assemble_output():
+def group_values(field):
+    """Map each AnswerPage id to the distinct values of a related field.
+
+    One query per relation, so pages aren't duplicated for every
+    combination of their ManyToMany values.
+    """
+    grouped = {}
+    values = AnswerPage.objects.filter(
+        **{'{}__isnull'.format(field): False}
+    ).values_list('id', field)
+    for page_id, value in values.iterator():
+        if value:
+            grouped.setdefault(page_id, set()).add(str(value))
+    return grouped
+
+
+def get_answer_text(answer_streamfield):
+    answer_text = list(filter(
+        lambda item: item['type'] == 'text', answer_streamfield))
+    if answer_text:
+        return answer_text[0].get('value').get('content')
+    # If no text block is found,
+    # there is either a HowTo or FAQ schema block.
+    # Both define a description field, so we'll use that here.
+    answer_schema = list(
+        filter(
+            lambda item: item['type'] == 'how_to_schema' or
+            item['type'] == 'faq_schema', answer_streamfield
+        )
+    )
+    if answer_schema:
+        return answer_schema[0].get('value').get('description')
+    # This is a question with no answer, possibly a new draft.
+    return ''
+
+
+def iter_output():
+    """Yield one output row per AnswerPage.
+
+    Pages are streamed from the database, and ManyToMany values are
+    grouped up front with one query per relation, so time and memory grow
+    linearly with the number of pages.
+    """
+    related_questions = group_values('related_questions')
+    portal_topics = group_values('portal_topic__heading')
+    portal_categories = group_values('portal_category__heading')
 
-    prefetch_fields = (
-        'related_questions',
-        'portal_topic__heading',
-        'portal_category__heading')
-    answer_pages = list(AnswerPage.objects.prefetch_related(
-        *prefetch_fields
-    ).order_by('language', '-answer_base__id').values(
+    answer_pages = AnswerPage.objects.order_by(
+        'language', '-answer_base__id'
+    ).values(
         'id', 'answer_base__id', 'question', 'short_answer',
         'answer_content', 'url_path', 'live', 'last_edited',
         'redirect_to_page_id', 'related_resource__title', 'language',
-        *prefetch_fields
-    ))
-    output_rows = []
-    seen = []
-
-    for page in answer_pages:
-        # There are duplicate pages in here
-        # because of the ManyToMany fields prefetched:
-        if page['id'] in seen:
-            continue
-        seen.append(page['id'])
+    )
 
+    for page in answer_pages.iterator():
         output = {heading: '' for heading in HEADINGS}
         output['ASK_ID'] = page['answer_base__id']
         output['PAGE_ID'] = page['id']
         output['Language'] = page['language']
         output['RelatedResource'] = page['related_resource__title']
         output['Question'] = page['question'].replace('\x81', '')
-        answer_streamfield = page['answer_content'].stream_data
-        answer_text = list(filter(
-            lambda item: item['type'] == 'text', answer_streamfield))
-        if answer_text:
-            answer = answer_text[0].get('value').get('content')
-        else:
-            # If no text block is found,
-            # there is either a HowTo or FAQ schema block.
-            # Both define a description field, so we'll use that here.
-            answer_schema = list(
-                filter(
-                    lambda item: item['type'] == 'how_to_schema' or
-                    item['type'] == 'faq_schema', answer_streamfield
-                )
-            )
-            if answer_schema:
-                answer = answer_schema[0].get('value').get('description')
-            else:
-                # This is a question with no answer, possibly a new draft.
-                answer = ''
-
+        answer = get_answer_text(page['answer_content'].stream_data)
         output['Answer'] = clean_and_strip(answer).replace('\x81', '')
         output['ShortAnswer'] = clean_and_strip(page['short_answer'])
         output['URL'] = page['url_path'].replace('/cfgov', '')
         output['Live'] = page['live']
         output['LastEdited'] = page['last_edited']
         output['Redirect'] = page['redirect_to_page_id']
+        output['RelatedQuestions'] = " | ".join(
+            sorted(related_questions.get(page['id'], [])))
+        output['PortalTopics'] = " | ".join(
+            sorted(portal_topics.get(page['id'], [])))
+        output['PortalCategories'] = " | ".join(
+            sorted(portal_categories.get(page['id'], [])))
+        yield output
 
-        # Group the ManyToMany fields together:
-        related_questions = []
-        portal_topics = []
-        portal_categories = []
-        for p in answer_pages:
-            if p['id'] == page['id']:
-                if p['related_questions']:
-                    related_questions.append(str(p['related_questions']))
-                if p['portal_topic__heading']:
-                    portal_topics.append(p['portal_topic__heading'])
-                if p['portal_category__heading']:
-                    portal_categories.append(p['portal_category__heading'])
 
-        # Remove duplicates
-        related_questions = list(set(related_questions))
-        portal_topics = list(set(portal_topics))
-        portal_categories = list(set(portal_categories))
+def assemble_output():
+    return list(iter_output())
 
-        output['RelatedQuestions'] = " | ".join(related_questions)
-        output['PortalTopics'] = " | ".join(portal_topics)
-        output['PortalCategories'] = " | ".join(portal_categories)
 
-        output_rows.append(output)
+class Echo(object):
+    """A file-like object whose write returns the value, for streaming."""
 
-    return output_rows
+    def write(self, value):
+        return value
 
 
 def export_questions(path='/tmp', http_response=False):
@@ -132,9 +136,9 @@ def export_questions(path='/tmp', http_response=False):
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d")
     slug = 'ask-cfpb-{}.csv'.format(timestamp)
     if http_response:
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response = StreamingHttpResponse(
+            stream_questions_csv(), content_type='text/csv; charset=utf-8')
         response['Content-Disposition'] = 'attachment;filename={}'.format(slug)
-        write_questions_to_csv(response)
         return response
     file_path = '{}/{}'.format(path, slug).replace('//', '/')
     with open(file_path, 'w', encoding='windows-1252') as f:
@@ -144,10 +148,18 @@ def export_questions(path='/tmp', http_response=False):
 def write_questions_to_csv(csvfile):
     writer = csv.writer(csvfile)
     writer.writerow(HEADINGS)
-    for row in assemble_output():
+    for row in iter_output():
         writer.writerow([row.get(key) for key in HEADINGS])
 
 
+def stream_questions_csv():
+    """Yield the export CSV a line at a time."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(HEADINGS)
+    for row in iter_output():
+        yield writer.writerow([row.get(key) for key in HEADINGS])
+
+
 def run(*args):
     if args:
         export_questions(path=args[0])
@@ -23,6 +23,7 @@ from ask_cfpb.models.pages import (
     REUSABLE_TEXT_TITLES, AnswerLandingPage, AnswerPage, ArticlePage,
     PortalSearchPage, get_standard_text, strip_html, validate_page_number
 )
+from ask_cfpb.models.search import search_cache
 from ask_cfpb.models.snippets import GlossaryTerm
 from ask_cfpb.scripts.export_ask_data import (
     assemble_output, clean_and_strip, export_questions
@@ -97,12 +98,59 @@ class ExportAskDataTests(TestCase, WagtailTestUtils):
         self.assertEqual(output.get("URL"), "/mock-question1-en-1234/")
         self.assertEqual(output.get("Question"), "Mock question1")
 
+    def test_export_script_groups_related_values(self):
+        pages = []
+        for ask_id in [1234, 1235, 1236]:
+            answer = Answer(id=ask_id)
+            answer.save()
+            page = AnswerPage(
+                slug="mock-question-en-{}".format(ask_id),
+                title="Mock question {}".format(ask_id),
+                answer_base=answer,
+                question="Mock question {}".format(ask_id),
+            )
+            helpers.publish_page(page)
+            pages.append(page)
+        topics = [
+            baker.make(PortalTopic, heading="Topic A"),
+            baker.make(PortalTopic, heading="Topic B"),
+        ]
+        pages[0].related_questions.add(pages[1], pages[2])
+        pages[0].portal_topic.add(*topics)
+        pages[0].save()
+
+        output = assemble_output()
+        self.assertEqual(
+            [row["PAGE_ID"] for row in output],
+            [pages[2].pk, pages[1].pk, pages[0].pk]
+        )
+        row = output[2]
+        self.assertEqual(
+            row["RelatedQuestions"],
+            " | ".join(sorted([str(pages[1].pk), str(pages[2].pk)]))
+        )
+        self.assertEqual(row["PortalTopics"], "Topic A | Topic B")
+        self.assertEqual(output[0]["RelatedQuestions"], "")
+
+    def test_export_script_query_count_is_constant(self):
+        for ask_id in [1234, 1235]:
+            answer = Answer(id=ask_id)
+            answer.save()
+            helpers.publish_page(AnswerPage(
+                slug="mock-question-en-{}".format(ask_id),
+                title="Mock question {}".format(ask_id),
+                answer_base=answer,
+                question="Mock question {}".format(ask_id),
+            ))
+        with self.assertNumQueries(4):
+            self.assertEqual(len(assemble_output()), 2)
+
     def test_clean_and_strip(self):
         raw_data = "<p>If you have been scammed, file a complaint.</p>"
         clean_data = "If you have been scammed, file a complaint."
         self.assertEqual(clean_and_strip(raw_data), clean_data)
 
-    @mock.patch("ask_cfpb.scripts.export_ask_data.assemble_output")
+    @mock.patch("ask_cfpb.scripts.export_ask_data.iter_output")
     def test_export_questions(self, mock_output):
         mock_output.return_value = self.mock_assemble_output_value
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d")
@@ -114,12 +162,13 @@ class ExportAskDataTests(TestCase, WagtailTestUtils):
         m.assert_called_once_with(
             "/tmp/{}".format(slug), "w", encoding='windows-1252')
 
-    @mock.patch("ask_cfpb.scripts.export_ask_data.assemble_output")
+    @mock.patch("ask_cfpb.scripts.export_ask_data.iter_output")
     def test_export_from_admin_post(self, mock_output):
         self.login()
         mock_output.return_value = self.mock_assemble_output_value
         response = self.client.post("/admin/export-ask/")
         self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
         # Check that fields from the mock value are included
         self.assertContains(response, "Category 5 Hurricane")
         self.assertContains(response, "56789")
@@ -201,6 +250,7 @@ class PortalSearchPageTest(TestCase):
             new_page.save_revision(user=self.test_user).publish()
             return new_page
 
+        search_cache.clear()
         self.site = Site.objects.get(is_default_site=True)
         self.ROOT_PAGE = self.site.root_page
         self.portal_topic = PortalTopic.objects.get(pk=1)
@@ -552,6 +602,22 @@ class PortalSearchPageTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context_data["search_term"], term)
 
+    @mock.patch.object(AnswerPageDocument, 'search')
+    def test_portal_search_requests_one_page(self, mock_search):
+        search = mock_search.return_value.filter.return_value
+        for method in ['filter', 'query', 'extra', 'suggest', '__getitem__']:
+            getattr(search, method).return_value = search
+        search.execute.return_value.hits.total = mock.Mock(value=25)
+        page = self.english_search_page
+        response = self.client.get(
+            page.url, {"search_term": "hoodoo", "page": "3"}
+        )
+        self.assertEqual(response.status_code, 200)
+        search.__getitem__.assert_called_once_with(slice(20, 30))
+        self.assertEqual(search.execute.call_count, 1)
+        self.assertEqual(response.context_data["current_page"], 3)
+        self.assertEqual(response.context_data["paginator"].num_pages, 3)
+
     def test_get_glossary_terms(self):
         page = self.english_search_page
         glossary_term = GlossaryTerm(
@@ -935,6 +1001,41 @@ class AnswerPageTest(TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
+    def test_routable_tag_page_results(self):
+        page = self.tag_results_page_en
+        response = self.client.get(
+            page.url
+            + page.reverse_subpage("tag_search", kwargs={"tag": "hippodrome"})
+        )
+        self.assertEqual(response.context_data["results_count"], 2)
+        self.assertEqual(
+            sorted(
+                question for url, question, preview
+                in response.context_data["results"]
+            ),
+            ["Mock question1", "Mock question2"],
+        )
+
+    def test_routable_tag_page_results_match_language(self):
+        page = self.tag_results_page_es
+        response = self.client.get(
+            page.url
+            + page.reverse_subpage("tag_search", kwargs={"tag": "hippodrome"})
+        )
+        self.assertEqual(response.context_data["results_count"], 0)
+
+    def test_search_tag_list_kept_in_sync(self):
+        page = self.page1
+        page.search_tags = " Chutes, Ladders ,,"
+        page.save_revision().publish()
+        page.refresh_from_db()
+        self.assertEqual(page.search_tag_list, ["Chutes", "Ladders"])
+        self.assertTrue(
+            AnswerPage.objects.filter(
+                search_tag_list__contains=["Ladders"]
+            ).exists()
+        )
+
     def test_routable_tag_page_returns_url_suffix(self):
         page = self.tag_results_page_en
         response = page.reverse_subpage(
@@ -1216,3 +1317,9 @@ class AnswerPageTest(TestCase):
         request = HttpRequest()
         request.GET.update({"page": "<script>Boo</script>"})
         self.assertEqual(validate_page_number(request, paginator), 1)
+
+    def test_validate_page_number_past_search_result_window(self):
+        paginator = Paginator([{"fake": "results"}] * 20000, 20)
+        request = HttpRequest()
+        request.GET.update({"page": "600"})
+        self.assertEqual(validate_page_number(request, paginator), 1)
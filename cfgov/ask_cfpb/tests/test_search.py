@@ -9,8 +9,9 @@ from django.urls import reverse
 
 from ask_cfpb.documents import AnswerPageDocument
 from ask_cfpb.models import ENGLISH_PARENT_SLUG, SPANISH_PARENT_SLUG
-from ask_cfpb.models.search import AnswerPageSearch, make_safe
+from ask_cfpb.models.search import AnswerPageSearch, make_safe, search_cache
 from ask_cfpb.views import ask_search, redirect_ask_search
+from search.elasticsearch_helpers import SearchResults
 from v1.util.migrations import get_or_create_page
 
 
@@ -22,10 +23,41 @@ class AskSearchSafetyTestCase(unittest.TestCase):
         )
 
 
+def mock_hit(question):
+    return mock.Mock(
+        autocomplete=question,
+        url="/ask-cfpb/answer/",
+        text="Answer text",
+        preview="Answer preview",
+    )
+
+
+def mock_response(hits, total, suggestion=None):
+    response = mock.MagicMock()
+    response.__iter__.return_value = iter(hits)
+    response.hits.total = mock.Mock(value=total)
+    if suggestion:
+        response.suggest.suggestion[0].options[0].text = suggestion
+    else:
+        response.suggest.suggestion.__getitem__.side_effect = IndexError
+    return response
+
+
+def mock_search_responses(mock_search, *responses):
+    """Chain a mocked Search's methods and queue up its responses."""
+    search = mock_search.return_value
+    for method in ['filter', 'query', 'extra', 'suggest', '__getitem__']:
+        getattr(search, method).return_value = search
+    search.execute.side_effect = responses
+    return search
+
+
 class AnswerPageSearchTest(TestCase):
     def setUp(self):
         from v1.models import HomePage
 
+        search_cache.clear()
+
         self.ROOT_PAGE = HomePage.objects.get(slug="cfgov")
         self.english_parent_page = get_or_create_page(
             apps,
@@ -71,21 +103,20 @@ class AnswerPageSearchTest(TestCase):
     @mock.patch.object(AnswerPageDocument, 'search')
     def test_ask_search_en(self, mock_search):
         term = "payday"
-        mock_return = mock.Mock()
-        mock_return.search_term = term
-        mock_return.suggestion = None
-        mock_es_queryset = mock.Mock()
-        mock_es_queryset.__iter__ = mock.Mock(return_value=iter([mock_return]))
-        mock_search().filter().query() \
-            .__getitem__().execute.return_value = [mock_es_queryset]
-        mock_search().filter().query().count = mock.Mock(return_value=1)
+        search = mock_search_responses(
+            mock_search, mock_response([mock_hit("Payday loans")], 1)
+        )
         response = self.client.get(reverse("ask-search-en"), {"q": term})
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context_data["page"], self.en_page)
-        self.assertEqual(mock_search.call_count, 3)
-        self.assertTrue(
-            mock_search.called_with(language="en", search_term=term)
+        self.assertEqual(response.context_data["results_count"], 1)
+        self.assertEqual(
+            [question for url, question, preview
+             in response.context_data["results"]],
+            ["Payday loans"]
         )
+        # One request returns the page of hits, total and suggestion.
+        self.assertEqual(search.execute.call_count, 1)
 
     @mock.patch.object(AnswerPageDocument, 'search')
     def test_ask_search_en_no_term(self, mock_search):
@@ -104,27 +135,47 @@ class AnswerPageSearchTest(TestCase):
     @mock.patch.object(AnswerPageDocument, 'search')
     def test_ask_search_en_suggestion(self, mock_search):
         term = "paydya"
-        mock_return = mock.Mock()
-        mock_return.suggestion = "payday"
-        mock_return.search_term = term
-        mock_return.results = []
-        mock_es_queryset = mock.Mock()
-        mock_es_queryset.__iter__ = mock.Mock(return_value=iter([mock_return]))
-        mock_search().filter().query() \
-            .__getitem__().execute.return_value = [mock_es_queryset]
-        mock_search().filter().query().count = mock.Mock(return_value=0)
+        search = mock_search_responses(
+            mock_search,
+            mock_response([], 0, suggestion="payday"),
+            mock_response([mock_hit("Payday loans")], 1),
+        )
         response = self.client.get(reverse("ask-search-en"), {"q": term})
-        self.assertEqual(mock_search.call_count, 5)
+        self.assertEqual(search.execute.call_count, 2)
+        search.query.assert_called_with("match", text="payday")
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get('results'), None)
         self.assertEqual(response.get('suggestion'), None)
         response_page = response.context_data["page"]
         self.assertEqual(response_page, self.en_page)
         self.assertEqual(response_page.query, term)
+        self.assertEqual(response_page.result_query, "payday")
         self.assertEqual(response_page.suggestion, term)
-        self.assertTrue(
-            mock_search.called_with(language="en", search_term=term)
+        self.assertEqual(response.context_data["results_count"], 1)
+
+    @mock.patch.object(AnswerPageDocument, 'search')
+    def test_ask_search_en_no_correction(self, mock_search):
+        search = mock_search_responses(mock_search, mock_response([], 0))
+        response = self.client.get(
+            reverse("ask-search-en"), {"q": "paydya", "correct": "0"}
+        )
+        self.assertEqual(response.status_code, 200)
+        search.suggest.assert_not_called()
+        self.assertIsNone(response.context_data["page"].suggestion)
+        self.assertEqual(response.context_data["results_count"], 0)
+
+    @mock.patch.object(AnswerPageDocument, 'search')
+    def test_ask_search_en_requests_one_page(self, mock_search):
+        search = mock_search_responses(
+            mock_search, mock_response([mock_hit("Question 21")], 21)
+        )
+        response = self.client.get(
+            reverse("ask-search-en"), {"q": "payday", "page": "2"}
         )
+        self.assertEqual(response.status_code, 200)
+        search.__getitem__.assert_called_once_with(slice(20, 40))
+        self.assertEqual(response.context_data["current_page"], 2)
+        self.assertEqual(response.context_data["results_count"], 21)
 
     @mock.patch("ask_cfpb.views.AnswerPageSearch")
     def test_ask_search_es(self, mock_search):
@@ -193,23 +244,53 @@ class AnswerPageSearchTest(TestCase):
             language="en",
             live=True,
         )
-        mock_search.search.return_value = {
+        mock_search().paged_search.return_value = {
             'search_term': search_term,
             'suggestion': None,
-            'results': []
-        }
-        mock_search.suggest.return_value = {
-            'search_term': search_term,
-            'suggestion': term,
-            'results': []
+            'results': SearchResults(lambda start: [], 0, 20)
         }
         response = self.client.get(
             reverse("ask-search-en-json", kwargs={"as_json": "json"}),
             {"q": term},
         )
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(mock_search.call_count, 1)
-        self.assertEqual(json.loads(response.content)["query"], term)
+        self.assertEqual(mock_search.call_count, 2)
+        payload = json.loads(response.content)
+        self.assertEqual(payload["query"], term)
+        self.assertEqual(payload["suggestion"], term)
+        self.assertEqual(payload["total"], 0)
+        self.assertEqual(payload["results"], [])
+
+    @mock.patch.object(AnswerPageDocument, 'search')
+    def test_ask_search_en_json_response_pages(self, mock_search):
+        hits = [mock_hit("Question {}".format(i)) for i in range(20, 25)]
+        mock_search_responses(mock_search, mock_response(hits, 25))
+        response = self.client.get(
+            reverse("ask-search-en-json", kwargs={"as_json": "json"}),
+            {"q": "tuition", "page": "2"},
+        )
+        payload = json.loads(response.content)
+        self.assertEqual(payload["total"], 25)
+        self.assertEqual(payload["page"], 2)
+        self.assertEqual(
+            [result["question"] for result in payload["results"]],
+            ["Question {}".format(i) for i in range(20, 25)]
+        )
+
+    @mock.patch.object(AnswerPageDocument, 'search')
+    def test_ask_search_json_page_past_result_window(self, mock_search):
+        hits = [mock_hit("Question {}".format(i)) for i in range(20)]
+        search = mock_search_responses(
+            mock_search, mock_response(hits, 20000))
+        response = self.client.get(
+            reverse("ask-search-en-json", kwargs={"as_json": "json"}),
+            {"q": "tuition", "page": "600"},
+        )
+        self.assertEqual(response.status_code, 200)
+        payload = json.loads(response.content)
+        self.assertEqual(payload["page"], 1)
+        self.assertEqual(len(payload["results"]), 20)
+        search.__getitem__.assert_called_once_with(slice(0, 20))
 
     @mock.patch.object(AnswerPageSearch, 'autocomplete')
     def test_ask_autocomplete_en_blank_term(self, mock_autocomplete):
@@ -250,15 +331,40 @@ class AnswerPageSearchTest(TestCase):
         self.assertEqual(result.status_code, 200)
 
     @mock.patch.object(AnswerPageDocument, 'search')
-    def test_ask_suggest_no_suggestions(self, mock_search):
+    def test_paged_search_no_suggestions(self, mock_search):
         term = 'zelle'
-        mock_response = mock.MagicMock()
-        mock_response.suggest.suggestion.__getitem__.side_effect = IndexError
-        mock_search().filter().suggest() \
-            .execute.return_value = mock_response
+        mock_results = mock_response([], 0)
+        mock_results.suggest.suggestion.__getitem__.side_effect = IndexError
+        search = mock_search_responses(mock_search, mock_results)
         answer_search = AnswerPageSearch(search_term=term)
-        response = answer_search.suggest()
+        response = answer_search.paged_search()
         self.assertEqual(response.get('suggestion'), None)
+        self.assertEqual(response.get('search_term'), term)
+        self.assertEqual(len(response.get('results')), 0)
+        self.assertEqual(search.execute.call_count, 1)
+
+    @mock.patch.object(AnswerPageDocument, 'search')
+    def test_paged_search_page_past_result_window(self, mock_search):
+        search = mock_search_responses(
+            mock_search, mock_response([mock_hit("Payday loans")], 20000))
+        AnswerPageSearch("payday loans").paged_search(page_number=99999999)
+        search.__getitem__.assert_called_once_with(slice(0, 20))
+
+    @mock.patch.object(AnswerPageDocument, 'search')
+    def test_paged_search_cached_by_normalized_term(self, mock_search):
+        search = mock_search_responses(
+            mock_search,
+            mock_response([mock_hit("Payday loans")], 1),
+            mock_response([mock_hit("Préstamos de día de pago")], 1),
+        )
+        first = AnswerPageSearch("Payday  loans").paged_search()
+        second = AnswerPageSearch(" payday LOANS ").paged_search()
+        self.assertEqual(list(first['results']), list(second['results']))
+        self.assertEqual(second['search_term'], "payday LOANS")
+        self.assertEqual(search.execute.call_count, 1)
+
+        AnswerPageSearch("payday loans", language="es").paged_search()
+        self.assertEqual(search.execute.call_count, 2)
 
 
 class RedirectAskSearchTestCase(TestCase):
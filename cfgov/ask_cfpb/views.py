@@ -13,6 +13,7 @@ from bs4 import BeautifulSoup as bs
 
 from ask_cfpb.models import AnswerPage, AnswerPageSearch, AnswerResultsPage
 from ask_cfpb.models.search import make_safe
+from search.elasticsearch_helpers import get_page_number
 
 
 def annotate_links(answer_text):
@@ -94,23 +95,29 @@ def ask_search(request, language='en', as_json=False):
         return results_page.serve(request)
 
     page = AnswerPageSearch(search_term, language=language)
-    response = page.search()
 
     # Check if we want to use the suggestion or not
     suggest = request.GET.get('correct', '1') == '1'
 
-    # Provide a suggestion only when no results are found
-    if not response.get('results') and suggest:
-        response = page.suggest()
-        suggestion = response.get('suggestion')
-    else:
-        suggestion = search_term
+    # Ask Elasticsearch for the requested page of results only. A
+    # suggestion is provided only when no results are found.
+    page_number = get_page_number(request, results_page.results_per_page)
+    response = page.paged_search(
+        page_number,
+        per_page=results_page.results_per_page,
+        suggest=suggest
+    )
 
     if as_json:
+        suggestion = response.get('suggestion') or search_term
+        results = response['results']
+        start = (page_number - 1) * results_page.results_per_page
         payload = {
             'query': search_term,
             'result_query': make_safe(search_term).strip(),
             'suggestion': make_safe(suggestion).strip(),
+            'total': len(results),
+            'page': page_number,
             'results': [
                 {
                     'question': result.autocomplete,
@@ -118,7 +125,9 @@ def ask_search(request, language='en', as_json=False):
                     'text': result.text,
                     'preview': result.preview,
                 }
-                for result in response.get('results')
+                for result in results[
+                    start:start + results_page.results_per_page
+                ]
             ]
         }
         json_results = json.dumps(payload)
@@ -127,10 +136,9 @@ def ask_search(request, language='en', as_json=False):
     results_page.query = search_term
     results_page.result_query = response.get('search_term')
     results_page.suggestion = response.get('suggestion')
-    results_page.answers = [
-        (result.url, result.autocomplete, result.preview)
-        for result in response['results']
-    ]
+    results_page.answers = response['results'].map(
+        lambda result: (result.url, result.autocomplete, result.preview)
+    )
     return results_page.serve(request)
 
 
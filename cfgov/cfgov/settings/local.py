@@ -82,7 +82,12 @@ CACHES = {
         "BACKEND": "django.core.cache.backends.dummy.DummyCache",
         "TIMEOUT": 0,
     }
-    for k in ("default", "post_preview")
+    for k in (
+        "default",
+        "post_preview",
+        "mortgage_performance",
+        "regulations3k_sections",
+    )
 }
 
 # Optionally enable cache for post_preview
@@ -95,7 +95,28 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
         'LOCATION': 'post_preview_cache',
         'TIMEOUT': None,
-    }
+    },
+    # Precomputed mortgage performance API payloads, shared by every host.
+    # A full rebuild writes several thousand entries.
+    'mortgage_performance': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'mortgage_performance_cache',
+        'TIMEOUT': 60 * 60 * 24 * 45,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+    # Rendered regulation section HTML, shared by every host. Each section
+    # of each effective version is cached once per page and date that
+    # serves it; see the warm_regulation_cache management command.
+    'regulations3k_sections': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'regulations3k_section_cache',
+        'TIMEOUT': 60 * 60 * 24 * 7,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
 }
 
 # ALLOWED_HOSTS should be defined as a JSON list in the ALLOWED_HOSTS
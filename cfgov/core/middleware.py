@@ -7,7 +7,7 @@ from django.utils.encoding import force_str
 
 from wagtail.core.rich_text import expand_db_html
 
-from core.utils import add_link_markup, get_body_html, get_link_tags
+from core.utils import rewrite_link_tags
 
 
 class DownstreamCacheControlMiddleware(object):
@@ -38,20 +38,7 @@ def parse_links(html, request_path=None, encoding=None):
     expanded_html = expand_db_html(html_as_text)
 
     # Parse links only in the <body> of the HTML
-    body_html = get_body_html(expanded_html)
-    if body_html is None:
-        return expanded_html
-
-    link_tags = get_link_tags(body_html)
-    for tag in link_tags:
-        tag_with_markup = add_link_markup(tag, request_path)
-        if tag_with_markup:
-            expanded_html = expanded_html.replace(
-                tag,
-                tag_with_markup
-            )
-
-    return expanded_html
+    return rewrite_link_tags(expanded_html, request_path)
 
 
 class ParseLinksMiddleware(object):
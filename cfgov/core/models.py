@@ -0,0 +1,41 @@
+from django.db import models
+from django.db.models import F
+
+
+class CacheVersion(models.Model):
+    """
+    A version number for a set of cached values.
+
+    Cached values are keyed on their version, so bumping it invalidates
+    them for every process on every host. Versions are kept in the
+    database rather than in a cache, where they could expire or be
+    evicted and fall back to an earlier number whose values are stale.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return "{} (version {})".format(self.name, self.version)
+
+
+def get_cache_versions(*names):
+    """Return the version of each named set of values, in one query."""
+    versions = dict(CacheVersion.objects.filter(
+        name__in=names).values_list('name', 'version'))
+    return tuple(versions.get(name, 0) for name in names)
+
+
+def get_cache_version(name):
+    return get_cache_versions(name)[0]
+
+
+def bump_cache_version(name):
+    """Invalidate every value cached under a name's current version."""
+    bumped = CacheVersion.objects.filter(name=name).update(
+        version=F('version') + 1)
+    if not bumped:
+        _, created = CacheVersion.objects.get_or_create(
+            name=name, defaults={'version': 1})
+        if not created:
+            CacheVersion.objects.filter(name=name).update(
+                version=F('version') + 1)
@@ -0,0 +1,96 @@
+"""
+Compare the single-pass link rewriter against the original implementation.
+
+Save some large pages locally (regulation sections are a good test case),
+then run:
+
+`manage.py runscript benchmark_parse_links --script-args page1.html page2.html`
+
+Each page is processed by both implementations, the outputs are checked for
+equality, and the average time per page is logged. The single-pass rewriter
+is timed twice: cold, with its link markup caches cleared before every
+iteration, and warm, once every link on the page has been cached. The cold
+figure compares the rewriting algorithms; the warm one shows what memoizing
+link markup adds on top.
+"""
+import logging
+import timeit
+from collections import namedtuple
+
+from core.utils import (
+    add_link_markup, clear_link_markup_cache, get_body_html, get_link_tags,
+    rewrite_link_tags
+)
+
+
+logger = logging.getLogger(__name__)
+
+ITERATIONS = 10
+
+BenchmarkResult = namedtuple(
+    'BenchmarkResult', ['legacy', 'cold', 'warm', 'matches']
+)
+
+
+def legacy_rewrite_link_tags(html, request_path=None):
+    """The original ParseLinksMiddleware link-rewriting loop."""
+    body_html = get_body_html(html)
+    if body_html is None:
+        return html
+
+    for tag in get_link_tags(body_html):
+        tag_with_markup = add_link_markup(tag, request_path)
+        if tag_with_markup:
+            html = html.replace(tag, tag_with_markup)
+
+    return html
+
+
+def time_cold(function, iterations):
+    """Return the average seconds per call, with empty caches each time."""
+    return sum(timeit.repeat(
+        function, setup=clear_link_markup_cache,
+        repeat=iterations, number=1)) / iterations
+
+
+def benchmark(html, request_path=None, iterations=ITERATIONS):
+    """Return a BenchmarkResult of average seconds per page for html.
+
+    The legacy loop shares the signed redirect cache, so it is also timed
+    with the caches cleared before every iteration.
+    """
+    legacy = time_cold(
+        lambda: legacy_rewrite_link_tags(html, request_path), iterations)
+    cold = time_cold(
+        lambda: rewrite_link_tags(html, request_path), iterations)
+    clear_link_markup_cache()
+    rewritten = rewrite_link_tags(html, request_path)
+    warm = timeit.timeit(
+        lambda: rewrite_link_tags(html, request_path),
+        number=iterations) / iterations
+    matches = legacy_rewrite_link_tags(html, request_path) == rewritten
+    return BenchmarkResult(legacy, cold, warm, matches)
+
+
+def speedup(before, after):
+    return before / after if after else 0
+
+
+def run(*args):
+    if not args:
+        logger.info(
+            "Usage: ./cfgov/manage.py runscript benchmark_parse_links "
+            "--script-args [HTML FILE PATH] [HTML FILE PATH ...]")
+        return
+    for path in args:
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        link_count = len(get_link_tags(get_body_html(html) or ''))
+        result = benchmark(html)
+        logger.info(
+            "{}: {} links, legacy {:.4f}s, single pass cold {:.4f}s "
+            "({:.1f}x), warm {:.4f}s ({:.1f}x), outputs {}".format(
+                path, link_count, result.legacy,
+                result.cold, speedup(result.legacy, result.cold),
+                result.warm, speedup(result.legacy, result.warm),
+                'match' if result.matches else 'DIFFER'))
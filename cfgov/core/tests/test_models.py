@@ -0,0 +1,21 @@
+from django.test import TestCase
+
+from core.models import (
+    CacheVersion, bump_cache_version, get_cache_version, get_cache_versions
+)
+
+
+class CacheVersionTests(TestCase):
+
+    def test_unknown_names_are_version_0(self):
+        self.assertEqual(get_cache_version("missing"), 0)
+        self.assertEqual(get_cache_versions("a", "b"), (0, 0))
+
+    def test_bump_cache_version(self):
+        bump_cache_version("a")
+        bump_cache_version("a")
+        bump_cache_version("b")
+        with self.assertNumQueries(1):
+            self.assertEqual(get_cache_versions("a", "b", "c"), (2, 1, 0))
+        self.assertEqual(str(CacheVersion.objects.get(name="a")),
+                         "a (version 2)")
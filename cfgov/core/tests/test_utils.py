@@ -1,10 +1,16 @@
 import unittest
+from unittest import mock
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
+from core.scripts.benchmark_parse_links import (
+    benchmark, legacy_rewrite_link_tags
+)
 from core.utils import (
+    TTLCache, add_link_markup, clear_link_markup_cache,
     extract_answers_from_request, format_file_size, get_body_html,
-    get_link_tags
+    get_link_markup, get_link_tags, link_markup_cache_info, rewrite_link_tags,
+    signed_redirect
 )
 
 
@@ -103,3 +109,127 @@ class LinkUtilsTests(TestCase):
             get_link_tags('outer <a  >inner</a>'),
             ['<a  >inner</a>', ]
         )
+
+
+class RewriteLinkTagsTests(TestCase):
+
+    html = (
+        '<html><head><a href="https://outside.com">head</a></head><body>'
+        '<a href="/internal/">internal</a>'
+        '<a href="https://example.com">external</a>'
+        '<a href="https://www.fdic.gov/">gov</a>'
+        '<a href="https://example.com">external</a>'
+        '<a href="/foo/bar/#anchor">anchor</a>'
+        '<a href="/report.pdf"><span class="a-link_text">pdf</span></a>'
+        '</body></html>'
+    )
+
+    def setUp(self):
+        clear_link_markup_cache()
+
+    def test_no_body_returns_unmodified(self):
+        html = '<a href="https://example.com">external</a>'
+        self.assertEqual(rewrite_link_tags(html), html)
+
+    def test_matches_legacy_implementation(self):
+        for request_path in [None, '/foo/bar/']:
+            self.assertEqual(
+                rewrite_link_tags(self.html, request_path),
+                legacy_rewrite_link_tags(self.html, request_path)
+            )
+
+    def test_links_outside_body_unmodified(self):
+        output = rewrite_link_tags(self.html)
+        self.assertIn('<a href="https://outside.com">head</a></head>', output)
+
+    def test_identical_tags_processed_once(self):
+        with mock.patch(
+            'core.utils.add_link_markup', wraps=add_link_markup
+        ) as mock_markup:
+            rewrite_link_tags(self.html)
+        self.assertEqual(mock_markup.call_count, 5)
+
+    def test_cache_counts_hits_and_misses(self):
+        rewrite_link_tags(self.html)
+        rewrite_link_tags(self.html)
+        info = link_markup_cache_info()['link_markup']
+        self.assertEqual(info.misses, 5)
+        self.assertEqual(info.hits, 7)
+
+    def test_cache_shared_across_paths_for_non_anchor_links(self):
+        tag = '<a href="https://example.com">external</a>'
+        get_link_markup(tag, '/one/')
+        get_link_markup(tag, '/two/')
+        info = link_markup_cache_info()['link_markup']
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+    def test_cache_keyed_by_path_for_anchor_links(self):
+        tag = '<a href="/one/#anchor">anchor</a>'
+        self.assertEqual(
+            get_link_markup(tag, '/one/'),
+            '<a class="" href="#anchor">anchor</a>'
+        )
+        self.assertIsNone(get_link_markup(tag, '/two/'))
+
+    def test_signed_redirect_memoized_per_secret(self):
+        url = 'https://example.com'
+        first = signed_redirect(url)
+        self.assertEqual(signed_redirect(url), first)
+        info = link_markup_cache_info()['signed_redirect']
+        self.assertEqual((info.hits, info.misses), (1, 1))
+        with override_settings(SECRET_KEY='another-secret'):
+            self.assertNotEqual(signed_redirect(url), first)
+
+    def test_benchmark(self):
+        result = benchmark(self.html, iterations=2)
+        self.assertTrue(result.matches)
+        self.assertGreater(result.legacy, 0)
+        self.assertGreater(result.cold, 0)
+        self.assertGreater(result.warm, 0)
+
+    def test_benchmark_cold_iterations_start_with_empty_caches(self):
+        with mock.patch(
+            'core.scripts.benchmark_parse_links.clear_link_markup_cache',
+            wraps=clear_link_markup_cache
+        ) as mock_clear:
+            benchmark(self.html, iterations=3)
+        # Once per legacy and cold iteration, and once before warming.
+        self.assertEqual(mock_clear.call_count, 7)
+
+
+class TTLCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.cache = TTLCache(maxsize=2, ttl=10, timer=lambda: self.now)
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('a', 'default'), 'default')
+        self.assertEqual(self.cache.cache_info().misses, 2)
+
+    def test_set_and_get(self):
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.cache_info(), (1, 0, 2, 1))
+
+    def test_entries_expire(self):
+        self.cache.set('a', 1)
+        self.now = 10
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.cache_info().currsize, 0)
+
+    def test_least_recently_used_entry_is_dropped(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('c'), 3)
+
+    def test_clear(self):
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.clear()
+        self.assertEqual(self.cache.cache_info(), (0, 0, 2, 0))
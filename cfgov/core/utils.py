@@ -1,6 +1,11 @@
 import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
 from urllib.parse import parse_qs, urlencode, urlparse
 
+from django.conf import settings
 from django.core.signing import Signer
 from django.template.defaultfilters import slugify
 from django.urls import reverse
@@ -44,6 +49,12 @@ BODY_TAG_RE = re.compile(TAG_RE.format(tag_name="body"))
 # Match <a…>…</a>
 A_TAG_RE = re.compile(TAG_RE.format(tag_name="a"))
 
+# Maximum number of distinct link tags whose markup is kept in memory
+LINK_MARKUP_CACHE_SIZE = 4096
+
+# Maximum number of distinct external URLs whose signed redirect is kept
+SIGNED_REDIRECT_CACHE_SIZE = 4096
+
 # If a link contains these elements, it should *not* get an icon
 ICONLESS_LINK_CHILD_ELEMENTS = [
     'img', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
@@ -65,7 +76,13 @@ def sign_url(url, secret=None):
 
 
 def signed_redirect(url):
-    url, signature = sign_url(url)
+    return _signed_redirect(url, settings.SECRET_KEY)
+
+
+@lru_cache(maxsize=SIGNED_REDIRECT_CACHE_SIZE)
+def _signed_redirect(url, secret):
+    """Sign an external URL; memoized per URL and signing secret."""
+    url, signature = sign_url(url, secret)
     query_args = {'ext_url': url,
                   'signature': signature}
 
@@ -97,6 +114,64 @@ def get_link_tags(html):
     return A_TAG_RE.findall(html)
 
 
+def rewrite_link_tags(html, request_path=None):
+    """Add link markup to every link in the <body> of html in a single pass.
+
+    Links are found with one scan of the body, and the output document is
+    assembled as the scan proceeds, rather than searching the whole document
+    again for each modified link. Link markup comes from get_link_markup,
+    so identical link tags are only processed once per process.
+
+    Returns the html unchanged if it has no <body>.
+    """
+    body_match = BODY_TAG_RE.search(html)
+    if body_match is None:
+        return html
+
+    def replace_tag(match):
+        tag = match.group(0)
+        return get_link_markup(tag, request_path) or tag
+
+    start, end = body_match.span()
+    return ''.join((
+        html[:start],
+        A_TAG_RE.sub(replace_tag, body_match.group(0)),
+        html[end:],
+    ))
+
+
+def get_link_markup(tag, request_path):
+    """Return add_link_markup for a link tag, from an in-process LRU cache.
+
+    The request path only changes the output of links that may be in-page
+    anchors, so it is only part of the cache key for tags that contain a #
+    (or a character reference that could encode one). Navigation, footer
+    and mega-menu links share a single cache entry across every page.
+    """
+    if request_path is not None and '#' not in tag and '&' not in tag:
+        request_path = None
+    return _cached_link_markup(tag, request_path, settings.SECRET_KEY)
+
+
+@lru_cache(maxsize=LINK_MARKUP_CACHE_SIZE)
+def _cached_link_markup(tag, request_path, secret):
+    # The secret is part of the key because it changes signed redirect URLs.
+    return add_link_markup(tag, request_path)
+
+
+def link_markup_cache_info():
+    """Return hit, miss and size counters for the link markup caches."""
+    return {
+        'link_markup': _cached_link_markup.cache_info(),
+        'signed_redirect': _signed_redirect.cache_info(),
+    }
+
+
+def clear_link_markup_cache():
+    _cached_link_markup.cache_clear()
+    _signed_redirect.cache_clear()
+
+
 def add_link_markup(tag, request_path):
     """Add necessary markup to the given link and return if modified.
 
@@ -239,3 +314,55 @@ def slugify_unique(context, value):
         used_slugs.append(slug)
 
     return slug
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class TTLCache(object):
+    """A thread-safe, size-limited LRU cache whose entries expire.
+
+    Entries are dropped once they are older than ttl seconds, and the least
+    recently used entry is dropped when the cache is full. Like functools'
+    lru_cache, it counts hits and misses, reported by cache_info().
+    """
+
+    def __init__(self, maxsize, ttl, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self.timer():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.timer() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(
+                self.hits, self.misses, self.maxsize, len(self._entries)
+            )
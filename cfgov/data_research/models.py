@@ -2,6 +2,8 @@ import logging
 
 from django.contrib.postgres.fields import JSONField
 from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 
 from wagtail.core.models import PageManager
 
@@ -101,6 +103,13 @@ class MortgageMetaData(models.Model):
 
 # mortgage geo models
 
+@receiver(post_save, sender=MortgageMetaData)
+def mortgage_metadata_saved(sender, instance, **kwargs):
+    """Invalidate precomputed time-series payloads and FIPS lists."""
+    from data_research.mortgage_utilities.payloads import bump_meta_version
+    bump_meta_version()
+
+
 class State(models.Model):
     fips = models.CharField(max_length=2, blank=True, db_index=True)
     name = models.CharField(max_length=128, blank=True, db_index=True)
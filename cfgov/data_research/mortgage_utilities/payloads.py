@@ -0,0 +1,340 @@
+"""
+Precomputed time-series payloads for the mortgage-performance API.
+
+Payloads are built with one query per geography type and stored in the
+shared PAYLOAD_CACHE, keyed by a metadata version that is bumped whenever the
+underlying data or metadata changes. The version is kept in the database, so
+it can't be evicted. The allowlist and MSA lists that gate each request are
+held in-process as sets and reloaded when the version moves.
+"""
+import datetime
+import logging
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+from core.models import bump_cache_version, get_cache_version
+
+
+logger = logging.getLogger(__name__)
+
+DAYS_LATE_RANGE = ['30-89', '90']
+META_VERSION_NAME = 'mortgage_performance'
+PAYLOAD_CACHE = 'mortgage_performance'
+PAYLOAD_KEY = 'mortgage_performance_time_series:{}:{}:{}'
+MAP_PAYLOAD_KEY = 'mortgage_performance_map:{}:{}:{}:{}'
+MAP_GEOS = {
+    'national': 'nation',
+    'states': 'state',
+    'counties': 'county',
+    'metros': 'msa',
+}
+REFERENCE_LISTS = ['allowlist', 'msa_fips', 'non_msa_fips']
+NATIONAL = 'national'
+
+_reference_sets = None
+
+
+def epoch(date):
+    """
+    Return milliseconds since the epoch for a sampling date.
+
+    This matches MortgageBase.epoch, which uses local time via
+    strftime('%s'), without the string round trip.
+    """
+    return int(time.mktime(date.timetuple())) * 1000
+
+
+def delinquency_value(days_late, total, thirty, sixty, ninety):
+    """Return the delinquency rate that MortgageBase.time_series reports."""
+    if total == 0:
+        return 0
+    if days_late == '30-89':
+        return (thirty + sixty) * 1.0 / total
+    return ninety * 1.0 / total
+
+
+def series_for(rows, days_late):
+    return [{'date': epoch(date),
+             'value': delinquency_value(days_late, *counts)}
+            for date, counts in rows]
+
+
+def get_payload_cache():
+    return caches[PAYLOAD_CACHE]
+
+
+def get_meta_version():
+    return get_cache_version(META_VERSION_NAME)
+
+
+def bump_meta_version():
+    """Invalidate cached payloads and reference sets in every process."""
+    global _reference_sets
+    _reference_sets = None
+    bump_cache_version(META_VERSION_NAME)
+
+
+def _fips_set(json_value):
+    """Return a set of FIPS codes from a list of codes or of FIPS dicts."""
+    return frozenset(
+        entry['fips'] if isinstance(entry, dict) else entry
+        for entry in json_value or [])
+
+
+def get_reference_sets():
+    """
+    Return the API's FIPS reference lists as sets.
+
+    The sets are loaded once per process and reloaded when the
+    metadata version changes. A reload builds a new dict rather than
+    changing the one that other threads may be reading.
+    """
+    global _reference_sets
+    from data_research.models import MortgageMetaData
+    version = get_meta_version()
+    reference_sets = _reference_sets
+    if reference_sets is None or reference_sets['version'] != version:
+        records = MortgageMetaData.objects.filter(name__in=REFERENCE_LISTS)
+        loaded = {record.name: _fips_set(record.json_value)
+                  for record in records}
+        reference_sets = {
+            name: loaded.get(name, frozenset()) for name in REFERENCE_LISTS}
+        reference_sets['version'] = version
+        _reference_sets = reference_sets
+    return reference_sets
+
+
+def _payload_key(days_late, fips, version=None):
+    if version is None:
+        version = get_meta_version()
+    return PAYLOAD_KEY.format(version, days_late, fips)
+
+
+def _grouped_rows(queryset):
+    """Group a mortgage queryset's counts by FIPS, in date order."""
+    grouped = OrderedDict()
+    rows = queryset.order_by('fips', 'date').values_list(
+        'fips', 'date', 'total', 'thirty', 'sixty', 'ninety')
+    for fips, date, total, thirty, sixty, ninety in rows.iterator():
+        grouped.setdefault(fips, []).append(
+            (date, (total, thirty, sixty, ninety)))
+    return grouped
+
+
+def _assemble(meta, rows, days_late):
+    return {'meta': meta, 'data': series_for(rows, days_late)}
+
+
+def build_national_payloads():
+    """Return {days_late: payload} for the national time series."""
+    from data_research.models import NationalMortgageData
+    rows = [
+        (date, counts) for fips_rows in _grouped_rows(
+            NationalMortgageData.objects.all()).values()
+        for date, counts in fips_rows]
+    rows.sort(key=lambda row: row[0])
+    meta = {'name': 'United States', 'fips_type': 'national'}
+    return {days_late: _assemble(meta, rows, days_late)
+            for days_late in DAYS_LATE_RANGE}
+
+
+def build_geo_payload(fips, days_late):
+    """
+    Build the time-series payload for one geography.
+
+    Returns a message string, as the API does, if the FIPS can't be served.
+    """
+    from data_research.models import (
+        County, CountyMortgageData, MetroArea, MSAMortgageData,
+        NonMSAMortgageData, State, StateMortgageData
+    )
+    references = get_reference_sets()
+    if len(fips) == 2:
+        state = State.objects.get(fips=fips)
+        meta = {'fips': fips, 'name': state.name, 'fips_type': 'state'}
+        queryset = StateMortgageData.objects.filter(fips=fips)
+    elif 'non' in fips:
+        state = State.objects.get(fips=fips[:2])
+        meta = {'fips': fips,
+                'name': "Non-metro area of {}".format(state.name),
+                'fips_type': 'non_msa'}
+        queryset = NonMSAMortgageData.objects.filter(fips=fips)
+    elif fips in references['msa_fips']:
+        metro_area = MetroArea.objects.get(fips=fips, valid=True)
+        meta = {'fips': fips, 'name': metro_area.name, 'fips_type': 'msa'}
+        queryset = MSAMortgageData.objects.filter(fips=fips)
+    else:
+        try:
+            county = County.objects.select_related('state').get(
+                fips=fips, valid=True)
+        except County.DoesNotExist:
+            return "County is below display threshold."
+        meta = {'fips': fips,
+                'name': "{}, {}".format(county.name, county.state.abbr),
+                'fips_type': 'county'}
+        queryset = CountyMortgageData.objects.filter(fips=fips)
+    rows = _grouped_rows(queryset).get(fips, [])
+    return _assemble(meta, rows, days_late)
+
+
+def get_time_series_payload(days_late, fips):
+    """
+    Return the cached payload for a delinquency range and FIPS code,
+    building and caching it on a miss.
+
+    Pass `fips='national'` for the national series.
+    """
+    key = _payload_key(days_late, fips)
+    payload_cache = get_payload_cache()
+    payload = payload_cache.get(key)
+    if payload is not None:
+        return payload
+    if fips == NATIONAL:
+        payload = build_national_payloads()[days_late]
+    else:
+        payload = build_geo_payload(fips, days_late)
+    if isinstance(payload, dict):
+        payload_cache.set(key, payload)
+    return payload
+
+
+def _map_rows(geo, date):
+    """
+    Yield (fips, name, valid, counts) for every geography of a type on a
+    sampling date, using a single query per model.
+    """
+    from data_research.models import (
+        CountyMortgageData, MSAMortgageData, NonMSAMortgageData,
+        StateMortgageData
+    )
+    counts = ('total', 'thirty', 'sixty', 'ninety')
+    if geo == 'counties':
+        rows = CountyMortgageData.objects.filter(
+            date=date, county__valid=True).values_list(
+                'fips', 'county__name', 'county__state__abbr', *counts)
+        for fips, name, abbr, *values in rows:
+            yield fips, "{}, {}".format(name, abbr), True, values
+    elif geo == 'states':
+        rows = StateMortgageData.objects.filter(date=date).values_list(
+            'fips', 'state__name', *counts)
+        for fips, name, *values in rows:
+            yield fips, name, True, values
+    elif geo == 'metros':
+        rows = MSAMortgageData.objects.filter(date=date).values_list(
+            'fips', 'msa__name', 'msa__valid', *counts)
+        for fips, name, valid, *values in rows:
+            yield fips, name, valid is not False, values
+        rows = NonMSAMortgageData.objects.filter(date=date).values_list(
+            'fips', 'state__name', 'state__non_msa_valid', *counts)
+        for fips, name, valid, *values in rows:
+            yield (fips, "Non-metro area of {}".format(name),
+                   valid is not False, values)
+
+
+def build_map_payload(days_late, geo, date):
+    """
+    Build the map payload for every geography of a type on one date.
+
+    The output matches what the MapData view has always returned:
+    geographies that fall below the display threshold get a null value.
+    """
+    from data_research.models import NationalMortgageData
+    national = NationalMortgageData.objects.get(date=date)
+    national_value = delinquency_value(
+        days_late, national.total, national.thirty, national.sixty,
+        national.ninety)
+    meta = {'fips_type': MAP_GEOS[geo], 'date': '{}'.format(date)}
+    if geo == 'national':
+        return {'meta': meta,
+                'data': {'value': national_value, 'name': 'United States'}}
+    meta['national_average'] = national_value
+    data = {}
+    for fips, name, valid, values in _map_rows(geo, date):
+        value = delinquency_value(days_late, *values) if valid else None
+        data[fips] = {'value': value, 'name': name}
+    return {'meta': meta, 'data': data}
+
+
+def get_map_payload(days_late, geo, date):
+    """Return the cached map payload, building it on a miss."""
+    key = MAP_PAYLOAD_KEY.format(get_meta_version(), days_late, geo, date)
+    payload_cache = get_payload_cache()
+    payload = payload_cache.get(key)
+    if payload is None:
+        payload = build_map_payload(days_late, geo, date)
+        payload_cache.set(key, payload)
+    return payload
+
+
+def rebuild_time_series_payloads():
+    """
+    Invalidate and re-warm every time-series payload the API can serve.
+
+    Each geography type is loaded with a single query, so the full store
+    is rebuilt in a handful of queries rather than one per FIPS.
+    """
+    from data_research.models import (
+        County, CountyMortgageData, MetroArea, MSAMortgageData,
+        NonMSAMortgageData, State, StateMortgageData
+    )
+    starter = datetime.datetime.now()
+    bump_meta_version()
+    version = get_meta_version()
+    references = get_reference_sets()
+    allowlist = references['allowlist']
+    payloads = {}
+
+    for days_late, payload in build_national_payloads().items():
+        payloads[_payload_key(days_late, NATIONAL, version)] = payload
+
+    states = {state.fips: state for state in State.objects.all()}
+    metros = {metro.fips: metro
+              for metro in MetroArea.objects.filter(valid=True)}
+    counties = {
+        county.fips: county
+        for county in County.objects.filter(
+            valid=True).select_related('state')}
+
+    def metas():
+        for fips in allowlist:
+            if len(fips) == 2 and fips in states:
+                yield StateMortgageData, fips, {
+                    'fips': fips, 'name': states[fips].name,
+                    'fips_type': 'state'}
+            elif 'non' in fips and fips[:2] in states:
+                yield NonMSAMortgageData, fips, {
+                    'fips': fips,
+                    'name': "Non-metro area of {}".format(
+                        states[fips[:2]].name),
+                    'fips_type': 'non_msa'}
+            elif fips in references['msa_fips']:
+                if fips in metros:
+                    yield MSAMortgageData, fips, {
+                        'fips': fips, 'name': metros[fips].name,
+                        'fips_type': 'msa'}
+            elif fips in counties:
+                county = counties[fips]
+                yield CountyMortgageData, fips, {
+                    'fips': fips,
+                    'name': "{}, {}".format(county.name, county.state.abbr),
+                    'fips_type': 'county'}
+
+    by_model = {}
+    for model, fips, meta in metas():
+        by_model.setdefault(model, {})[fips] = meta
+
+    for model, model_metas in by_model.items():
+        grouped = _grouped_rows(
+            model.objects.filter(fips__in=list(model_metas)))
+        for fips, meta in model_metas.items():
+            rows = grouped.get(fips, [])
+            for days_late in DAYS_LATE_RANGE:
+                payloads[_payload_key(days_late, fips, version)] = (
+                    _assemble(meta, rows, days_late))
+
+    get_payload_cache().set_many(payloads)
+    logger.info("Rebuilt {} mortgage time-series payloads in {}".format(
+        len(payloads), datetime.datetime.now() - starter))
+    return len(payloads)
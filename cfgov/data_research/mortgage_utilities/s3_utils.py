@@ -25,6 +25,52 @@ def read_in_s3_csv(url):
     return reader
 
 
+def stream_s3_csv(url):
+    """
+    Return a DictReader that consumes a remote CSV line by line.
+
+    Unlike read_in_s3_csv, the response body is never held in memory
+    as a whole, so very large source files can be processed in constant
+    space.
+    """
+    response = requests.get(url, stream=True)
+    response.raise_for_status()
+    lines = (
+        line.decode('utf-8') for line in response.iter_lines() if line
+    )
+    return csv.DictReader(lines)
+
+
+def csv_upload_args():
+    """Return the S3 object settings we use for public CSV downloads."""
+    expire_date = datetime.datetime.utcnow() + datetime.timedelta(days=365)
+    return {
+        'ACL': 'public-read',
+        'ContentType': 'text/csv',
+        'CacheControl': 'max-age=2592000,public',
+        'Expires': expire_date.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+    }
+
+
+def upload_csv_file_to_s3(slug, file_path, sub_bucket=None, s3=None):
+    """
+    Post a CSV file from local disk to a cfgov.files sub_bucket.
+
+    This behaves like bake_csv_to_s3, but boto3's managed transfer sends
+    the file in chunks, so the file never has to be held in memory.
+    """
+    if sub_bucket is None:
+        sub_bucket = 'data'
+    if s3 is None:
+        s3 = boto3.client('s3')
+    s3.upload_file(
+        file_path,
+        settings.AWS_STORAGE_BUCKET_NAME,
+        '{}/{}.csv'.format(sub_bucket, slug),
+        ExtraArgs=csv_upload_args()
+    )
+
+
 def bake_csv_to_s3(slug, csv_file_obj, sub_bucket=None):
     """A utility for posting CSV files to a cfgov.files sub_bucket.
 
@@ -1,8 +1,14 @@
 import csv
 import datetime
+import itertools
 import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from io import StringIO
 
+from django.db import connections
+
 from dateutil import parser
 
 from core.utils import format_file_size
@@ -12,7 +18,8 @@ from data_research.models import (
 )
 from data_research.mortgage_utilities.fips_meta import FIPS, load_fips_meta
 from data_research.mortgage_utilities.s3_utils import (
-    MORTGAGE_SUB_BUCKET, S3_MORTGAGE_DOWNLOADS_BASE, bake_csv_to_s3
+    MORTGAGE_SUB_BUCKET, S3_MORTGAGE_DOWNLOADS_BASE, bake_csv_to_s3,
+    upload_csv_file_to_s3
 )
 
 
@@ -33,6 +40,17 @@ LATE_VALUE_TITLE = {
     'percent_90': 'Percent-90-plus',
 }
 
+GEO_TYPES = ['County', 'MetroArea', 'State']
+EXPORT_PROCESSES = len(GEO_TYPES)
+
+GEO_HEADINGS = {
+    'County': ['RegionType', 'State', 'Name', 'FIPSCode'],
+    'MetroArea': ['RegionType', 'Name', 'CBSACode'],
+    'State': ['RegionType', 'Name', 'FIPSCode'],
+}
+
+COUNT_FIELDS = ('total', 'thirty', 'sixty', 'ninety')
+
 
 logger = logging.getLogger(__name__)
 
@@ -189,15 +207,134 @@ def export_downloadable_csv(geo_type, late_value):
     save_metadata(csv_size, slug, thru_month, late_value, geo_type)
 
 
-def run(prep_only=False):
+def percentages(total, thirty, sixty, ninety):
+    """Return rounded 30-89 and 90+ day percentages for a set of counts."""
+    if total == 0:
+        return {'percent_30_60': 0, 'percent_90': 0}
+    return {
+        'percent_30_60': round_pct((thirty + sixty) * 1.0 / total),
+        'percent_90': round_pct(ninety * 1.0 / total),
+    }
+
+
+def stream_geo_rows(geo_type):
+    """
+    Yield (row_starter, percentages_by_date) for every geography in a CSV,
+    in FIPS order, streaming each model's records from a single query.
+    """
+    if geo_type == 'County':
+        sources = [(
+            'County',
+            CountyMortgageData.objects.filter(county__valid=True),
+            ('county__state__abbr', 'county__name'),
+            lambda fips, abbr, name: [
+                'County', abbr, name, "'{}'".format(fips)],
+        )]
+    elif geo_type == 'MetroArea':
+        sources = [(
+            'MetroArea',
+            MSAMortgageData.objects.filter(msa__valid=True),
+            ('msa__name',),
+            lambda fips, name: ['MetroArea', name, fips],
+        ), (
+            'NonMetroArea',
+            NonMSAMortgageData.objects.filter(state__non_msa_valid=True),
+            ('state__name',),
+            lambda fips, name: ['NonMetroArea', name, fips],
+        )]
+    else:
+        sources = [(
+            'State',
+            StateMortgageData.objects.exclude(fips__in=STATES_TO_IGNORE),
+            ('state__name',),
+            lambda fips, name: ['State', name, "'{}'".format(fips)],
+        )]
+    for _type, queryset, label_fields, starter in sources:
+        rows = queryset.order_by('fips', 'date').values_list(
+            'fips', *(label_fields + COUNT_FIELDS)).iterator()
+        for fips, records in itertools.groupby(rows, key=lambda r: r[0]):
+            records = list(records)
+            labels = records[0][1:1 + len(label_fields)]
+            yield (
+                starter(fips, *labels),
+                [percentages(*record[1 + len(label_fields):])
+                 for record in records]
+            )
+
+
+def export_geo_type(geo_type):
+    """
+    Write the 30-89 and 90+ day CSVs for a geo type in a single pass and
+    upload them to S3 from local disk.
+
+    Returns the metadata needed to record each file with save_metadata,
+    so that metadata can be saved by a single process.
+    """
+    thru_month = FIPS.dates[-1][:-3]
+    headings = GEO_HEADINGS[geo_type]
+    nation_starter = [NATION_STARTER[heading] for heading in headings]
+    outputs = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for late_value in LATE_VALUE_TITLE:
+            slug = "{}Mortgages{}DaysLate-thru-{}".format(
+                geo_type, LATE_VALUE_TITLE[late_value], thru_month)
+            path = os.path.join(tmpdir, '{}.csv'.format(slug))
+            csvfile = open(path, 'w', newline='', encoding='utf-8')
+            writer = csv.writer(csvfile)
+            writer.writerow(headings + FIPS.short_dates)
+            writer.writerow(nation_starter + FIPS.nation_row[late_value])
+            outputs[late_value] = (slug, path, csvfile, writer)
+        try:
+            for starter, values in stream_geo_rows(geo_type):
+                for late_value, output in outputs.items():
+                    output[3].writerow(
+                        starter + [value[late_value] for value in values])
+        finally:
+            for output in outputs.values():
+                output[2].close()
+        exported = []
+        for late_value, (slug, path, _file, _writer) in outputs.items():
+            upload_csv_file_to_s3(
+                slug,
+                path,
+                sub_bucket="{}/downloads".format(MORTGAGE_SUB_BUCKET))
+            logger.info("Baked {} to S3".format(slug))
+            exported.append({
+                'csv_size': format_file_size(os.path.getsize(path)),
+                'slug': slug,
+                'thru_month': thru_month,
+                'days_late': late_value,
+                'geo_type': geo_type,
+            })
+    return exported
+
+
+def export_all(processes=EXPORT_PROCESSES):
+    """
+    Export every public CSV, spreading geo types across a process pool.
+
+    Database connections are closed before forking so that each worker
+    opens its own.
+    """
+    starter = datetime.datetime.now()
+    if processes > 1:
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(export_geo_type, GEO_TYPES))
+    else:
+        results = [export_geo_type(geo_type) for geo_type in GEO_TYPES]
+    for exported in results:
+        for meta in exported:
+            save_metadata(**meta)
+    logger.info("Exported public CSVs in {}".format(
+        datetime.datetime.now() - starter))
+
+
+def run(prep_only=False, processes=EXPORT_PROCESSES):
     load_fips_meta()
     date_set = [parser.parse(date).date() for date in FIPS.dates]
     fill_nation_row_date_values(date_set)
 
     if prep_only is False:
         logger.info('Exporting public CSVs to S3 ...')
-        for geo in ['County', 'MetroArea', 'State']:
-            export_downloadable_csv(geo, 'percent_30_60')
-            logger.info('Exported 30-89-day {} CSV'.format(geo))
-            export_downloadable_csv(geo, 'percent_90')
-            logger.info('Exported 90-day {} CSV'.format(geo))
+        export_all(processes=processes)
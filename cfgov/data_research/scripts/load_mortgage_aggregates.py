@@ -2,6 +2,8 @@ import datetime
 import logging
 import os
 
+from django.db.models import Sum
+
 from dateutil import parser
 
 from data_research.models import (
@@ -14,6 +16,10 @@ from data_research.models import (
 logger = logging.getLogger(__name__)
 script = os.path.basename(__file__)
 
+COUNT_FIELDS = ['total', 'current', 'thirty', 'sixty', 'ninety', 'other']
+LEGACY_FLAG = 'legacy'
+BATCH_SIZE = 5000
+
 
 def update_sampling_dates():
     """
@@ -90,12 +96,98 @@ def load_national_values(date):
     record.aggregate_data()
 
 
-def run():
+def sum_counties_by_date(county_list):
+    """
+    Return {date: {field: sum}} for a list of county FIPS codes.
+
+    The sums are calculated by the database with a single grouped query.
+    """
+    rows = CountyMortgageData.objects.filter(
+        fips__in=county_list
+    ).values('date').annotate(
+        **{'sum_{}'.format(field): Sum(field) for field in COUNT_FIELDS}
+    ).order_by()
+    return {
+        row['date']: {
+            field: row['sum_{}'.format(field)] or 0
+            for field in COUNT_FIELDS
+        }
+        for row in rows
+    }
+
+
+def build_records(model, dates, county_list, sums=None, **kwargs):
+    """
+    Return unsaved aggregate records of `model` for every sampling date.
+
+    This mirrors MortgageBase.aggregate_data: a geography with no counties
+    gets empty records (zeros for non-MSA records), and a date with no
+    county data gets zeros.
+    """
+    if sums is None:
+        sums = sum_counties_by_date(county_list) if county_list else {}
+    if county_list or model is NonMSAMortgageData:
+        zeros = {field: 0 for field in COUNT_FIELDS}
+        return [model(date=date, **dict(kwargs, **sums.get(date, zeros)))
+                for date in dates]
+    return [model(date=date, **kwargs) for date in dates]
+
+
+def aggregate_all(dates):
+    """
+    Create MSA, state, non-MSA and national records for all dates at once.
+
+    This issues one grouped SUM query per geography instead of one query
+    per geography and date, and writes each record type with bulk_create.
+    """
+    msa_records = []
+    for metro in MetroArea.objects.all():
+        msa_records += build_records(
+            MSAMortgageData, dates, metro.counties,
+            msa=metro, fips=metro.fips)
+    MSAMortgageData.objects.bulk_create(msa_records, batch_size=BATCH_SIZE)
+
+    state_records = []
+    non_msa_records = []
+    national_sums = {
+        date: {field: 0 for field in COUNT_FIELDS} for date in dates}
+    for state in State.objects.all():
+        state_sums = (
+            sum_counties_by_date(state.counties) if state.counties else {})
+        for date, counts in state_sums.items():
+            if date in national_sums:
+                for field in COUNT_FIELDS:
+                    national_sums[date][field] += counts[field]
+        state_records += build_records(
+            StateMortgageData, dates, state.counties, sums=state_sums,
+            state=state, fips=state.fips)
+        non_msa_records += build_records(
+            NonMSAMortgageData, dates, state.non_msa_counties,
+            state=state, fips='{}-non'.format(state.fips))
+    StateMortgageData.objects.bulk_create(
+        state_records, batch_size=BATCH_SIZE)
+    NonMSAMortgageData.objects.bulk_create(
+        non_msa_records, batch_size=BATCH_SIZE)
+
+    NationalMortgageData.objects.bulk_create(
+        [NationalMortgageData(date=date, fips='-----', **national_sums[date])
+         for date in dates],
+        batch_size=BATCH_SIZE)
+    logger.info("Created {} MSA, {} state and {} non-MSA records "
+                "for {} dates".format(len(msa_records), len(state_records),
+                                      len(non_msa_records), len(dates)))
+
+
+def run(*args):
     """
     This script should be run following a refresh of county mortgage data.
 
     The script wipes national, state and metro-based aggregate records,
     creates new ones for every date in range, and then updates metadata.
+
+    Aggregates are calculated in bulk by default. Pass `legacy` to use the
+    original per-date, per-geography calculation, for comparing output:
+    `manage.py runscript load_mortgage_aggregates --script-args legacy`
     """
     starter = datetime.datetime.now()
     aggregate_classes = [
@@ -109,14 +201,19 @@ def run():
     merge_the_dades()
     validate_counties()
     dates = MortgageMetaData.objects.get(name='sampling_dates').json_value
-    for date_string in dates:
-        date = parser.parse(date_string).date()
-        logger.info(
-            "Aggregating data for {}".format(date))
-        load_msa_values(date)
-        load_state_values(date)
-        load_non_msa_state_values(date)
-        load_national_values(date)
+    if LEGACY_FLAG in args:
+        for date_string in dates:
+            date = parser.parse(date_string).date()
+            logger.info(
+                "Aggregating data for {}".format(date))
+            load_msa_values(date)
+            load_state_values(date)
+            load_non_msa_state_values(date)
+            load_national_values(date)
+    else:
+        logger.info("Aggregating data for {} dates".format(len(dates)))
+        aggregate_all(
+            [parser.parse(date_string).date() for date_string in dates])
     logger.info("Validating MSAs and non-MSAs")
     for metro in MetroArea.objects.all():
         metro.validate()
@@ -2,6 +2,7 @@ import csv
 import datetime
 import logging
 import os
+import resource
 import sys
 from io import StringIO
 
@@ -11,8 +12,11 @@ from data_research.models import (
     County, CountyMortgageData, MortgageDataConstant
 )
 from data_research.mortgage_utilities.fips_meta import validate_fips
+from data_research.mortgage_utilities.payloads import (
+    rebuild_time_series_payloads
+)
 from data_research.mortgage_utilities.s3_utils import (
-    S3_SOURCE_BUCKET, S3_SOURCE_FILE, read_in_s3_csv
+    S3_SOURCE_BUCKET, S3_SOURCE_FILE, read_in_s3_csv, stream_s3_csv
 )
 from data_research.scripts import (
     export_public_csvs, load_mortgage_aggregates, update_county_msa_meta
@@ -20,6 +24,8 @@ from data_research.scripts import (
 
 
 DEFAULT_DUMP_SLUG = '/tmp/mp_countydata'
+BATCH_SIZE = 5000
+STREAM_FLAG = 'stream'
 DATAFILE = StringIO()
 SCRIPT_NAME = os.path.basename(__file__).split('.')[0]
 logger = logging.getLogger(__name__)
@@ -32,6 +38,42 @@ def update_through_date_constant(date):
     constant.save()
 
 
+def parse_sampling_date(raw_date):
+    """
+    Parse a source-file date without the overhead of dateutil.
+
+    The source CSV uses MM/DD/YY dates, so we handle that format (and ISO
+    YYYY-MM-DD) directly and only fall back to dateutil for anything else.
+    """
+    try:
+        if '/' in raw_date:
+            month, day, year = raw_date.split('/')
+            year = int(year)
+            if year < 100:
+                year += 2000
+            return datetime.date(year, int(month), int(day))
+        if '-' in raw_date:
+            year, month, day = raw_date.split('-')
+            return datetime.date(int(year), int(month), int(day))
+    except ValueError:
+        pass
+    return parser.parse(raw_date).date()
+
+
+def load_county_ids():
+    """Return a mapping of county FIPS codes to County primary keys."""
+    return dict(County.objects.values_list('fips', 'pk'))
+
+
+def peak_memory_mb():
+    """Return the peak resident memory of this process, in megabytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':  # pragma: no cover
+        # macOS reports bytes, Linux reports kilobytes
+        peak = peak / 1024
+    return round(peak / 1024.0, 1)
+
+
 def dump_as_csv(rows_out, dump_slug):
     """
     Drops a headerless CSV to `/tmp/mp_countydata.csv
@@ -123,6 +165,94 @@ def process_source(
         )
 
 
+def process_source_streaming(
+        starting_date, through_date, dump_slug=None, batch_size=BATCH_SIZE):
+    """
+    Re-generate the county_mortgage_data table in bounded memory.
+
+    This produces the same records as process_source, but it streams the
+    source CSV, resolves counties from a FIPS map that is loaded once,
+    and writes records in batches of `batch_size` rather than holding
+    the whole table in memory for a single bulk_create.
+
+    Source rows whose FIPS has no matching County are skipped and counted.
+    """
+    starter = datetime.datetime.now()
+    county_ids = load_county_ids()
+    counter = 0
+    skipped = 0
+    pk = 1
+    batch = []
+    CountyMortgageData.objects.all().delete()
+    source_url = "{}/{}".format(S3_SOURCE_BUCKET, S3_SOURCE_FILE)
+    dump_file = None
+    dump_writer = None
+    if dump_slug:
+        dump_file = open('{}.csv'.format(dump_slug), 'w')
+        dump_writer = csv.writer(dump_file)
+    try:
+        for row in stream_s3_csv(source_url):
+            sampling_date = parse_sampling_date(row.get('date'))
+            if not starting_date <= sampling_date <= through_date:
+                continue
+            valid_fips = validate_fips(row.get('fips'))
+            if not valid_fips:
+                continue
+            county_id = county_ids.get(valid_fips)
+            if county_id is None:
+                skipped += 1
+                continue
+            batch.append(
+                CountyMortgageData(
+                    pk=pk,
+                    fips=valid_fips,
+                    date=sampling_date,
+                    total=row.get('open'),
+                    current=row.get('current'),
+                    thirty=row.get('thirty'),
+                    sixty=row.get('sixty'),
+                    ninety=row.get('ninety'),
+                    other=row.get('other'),
+                    county_id=county_id
+                ))
+            if dump_writer:
+                dump_writer.writerow((
+                    pk,
+                    valid_fips,
+                    "{}".format(sampling_date),
+                    row.get('open'),
+                    row.get('current'),
+                    row.get('thirty'),
+                    row.get('sixty'),
+                    row.get('ninety'),
+                    row.get('other'),
+                    county_id,
+                ))
+            pk += 1
+            counter += 1
+            if len(batch) >= batch_size:
+                CountyMortgageData.objects.bulk_create(batch)
+                batch = []
+            if counter % 100000 == 0:  # pragma: no cover
+                logger.info("{} records written".format(counter))
+        if batch:
+            CountyMortgageData.objects.bulk_create(batch)
+    finally:
+        if dump_file:
+            dump_file.close()
+    elapsed = (datetime.datetime.now() - starter).total_seconds()
+    rate = int(counter / elapsed) if elapsed else counter
+    if skipped:
+        logger.warning(
+            "Skipped {} rows with FIPS codes that have "
+            "no matching county".format(skipped))
+    logger.info(
+        '{} took {} seconds to create {} countymortgage records '
+        '({} rows/sec, peak memory {} MB)'.format(
+            SCRIPT_NAME, round(elapsed, 1), counter, rate, peak_memory_mb()))
+    return counter
+
+
 def run(*args):
     """
     Proces latest data source and optionally drop a CSV of result.
@@ -130,7 +260,12 @@ def run(*args):
     The script ingests a through-date (YYYY-MM-DD) and dump location/slug.
     Sample command:
     `manage.py runscript process_mortgage_data --script-args 2017-03-01 /tmp/mp_countydata`  # noqa: E501
+
+    Add `stream` to the script args to use the bounded-memory ingest:
+    `manage.py runscript process_mortgage_data --script-args 2017-03-01 stream`  # noqa: E501
     """
+    stream = STREAM_FLAG in args
+    args = [arg for arg in args if arg != STREAM_FLAG]
     dump_slug = None
     starting_date = MortgageDataConstant.objects.get(
         name='starting_date').date_value
@@ -139,11 +274,16 @@ def run(*args):
         update_through_date_constant(through_date)
         if len(args) > 1:
             dump_slug = args[1]
-        process_source(
-            starting_date, through_date, dump_slug=dump_slug)
+        if stream:
+            process_source_streaming(
+                starting_date, through_date, dump_slug=dump_slug)
+        else:
+            process_source(
+                starting_date, through_date, dump_slug=dump_slug)
         load_mortgage_aggregates.run()
         update_county_msa_meta.run()
         export_public_csvs.run()
+        rebuild_time_series_payloads()
     else:
         logger.info(
             "Please provide a through-date (YYYY-MM-DD).\n"
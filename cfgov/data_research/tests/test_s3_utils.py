@@ -1,4 +1,5 @@
 import csv
+import tempfile
 from io import BytesIO, StringIO
 
 from django.test import TestCase, override_settings
@@ -8,7 +9,7 @@ import moto
 import responses
 
 from data_research.mortgage_utilities.s3_utils import (
-    bake_csv_to_s3, read_in_s3_csv
+    bake_csv_to_s3, read_in_s3_csv, stream_s3_csv, upload_csv_file_to_s3
 )
 
 
@@ -21,6 +22,16 @@ class S3UtilsTests(TestCase):
         self.assertEqual(reader.fieldnames, ['a', 'b', 'c'])
         self.assertEqual(sorted(next(reader).values()), ['d', 'e', 'f'])
 
+    @responses.activate
+    def test_stream_s3_csv(self):
+        url = 'https://test.url/foo.csv'
+        responses.add(responses.GET, url, body='a,b,c\nd,e,f\ng,h,i\n')
+        reader = stream_s3_csv(url)
+        rows = list(reader)
+        self.assertEqual(reader.fieldnames, ['a', 'b', 'c'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1]['c'], 'i')
+
     @moto.mock_s3
     @override_settings(AWS_STORAGE_BUCKET_NAME='test.bucket')
     def test_bake_csv_to_s3(self):
@@ -55,3 +66,20 @@ class S3UtilsTests(TestCase):
             },
             acl.grants
         )
+
+    @moto.mock_s3
+    @override_settings(AWS_STORAGE_BUCKET_NAME='test.bucket')
+    def test_upload_csv_file_to_s3(self):
+        s3 = boto3.resource('s3')
+        bucket = s3.Bucket('test.bucket')
+        bucket.create(ACL='private')
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write('a,b,c\r\n1,2,3\r\n')
+            f.flush()
+            upload_csv_file_to_s3('foo', f.name, sub_bucket='data/sub')
+
+        key = bucket.Object('data/sub/foo.csv')
+        response = key.get()
+        self.assertEqual(response['Body'].read(), b'a,b,c\r\n1,2,3\r\n')
+        self.assertEqual(response['ContentType'], 'text/csv')
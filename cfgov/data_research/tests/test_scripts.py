@@ -15,20 +15,20 @@ from data_research.models import (
     MortgageMetaData, MSAMortgageData, NationalMortgageData,
     NonMSAMortgageData, State, StateMortgageData, validate_counties
 )
-from data_research.mortgage_utilities.fips_meta import validate_fips
+from data_research.mortgage_utilities.fips_meta import FIPS, validate_fips
 from data_research.scripts.export_public_csvs import (
-    export_downloadable_csv, round_pct, row_starter, run as run_export,
-    save_metadata
+    export_downloadable_csv, export_geo_type, round_pct, row_starter,
+    run as run_export, save_metadata
 )
 from data_research.scripts.load_mortgage_aggregates import (
-    load_msa_values, load_national_values, load_non_msa_state_values,
-    load_state_values, merge_the_dades, run as run_aggregates,
-    update_sampling_dates
+    aggregate_all, load_msa_values, load_national_values,
+    load_non_msa_state_values, load_state_values, merge_the_dades,
+    run as run_aggregates, update_sampling_dates
 )
 from data_research.scripts.load_mortgage_performance_csv import load_values
 from data_research.scripts.process_mortgage_data import (
-    dump_as_csv, process_source, run as run_process_mortgage_data,
-    update_through_date_constant
+    dump_as_csv, parse_sampling_date, process_source, process_source_streaming,
+    run as run_process_mortgage_data, update_through_date_constant
 )
 from data_research.scripts.update_county_msa_meta import (
     run as run_update, update_state_to_geo_meta
@@ -131,6 +131,66 @@ class SourceToTableTest(django.test.TestCase):
         self.assertEqual(mock_read.call_count, 1)
         self.assertEqual(mock_dump.call_count, 1)
 
+    def test_parse_sampling_date(self):
+        for raw in ['01/02/10', '1/2/2010', '2010-01-02', 'Jan 2 2010']:
+            self.assertEqual(
+                parse_sampling_date(raw), datetime.date(2010, 1, 2))
+
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'stream_s3_csv')
+    def test_process_source_streaming(self, mock_stream):
+        mock_stream.return_value = iter([
+            {'date': '01/01/10', 'fips': '1001', 'open': '268',
+             'current': '260', 'thirty': '4', 'sixty': '1', 'ninety': '0',
+             'other': '3'},
+            {'date': '02/01/10', 'fips': '01001', 'open': '280',
+             'current': '290', 'thirty': '20', 'sixty': '10', 'ninety': '4',
+             'other': '3'},
+            {'date': '02/01/01', 'fips': '01001', 'open': '1',
+             'current': '1', 'thirty': '0', 'sixty': '0', 'ninety': '0',
+             'other': '0'},
+            {'date': '02/01/10', 'fips': '99999', 'open': '1',
+             'current': '1', 'thirty': '0', 'sixty': '0', 'ninety': '0',
+             'other': '0'},
+        ])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            slug = '{}/mp_countydata'.format(tmpdir)
+            created = process_source_streaming(
+                self.start_date, self.through_date,
+                dump_slug=slug, batch_size=1)
+            with open('{}.csv'.format(slug)) as f:
+                dumped = list(csv.reader(f))
+        self.assertEqual(created, 2)
+        self.assertEqual(CountyMortgageData.objects.count(), 2)
+        self.assertEqual(
+            CountyMortgageData.objects.filter(county_id=2891).count(), 2)
+        self.assertEqual(len(dumped), 2)
+        self.assertEqual(
+            dumped[1],
+            ['2', '01001', '2010-02-01', '280', '290', '20', '10', '4', '3',
+             '2891'])
+
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'process_source_streaming')
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'process_source')
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'update_through_date_constant')
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'load_mortgage_aggregates.run')
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'update_county_msa_meta.run')
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'export_public_csvs.run')
+    def test_run_command_stream(
+            self, mock_export, mock_meta_update, mock_aggregates,
+            mock_update_constants, mock_process, mock_stream):
+        run_process_mortgage_data('2018-06-01', 'stream', 'mock_slug')
+        self.assertEqual(mock_process.call_count, 0)
+        self.assertEqual(mock_stream.call_count, 1)
+        self.assertEqual(
+            mock_stream.call_args[1]['dump_slug'], 'mock_slug')
+
     @mock.patch('data_research.scripts.process_mortgage_data.'
                 'process_source')
     @mock.patch('data_research.scripts.process_mortgage_data.'
@@ -401,6 +461,58 @@ class DataExportTest(django.test.TestCase):
         export_downloadable_csv('State', 'percent_90')
         self.assertEqual(mock_bake.call_count, 6)
 
+    @mock.patch(
+        'data_research.scripts.export_public_csvs.upload_csv_file_to_s3')
+    def test_export_geo_type(self, mock_upload):
+        uploaded = {}
+
+        def read_upload(slug, path, sub_bucket=None):
+            with open(path) as f:
+                uploaded[slug] = list(csv.reader(f))
+
+        mock_upload.side_effect = read_upload
+        run_export(prep_only=True)
+        thru_month = FIPS.dates[-1][:-3]
+        exported = export_geo_type('MetroArea')
+        self.assertEqual(mock_upload.call_count, 2)
+        self.assertEqual(
+            sorted(meta['days_late'] for meta in exported),
+            ['percent_30_60', 'percent_90'])
+        rows = uploaded[
+            'MetroAreaMortgagesPercent-90-plusDaysLate-thru-{}'.format(
+                thru_month)]
+        self.assertEqual(rows[0][:3], ['RegionType', 'Name', 'CBSACode'])
+        self.assertEqual(rows[1][:3], ['National', 'United States', '-----'])
+        self.assertEqual(
+            rows[2],
+            ['MetroArea', 'North Port-Sarasota-Bradenton, FL', '35840',
+             '6.2'])
+        self.assertEqual(
+            rows[3], ['NonMetroArea', 'Florida', '12-non', '6.2'])
+        rows = uploaded[
+            'MetroAreaMortgagesPercent-30-89DaysLate-thru-{}'.format(
+                thru_month)]
+        self.assertEqual(rows[2][3], '21.8')
+
+    @mock.patch(
+        'data_research.scripts.export_public_csvs.upload_csv_file_to_s3')
+    def test_export_geo_type_county_and_state(self, mock_upload):
+        uploaded = {}
+
+        def read_upload(slug, path, sub_bucket=None):
+            with open(path) as f:
+                uploaded[slug.split('Mortgages')[0]] = list(csv.reader(f))
+
+        mock_upload.side_effect = read_upload
+        run_export(prep_only=True)
+        export_geo_type('County')
+        export_geo_type('State')
+        self.assertEqual(
+            uploaded['County'][2],
+            ['County', 'FL', 'Manatee County', "'12081'", '6.1'])
+        self.assertEqual(
+            uploaded['State'][2], ['State', 'Florida', "'12'", '15.2'])
+
     def test_row_starter(self):
         """
         def row_starter(geo_type, obj):
@@ -453,11 +565,13 @@ class RunExportTest(django.test.TestCase):
 
     fixtures = ['mortgage_constants.json', 'mortgage_metadata.json']
 
-    @mock.patch(
-        'data_research.scripts.export_public_csvs.export_downloadable_csv')
-    def test_run_export(self, mock_export):
-        run_export()
-        self.assertEqual(mock_export.call_count, 6)
+    @mock.patch('data_research.scripts.export_public_csvs.save_metadata')
+    @mock.patch('data_research.scripts.export_public_csvs.export_geo_type')
+    def test_run_export(self, mock_export, mock_save):
+        mock_export.return_value = [{'slug': 'slug'}, {'slug': 'slug'}]
+        run_export(processes=1)
+        self.assertEqual(mock_export.call_count, 3)
+        self.assertEqual(mock_save.call_count, 6)
 
 
 class DataLoadTest(django.test.TestCase):
@@ -604,6 +718,108 @@ class DataLoadTest(django.test.TestCase):
         self.assertEqual(MSAMortgageData.objects.count(), 1)
         self.assertEqual(NonMSAMortgageData.objects.count(), 1)
 
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.aggregate_all')
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.load_msa_values')
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.update_sampling_dates')
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.validate_counties')
+    def test_run_aggregates_legacy(
+            self, mock_validate_counties, mock_update_dates, mock_load_msa,
+            mock_aggregate_all):
+        dates = MortgageMetaData.objects.get(
+            name='sampling_dates')
+        dates.json_value = ['2016-01-01']
+        dates.save()
+        run_aggregates('legacy')
+        self.assertEqual(mock_load_msa.call_count, 1)
+        self.assertEqual(mock_aggregate_all.call_count, 0)
+
+
+class AggregateAllTest(django.test.TestCase):
+    """Test the bulk aggregation engine against the legacy path."""
+
+    fixtures = ['mortgage_constants.json', 'mortgage_metadata.json']
+
+    dates = [datetime.date(2016, 1, 1), datetime.date(2016, 2, 1)]
+
+    def setUp(self):
+        FL = baker.make(
+            State,
+            fips='12',
+            abbr='FL',
+            counties=['12081', '12001'],
+            msas=['35840'],
+            non_msa_counties=['12001'])
+        baker.make(
+            State,
+            fips='13',
+            abbr='GA',
+            counties=['13001'],
+            msas=[],
+            non_msa_counties=[])
+        baker.make(
+            MetroArea,
+            fips='35840',
+            counties=['12081'],
+            states=['12'],
+            valid=True)
+        for fips, date, total in [
+                ('12081', self.dates[0], 100),
+                ('12081', self.dates[1], 200),
+                ('12001', self.dates[0], 10),
+                ('13001', self.dates[0], 1)]:
+            baker.make(
+                CountyMortgageData,
+                fips=fips,
+                date=date,
+                total=total,
+                current=total,
+                thirty=1,
+                sixty=1,
+                ninety=1,
+                other=0,
+                county=baker.make(County, fips=fips, state=FL, valid=True))
+
+    def snapshot(self):
+        snapshot = []
+        for cls in [MSAMortgageData, StateMortgageData, NonMSAMortgageData,
+                    NationalMortgageData]:
+            snapshot += sorted(cls.objects.values_list(
+                'fips', 'date', 'total', 'current', 'thirty', 'sixty',
+                'ninety', 'other'))
+        return snapshot
+
+    def test_aggregate_all_values(self):
+        aggregate_all(self.dates)
+        self.assertEqual(
+            MSAMortgageData.objects.get(date=self.dates[1]).total, 200)
+        self.assertEqual(
+            StateMortgageData.objects.get(
+                fips='12', date=self.dates[0]).total, 110)
+        self.assertEqual(
+            NonMSAMortgageData.objects.get(
+                fips='13-non', date=self.dates[0]).total, 0)
+        self.assertEqual(
+            NationalMortgageData.objects.get(date=self.dates[0]).total, 111)
+        self.assertEqual(
+            NationalMortgageData.objects.get(date=self.dates[0]).thirty, 3)
+
+    def test_aggregate_all_matches_legacy(self):
+        for date in self.dates:
+            load_msa_values(date)
+            load_state_values(date)
+            load_non_msa_state_values(date)
+            load_national_values(date)
+        legacy = self.snapshot()
+        for cls in [MSAMortgageData, StateMortgageData, NonMSAMortgageData,
+                    NationalMortgageData]:
+            cls.objects.all().delete()
+        aggregate_all(self.dates)
+        self.assertEqual(self.snapshot(), legacy)
+
 
 class UpdateSamplingDatesTest(django.test.TestCase):
 
@@ -1,19 +1,37 @@
 import datetime
 import json
 import unittest
+from unittest import mock
 
 import django
+from django.core.cache import caches
+from django.test import override_settings
 from django.urls import NoReverseMatch, reverse
 
 from model_bakery import baker
 
 from data_research.models import (
-    County, CountyMortgageData, MetroArea, MSAMortgageData,
+    County, CountyMortgageData, MetroArea, MortgageMetaData, MSAMortgageData,
     NationalMortgageData, NonMSAMortgageData, State, StateMortgageData
 )
+from data_research.mortgage_utilities.payloads import (
+    _payload_key, get_reference_sets, get_time_series_payload,
+    rebuild_time_series_payloads
+)
 from data_research.views import validate_year_month
 
 
+PAYLOAD_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+    },
+    "mortgage_performance": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    },
+}
+
+
 class YearMonthValidatorTests(unittest.TestCase):
     """check the year_month validator"""
 
@@ -272,6 +290,92 @@ class TimeseriesViewTests(django.test.TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
+    def test_timeseries_payload_matches_records(self):
+        for fips, model in [("12", StateMortgageData),
+                            ("12-non", NonMSAMortgageData),
+                            ("35840", MSAMortgageData),
+                            ("12081", CountyMortgageData)]:
+            for days_late in ["30-89", "90"]:
+                payload = get_time_series_payload(days_late, fips)
+                self.assertEqual(payload["meta"]["fips"], fips)
+                self.assertEqual(
+                    payload["data"],
+                    [record.time_series(days_late)
+                     for record in model.objects.filter(fips=fips)],
+                )
+        national = get_time_series_payload("90", "national")
+        self.assertEqual(
+            national["data"],
+            [record.time_series("90")
+             for record in NationalMortgageData.objects.all()],
+        )
+
+    def test_reference_sets_reload_on_metadata_save(self):
+        self.assertIn("12081", get_reference_sets()["allowlist"])
+        allowlist = MortgageMetaData.objects.get(name="allowlist")
+        allowlist.json_value = ["12"]
+        allowlist.save()
+        self.assertNotIn("12081", get_reference_sets()["allowlist"])
+
+    def test_reference_sets_are_replaced_not_changed(self):
+        held = get_reference_sets()
+        allowlist = MortgageMetaData.objects.get(name="allowlist")
+        allowlist.json_value = ["12"]
+        allowlist.save()
+        reloaded = get_reference_sets()
+        self.assertIsNot(reloaded, held)
+        self.assertIn("12081", held["allowlist"])
+        self.assertNotIn("12081", reloaded["allowlist"])
+
+    @override_settings(CACHES=PAYLOAD_CACHES)
+    def test_timeseries_view_serves_cached_payload(self):
+        url = reverse(
+            "data_research_api_mortgage_timeseries",
+            kwargs={"fips": "12081", "days_late": "90"},
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with mock.patch(
+            "data_research.mortgage_utilities.payloads.build_geo_payload"
+        ) as mock_build:
+            response2 = self.client.get(url)
+        mock_build.assert_not_called()
+        self.assertEqual(json.loads(response2.content),
+                         json.loads(response.content))
+        self.assertEqual(
+            json.loads(response2.content),
+            caches["mortgage_performance"].get(_payload_key("90", "12081")),
+        )
+
+    @override_settings(CACHES=PAYLOAD_CACHES)
+    def test_rebuild_time_series_payloads(self):
+        count = rebuild_time_series_payloads()
+        self.assertGreater(count, 0)
+        cached = caches["mortgage_performance"].get(
+            _payload_key("90", "12081"))
+        self.assertEqual(cached["meta"]["name"], "Manatee County, FL")
+        self.assertEqual(cached["data"][0]["value"], 406 / 2674)
+        response = self.client.get(
+            reverse(
+                "data_research_api_mortgage_timeseries",
+                kwargs={"fips": "12081", "days_late": "90"},
+            )
+        )
+        self.assertEqual(json.loads(response.content), cached)
+
+    @override_settings(CACHES=PAYLOAD_CACHES)
+    def test_payloads_from_earlier_versions_are_not_served(self):
+        key = _payload_key("90", "12081")
+        caches["mortgage_performance"].set(key, {"stale": True})
+        self.assertEqual(get_time_series_payload("90", "12081"),
+                         {"stale": True})
+        MortgageMetaData.objects.get(name="allowlist").save()
+        # The version is kept in the database, so losing cache entries
+        # can't take it back to a number with stale payloads.
+        caches["default"].clear()
+        payload = get_time_series_payload("90", "12081")
+        self.assertEqual(payload["meta"]["name"], "Manatee County, FL")
+
     def test_timeseries_bad_fips(self):
         response = self.client.get(
             reverse(
@@ -393,6 +497,64 @@ class TimeseriesViewTests(django.test.TestCase):
             ["name", "value"],
         )
 
+    def test_county_map_data_values(self):
+        response = self.client.get(
+            reverse(
+                "data_research_api_mortgage_mapdata",
+                kwargs={
+                    "geo": "counties",
+                    "days_late": "90",
+                    "year_month": "2008-01",
+                },
+            )
+        )
+        response_data = json.loads(response.content)
+        self.assertEqual(
+            response_data["data"]["12081"],
+            {"value": 406 / 2674, "name": "Manatee County, FL"},
+        )
+        self.assertEqual(
+            response_data["meta"],
+            {
+                "fips_type": "county",
+                "date": "2008-01-01",
+                "national_average": 40692 / 2674899,
+            },
+        )
+
+    def test_map_data_conditional_headers(self):
+        url = reverse(
+            "data_research_api_mortgage_mapdata",
+            kwargs={
+                "geo": "states",
+                "days_late": "90",
+                "year_month": "2008-01",
+            },
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_map_data_etag_varies_by_request(self):
+        urls = [
+            reverse(
+                "data_research_api_mortgage_mapdata",
+                kwargs={
+                    "geo": geo,
+                    "days_late": "90",
+                    "year_month": "2008-01",
+                },
+            )
+            for geo in ["states", "counties"]
+        ]
+        etags = [self.client.get(url)["ETag"] for url in urls]
+        self.assertNotEqual(etags[0], etags[1])
+
     def test_msa_map_data_30_89(self):
         response = self.client.get(
             reverse(
@@ -1,18 +1,22 @@
+import calendar
 import datetime
+import hashlib
+
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
 from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from data_research.models import (
-    County, CountyMortgageData, MetroArea, MortgageMetaData, MSAMortgageData,
-    NationalMortgageData, NonMSAMortgageData, State, StateMortgageData
+from data_research.models import MortgageMetaData
+from data_research.mortgage_utilities.payloads import (
+    DAYS_LATE_RANGE, MAP_GEOS, NATIONAL, get_map_payload, get_meta_version,
+    get_reference_sets, get_time_series_payload
 )
 
 
-DAYS_LATE_RANGE = ['30-89', '90']
-
-
 class MetaData(APIView):
     """
     View for delivering mortgage metadata based on latest data update.
@@ -38,12 +42,7 @@ class TimeSeriesNational(APIView):
     def get(self, request, days_late):
         if days_late not in DAYS_LATE_RANGE:
             return Response("Unknown delinquency range")
-        records = NationalMortgageData.objects.all()
-        data = {'meta': {'name': 'United States',
-                         'fips_type': 'national'},
-                'data': [record.time_series(days_late)
-                         for record in records]}
-        return Response(data)
+        return Response(get_time_series_payload(days_late, NATIONAL))
 
 
 class TimeSeriesData(APIView):
@@ -56,57 +55,15 @@ class TimeSeriesData(APIView):
     def get(self, request, days_late, fips):
         """
         Return a FIPS-based slice of base data as a json timeseries.
+
+        Payloads are served from the precomputed store in
+        data_research.mortgage_utilities.payloads.
         """
         if days_late not in DAYS_LATE_RANGE:
             return Response("Unknown delinquency range")
-        reference_lists = {
-            entry: MortgageMetaData.objects.get(name=entry).json_value
-            for entry in ['allowlist', 'msa_fips', 'non_msa_fips']}
-        if fips not in reference_lists['allowlist']:
+        if fips not in get_reference_sets()['allowlist']:
             return Response("FIPS code not found or not valid.")
-        if len(fips) == 2:
-            state = State.objects.get(fips=fips)
-            records = StateMortgageData.objects.filter(
-                fips=fips)
-            data = {'meta': {'fips': fips,
-                             'name': state.name,
-                             'fips_type': 'state'},
-                    'data': [record.time_series(days_late)
-                             for record in records]}
-            return Response(data)
-        if 'non' in fips:
-            records = NonMSAMortgageData.objects.filter(
-                fips=fips)
-            data = {'meta': {'fips': fips,
-                             'name': "Non-metro area of {}".format(
-                                 records.first().state.name),
-                             'fips_type': 'non_msa'},
-                    'data': [record.time_series(days_late)
-                             for record in records]}
-            return Response(data)
-
-        if fips in reference_lists['msa_fips']:
-            metro_area = MetroArea.objects.get(fips=fips, valid=True)
-            records = MSAMortgageData.objects.filter(fips=fips)
-            data = {'meta': {'fips': fips,
-                             'name': metro_area.name,
-                             'fips_type': 'msa'},
-                    'data': [record.time_series(days_late)
-                             for record in records]}
-            return Response(data)
-        else:  # must be a county request
-            try:
-                county = County.objects.get(fips=fips, valid=True)
-            except County.DoesNotExist:
-                return Response("County is below display threshold.")
-            records = CountyMortgageData.objects.filter(fips=fips)
-            name = "{}, {}".format(county.name, county.state.abbr)
-            data = {'meta': {'fips': fips,
-                             'name': name,
-                             'fips_type': 'county'},
-                    'data': [record.time_series(days_late)
-                             for record in records]}
-        return Response(data)
+        return Response(get_time_series_payload(days_late, fips))
 
 
 def validate_year_month(year_month):
@@ -128,10 +85,32 @@ def validate_year_month(year_month):
     return datetime.date(year, month, 1)
 
 
+def mortgage_data_validators(*parts):
+    """
+    Return an (ETag, last-modified timestamp) pair for mortgage API data.
+
+    Both change whenever the mortgage metadata is updated, which happens
+    on every data release.
+    """
+    updated = MortgageMetaData.objects.aggregate(
+        updated=Max('updated'))['updated']
+    if updated is None:
+        return None, None
+    version = get_meta_version()
+    etag = '"{}"'.format(hashlib.md5(':'.join(
+        str(part) for part in (updated, version) + parts
+    ).encode('utf-8')).hexdigest())
+    last_modified = calendar.timegm(updated.timetuple())
+    return etag, last_modified
+
+
 class MapData(APIView):
     """
     View for delivering geo-based map data by date
     from the mortgage performance dataset.
+
+    Every geography of the requested type is returned in one response,
+    with ETag and Last-Modified headers so the response can be cached.
     """
     renderer_classes = (JSONRenderer,)
 
@@ -141,65 +120,16 @@ class MapData(APIView):
             return Response("Invalid year-month pair")
         if days_late not in DAYS_LATE_RANGE:
             return Response("Unknown delinquency range")
-        geo_dict = {
-            'national':
-                {'queryset': NationalMortgageData.objects.get(date=date),
-                 'fips_type': 'nation',
-                 'geo_obj': ''},
-            'states':
-                {'queryset': StateMortgageData.objects.filter(
-                    date=date),
-                 'fips_type': 'state',
-                 'geo_obj': 'state'},
-            'counties':
-                {'queryset': CountyMortgageData.objects.filter(
-                    date=date, county__valid=True),
-                 'fips_type': 'county',
-                 'geo_obj': 'county'},
-            'metros':
-                {'queryset': MSAMortgageData.objects.filter(
-                    date=date),
-                 'fips_type': 'msa',
-                 'geo_obj': 'msa'},
-        }
-        if geo not in geo_dict:
+        if geo not in MAP_GEOS:
             return Response("Unkown geographic unit")
-        nat_records = geo_dict['national']['queryset']
-        nat_data_series = nat_records.time_series(days_late)
-        if geo == 'national':
-            payload = {'meta': {'fips_type': geo_dict[geo]['fips_type'],
-                                'date': '{}'.format(date)},
-                       'data': {}}
-            nat_data_series.update({'name': 'United States'})
-            del(nat_data_series['date'])
-            payload['data'].update(nat_data_series)
-        else:
-            records = geo_dict[geo]['queryset']
-            payload = {'meta': {'fips_type': geo_dict[geo]['fips_type'],
-                                'date': '{}'.format(date),
-                                'national_average': nat_data_series['value']},
-                       'data': {}}
-            for record in records:
-                data_series = record.time_series(days_late)
-                geo_parent = getattr(record, geo_dict[geo]['geo_obj'])
-                if geo == 'counties':
-                    name = "{}, {}".format(
-                        geo_parent.name, geo_parent.state.abbr)
-                else:
-                    name = geo_parent.name
-                data_series.update(
-                    {'name': name})
-                del(data_series['date'])
-                payload['data'].update({record.fips: data_series})
-            if geo == 'metros':
-                for metro in MetroArea.objects.filter(valid=False):
-                    payload['data'][metro.fips]['value'] = None
-                for record in NonMSAMortgageData.objects.filter(date=date):
-                    non_data_series = record.time_series(days_late)
-                    if record.state.non_msa_valid is False:
-                        non_data_series['value'] = None
-                    non_name = "Non-metro area of {}".format(record.state.name)
-                    non_data_series.update({'name': non_name})
-                    del non_data_series['date']
-                    payload['data'].update({record.fips: non_data_series})
-        return Response(payload)
+        etag, last_modified = mortgage_data_validators(
+            days_late, geo, date)
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+        response = Response(get_map_payload(days_late, geo, date))
+        if etag:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -1,16 +1,23 @@
 import glob
+import hashlib
 import json
 import logging
+import multiprocessing
 import os
 import re
-import sqlite3
-from math import acos, cos, radians, sin
+from functools import partial
+from math import acos, cos, sin
 
 from django.template import loader
 
+from housing_counselor.spatial import CounselorIndex
+
 
 logger = logging.getLogger(__name__)
 
+MANIFEST_SUFFIX = '.manifest.json'
+WORKER_CHUNKSIZE = 250
+
 
 def distance_in_miles(lat1_radians, lng1_radians, lat2_radians, lng2_radians):
     """Estimate distance in miles between two points in radians.
@@ -32,108 +39,243 @@ def distance_in_miles(lat1_radians, lng1_radians, lat2_radians, lng2_radians):
     )
 
 
-def get_db_connection():
-    connection = sqlite3.connect(':memory:')
-    connection.create_function('distance_in_miles', 4, distance_in_miles)
-
-    return connection
-
-
-def fill_db(connection, counselors):
-    def prepare_counselors(counselors):
-        for counselor in counselors:
-            yield (
-                radians(float(counselor['agc_ADDR_LATITUDE'])),
-                radians(float(counselor['agc_ADDR_LONGITUDE'])),
-                json.dumps(counselor)
-            )
-
-    create_sql = """
-CREATE TABLE counselors (
-    latitude_radians REAL,
-    longitude_radians REAL,
-    json TEXT
-)
-"""
-
-    insert_sql = """
-INSERT INTO
-    counselors(latitude_radians, longitude_radians, json)
-VALUES (?, ?, ?)
-"""
-
-    connection.execute(create_sql)
-    connection.executemany(insert_sql, prepare_counselors(counselors))
-
-
-def query_db(connection, latitude_radians, longitude_radians):
-    sql = """
-SELECT
-    json,
-    distance_in_miles(latitude_radians, longitude_radians, ?, ?) AS distance
-FROM
-    counselors
-ORDER BY distance ASC
-LIMIT 10
+def get_counselor_index(counselors):
+    return CounselorIndex(counselors, distance_in_miles)
+
+
+def get_zipcode_data(index, zipcode, latitude_degrees, longitude_degrees):
+    counselors = []
+    for counselor, distance in index.nearest(
+        latitude_degrees,
+        longitude_degrees
+    ):
+        counselor = dict(counselor)
+        counselor['distance'] = distance
+        counselors.append(counselor)
+
+    return {
+        'zip': {
+            'zipcode': zipcode,
+            'lat': latitude_degrees,
+            'lng': longitude_degrees,
+        },
+        'counseling_agencies': counselors,
+    }
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def default_manifest_filename(directory):
+    """Return where to keep the manifest for an output directory.
+
+    Output directories are published as-is, so the manifest is kept next
+    to the directory rather than in it, e.g. jsons.manifest.json.
     """
+    return os.path.normpath(directory) + MANIFEST_SUFFIX
+
+
+def load_manifest(manifest_filename):
+    """Return the {zipcode: content hash} manifest kept in a file."""
+    try:
+        with open(manifest_filename, 'r') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
 
-    response = connection.execute(sql, (latitude_radians, longitude_radians))
 
-    results = []
-    for row in response:
-        result = json.loads(row[0])
-        result['distance'] = row[1]
-        results.append(result)
+def save_manifest(manifest_filename, manifest):
+    temp_filename = manifest_filename + '.tmp'
 
-    return results
+    with open(temp_filename, 'w') as f:
+        json.dump(manifest, f, sort_keys=True)
 
+    os.replace(temp_filename, manifest_filename)
 
-def generate_counselor_json(counselors, zipcodes, target):
-    connection = get_db_connection()
-    fill_db(connection, counselors)
+
+# Set in each worker process by _init_worker.
+_worker_state = {}
+
+
+def _init_worker(**state):
+    _worker_state.clear()
+    _worker_state.update(state)
+
+
+def _run_workers(function, tasks, processes, **state):
+    """Apply function to every task, in a pool if processes > 1.
+
+    Keyword arguments are made available to function in _worker_state.
+    Yields results in no particular order.
+    """
+    if processes > 1:
+        with multiprocessing.Pool(
+            processes,
+            initializer=partial(_init_worker, **state)
+        ) as pool:
+            for result in pool.imap_unordered(
+                function,
+                tasks,
+                chunksize=WORKER_CHUNKSIZE
+            ):
+                yield result
+    else:
+        _init_worker(**state)
+        for task in tasks:
+            yield function(task)
+
+
+def _write_if_changed(filename, content, digest, previous_digest):
+    """Write content unless the manifest shows it's already there.
+
+    Returns True if the file was written.
+    """
+    if digest == previous_digest and os.path.exists(filename):
+        return False
+
+    with open(filename, 'w') as f:
+        f.write(content)
+
+    return True
+
+
+def _write_zipcode_json(args):
+    zipcode, (latitude_degrees, longitude_degrees), target = args
+    zipcode_data = get_zipcode_data(
+        _worker_state['index'],
+        zipcode,
+        latitude_degrees,
+        longitude_degrees
+    )
+
+    json_filename = os.path.join(target, '{}.json'.format(zipcode))
+    content = json.dumps(zipcode_data)
+    digest = content_hash(content)
+    written = _write_if_changed(
+        json_filename,
+        content,
+        digest,
+        _worker_state['manifest'].get(zipcode)
+    )
+
+    return zipcode, digest, written
+
+
+def _log_counts(kind, counts):
+    logger.info(
+        '%d %s files written, %d unchanged files skipped',
+        counts['written'],
+        kind,
+        counts['skipped']
+    )
+
+
+def generate_counselor_json(counselors, zipcodes, target, processes=1,
+                            incremental=False, manifest_filename=None):
+    """Write a JSON file of the nearest counselors for each zipcode.
+
+    A manifest of content hashes is kept in manifest_filename, by default
+    next to the target directory. In incremental mode, files whose content
+    hasn't changed are not rewritten.
+
+    Returns a dictionary counting files written and skipped.
+    """
+    index = get_counselor_index(counselors)
+    manifest_filename = (
+        manifest_filename or default_manifest_filename(target)
+    )
+    manifest = load_manifest(manifest_filename) if incremental else {}
 
     logger.info('generating JSON into %s', target)
 
-    for zipcode, (latitude_degrees, longitude_degrees) in zipcodes.items():
-        counselors = query_db(
-            connection,
-            radians(latitude_degrees),
-            radians(longitude_degrees)
+    tasks = (
+        (zipcode, coordinates, target)
+        for zipcode, coordinates in zipcodes.items()
+    )
+
+    new_manifest = {}
+    counts = {'written': 0, 'skipped': 0}
+    for zipcode, digest, written in _run_workers(
+        _write_zipcode_json,
+        tasks,
+        processes,
+        index=index,
+        manifest=manifest
+    ):
+        new_manifest[zipcode] = digest
+        counts['written' if written else 'skipped'] += 1
+
+    save_manifest(manifest_filename, new_manifest)
+    _log_counts('JSON', counts)
+    return counts
+
+
+def _render_zipcode_html(args):
+    zipcode, filename, target_dir = args
+
+    with open(filename, 'r') as f:
+        source = f.read()
+
+    digest = content_hash(source)
+    html_filename = os.path.join(target_dir, '{}.html'.format(zipcode))
+    previous_digest = _worker_state['manifest'].get(zipcode)
+
+    if digest == previous_digest and os.path.exists(html_filename):
+        return zipcode, digest, False
+
+    if 'template' not in _worker_state:
+        _worker_state['template'] = loader.get_template(
+            'housing_counselor/pdf_selfcontained.html'
         )
 
-        zipcode_data = {
-            'zip': {
-                'zipcode': zipcode,
-                'lat': latitude_degrees,
-                'lng': longitude_degrees,
-            },
-            'counseling_agencies': counselors,
-        }
+    html = _worker_state['template'].render({
+        'zipcode': zipcode,
+        'zipcode_valid': True,
+        'api_json': json.loads(source),
+    })
 
-        json_filename = os.path.join(target, '{}.json'.format(zipcode))
+    with open(html_filename, 'w') as f:
+        f.write(html)
 
-        with open(json_filename, 'w') as f:
-            f.write(json.dumps(zipcode_data))
+    return zipcode, digest, True
 
 
-def generate_counselor_html(source_dir, target_dir):
-    template_name = 'housing_counselor/pdf_selfcontained.html'
-    template = loader.get_template(template_name)
+def generate_counselor_html(source_dir, target_dir, processes=1,
+                            incremental=False, manifest_filename=None):
+    """Render an HTML file for each zipcode JSON file in source_dir.
 
-    for zipcode, filename in get_counselor_json_files(source_dir):
-        with open(filename, 'r') as f:
-            zipcode_data = json.loads(f.read())
+    A manifest of source JSON hashes is kept in manifest_filename, by
+    default next to the target directory. In incremental mode, zipcodes
+    whose JSON hasn't changed are not rendered again; template changes need
+    a full run.
 
-        html = template.render({
-            'zipcode': zipcode,
-            'zipcode_valid': True,
-            'api_json': zipcode_data,
-        })
+    Returns a dictionary counting files written and skipped.
+    """
+    manifest_filename = (
+        manifest_filename or default_manifest_filename(target_dir)
+    )
+    manifest = load_manifest(manifest_filename) if incremental else {}
 
-        html_filename = os.path.join(target_dir, '{}.html'.format(zipcode))
+    tasks = (
+        (zipcode, filename, target_dir)
+        for zipcode, filename in get_counselor_json_files(source_dir)
+    )
 
-        with open(html_filename, 'w') as f:
-            f.write(html)
+    new_manifest = {}
+    counts = {'written': 0, 'skipped': 0}
+    for zipcode, digest, written in _run_workers(
+        _render_zipcode_html,
+        tasks,
+        processes,
+        manifest=manifest
+    ):
+        new_manifest[zipcode] = digest
+        counts['written' if written else 'skipped'] += 1
+
+    save_manifest(manifest_filename, new_manifest)
+    _log_counts('HTML', counts)
+    return counts
 
 
 def get_counselor_json_files(directory):
@@ -1,3 +1,5 @@
+import os
+
 from django.core.management.base import BaseCommand
 
 from housing_counselor.generator import generate_counselor_html
@@ -9,6 +11,25 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('source')
         parser.add_argument('target')
+        parser.add_argument('--processes', type=int,
+                            default=os.cpu_count() or 1,
+                            help='Number of processes rendering HTML files')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only render zipcodes whose JSON changed')
+        parser.add_argument('--manifest',
+                            help='Manifest file path, by default next to '
+                                 'the output directory')
 
     def handle(self, *args, **options):
-        generate_counselor_html(options['source'], options['target'])
+        counts = generate_counselor_html(
+            options['source'],
+            options['target'],
+            processes=options['processes'],
+            incremental=options['incremental'],
+            manifest_filename=options['manifest']
+        )
+        self.stdout.write(
+            '{} files written, {} unchanged files skipped'.format(
+                counts['written'], counts['skipped']
+            )
+        )
@@ -1,4 +1,5 @@
 import logging
+import os
 
 from django.core.management.base import BaseCommand, CommandError
 
@@ -25,6 +26,14 @@ class Command(BaseCommand):
                             help='Census Gazetteer zipcode file')
         parser.add_argument('--archive-file-name',
                             help='Archive file output path', required=True)
+        parser.add_argument('--processes', type=int,
+                            default=os.cpu_count() or 1,
+                            help='Number of processes writing JSON files')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only rewrite files whose content changed')
+        parser.add_argument('--manifest',
+                            help='Manifest file path, by default next to '
+                                 'the output directory')
 
     def handle(self, *args, **options):
         zipcode_csv_file = options['zipcode_csv_file']
@@ -55,4 +64,16 @@ class Command(BaseCommand):
         counselors = geocode_counselors(counselors, zipcodes=zipcodes)
 
         # Generate JSON files for each zipcode.
-        generate_counselor_json(counselors, zipcodes, options['target'])
+        counts = generate_counselor_json(
+            counselors,
+            zipcodes,
+            options['target'],
+            processes=options['processes'],
+            incremental=options['incremental'],
+            manifest_filename=options['manifest']
+        )
+        self.stdout.write(
+            '{} files written, {} unchanged files skipped'.format(
+                counts['written'], counts['skipped']
+            )
+        )
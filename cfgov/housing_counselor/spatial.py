@@ -0,0 +1,143 @@
+import heapq
+from math import cos, radians, sin
+
+
+# Slack added to the k-th nearest squared chord length when collecting
+# candidates, so that floating point differences between chord length and
+# great-circle distance can't change which counselors are returned.
+CHORD_EPSILON = 1e-9
+
+
+def unit_vector(latitude_radians, longitude_radians):
+    """Convert a latitude/longitude pair to a point on the unit sphere."""
+    cos_latitude = cos(latitude_radians)
+    return (
+        cos_latitude * cos(longitude_radians),
+        cos_latitude * sin(longitude_radians),
+        sin(latitude_radians),
+    )
+
+
+def squared_distance(a, b):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+class KDTree(object):
+    """A k-d tree over 3D points, each tagged with an integer index.
+
+    Straight-line (chord) distance between two points on the unit sphere
+    grows monotonically with the great-circle distance between them, so
+    nearest neighbours by chord are nearest neighbours on the globe.
+    """
+    def __init__(self, points):
+        self.root = self._build(
+            [(point, index) for index, point in enumerate(points)], 0
+        )
+
+    def _build(self, points, depth):
+        if not points:
+            return None
+
+        axis = depth % 3
+        points.sort(key=lambda point: point[0][axis])
+        median = len(points) // 2
+        point, index = points[median]
+
+        return (
+            point,
+            index,
+            axis,
+            self._build(points[:median], depth + 1),
+            self._build(points[median + 1:], depth + 1),
+        )
+
+    def nearest_squared_distance(self, target, count):
+        """Return the squared chord length to the count-th nearest point."""
+        heap = []
+
+        def search(node):
+            if node is None:
+                return
+
+            point, index, axis, left, right = node
+            distance = squared_distance(target, point)
+            if len(heap) < count:
+                heapq.heappush(heap, -distance)
+            elif distance < -heap[0]:
+                heapq.heapreplace(heap, -distance)
+
+            offset = target[axis] - point[axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            search(near)
+            if len(heap) < count or offset * offset <= -heap[0]:
+                search(far)
+
+        search(self.root)
+        return -heap[0] if heap else None
+
+    def within(self, target, limit):
+        """Return indexes of points within a squared chord length."""
+        found = []
+
+        def search(node):
+            if node is None:
+                return
+
+            point, index, axis, left, right = node
+            if squared_distance(target, point) <= limit:
+                found.append(index)
+
+            offset = target[axis] - point[axis]
+            if offset <= 0 or offset * offset <= limit:
+                search(left)
+            if offset >= 0 or offset * offset <= limit:
+                search(right)
+
+        search(self.root)
+        return found
+
+
+class CounselorIndex(object):
+    """Find the housing counselors nearest to a location.
+
+    Results match sorting every counselor by distance_in_miles: the tree
+    narrows the search to a handful of candidates, whose distances are
+    then computed with the same function.
+    """
+    def __init__(self, counselors, distance_function):
+        self.counselors = list(counselors)
+        self.distance_function = distance_function
+        self.coordinates = [
+            (
+                radians(float(counselor['agc_ADDR_LATITUDE'])),
+                radians(float(counselor['agc_ADDR_LONGITUDE'])),
+            )
+            for counselor in self.counselors
+        ]
+        self.tree = KDTree([
+            unit_vector(*coordinates) for coordinates in self.coordinates
+        ])
+
+    def nearest(self, latitude_degrees, longitude_degrees, count=10):
+        """Return a list of (counselor, distance in miles) pairs."""
+        latitude_radians = radians(latitude_degrees)
+        longitude_radians = radians(longitude_degrees)
+        target = unit_vector(latitude_radians, longitude_radians)
+
+        limit = self.tree.nearest_squared_distance(target, count)
+        if limit is None:
+            return []
+
+        candidates = []
+        for index in self.tree.within(target, limit + CHORD_EPSILON):
+            distance = self.distance_function(
+                *self.coordinates[index],
+                latitude_radians,
+                longitude_radians
+            )
+            candidates.append((distance, index))
+
+        return [
+            (self.counselors[index], distance)
+            for distance, index in sorted(candidates)[:count]
+        ]
@@ -1,11 +1,15 @@
 import json
 import os
+import random
 import shutil
 import tempfile
-from unittest import TestCase
+from math import radians
+from unittest import TestCase, mock
 
 from housing_counselor.generator import (
-    distance_in_miles, generate_counselor_json, get_counselor_json_files
+    default_manifest_filename, distance_in_miles, generate_counselor_html,
+    generate_counselor_json, get_counselor_index, get_counselor_json_files,
+    load_manifest
 )
 
 
@@ -22,7 +26,9 @@ class TestDistanceInMiles(TestCase):
 
 class TestGeneratorCounselorJson(TestCase):
     def setUp(self):
-        self.tempdir = tempfile.mkdtemp()
+        self.workspace = tempfile.mkdtemp()
+        self.tempdir = os.path.join(self.workspace, 'jsons')
+        os.mkdir(self.tempdir)
 
         self.counselors = [
             {'agc_ADDR_LATITUDE': 120, 'agc_ADDR_LONGITUDE': 98},
@@ -35,7 +41,7 @@ class TestGeneratorCounselorJson(TestCase):
         }
 
     def tearDown(self):
-        shutil.rmtree(self.tempdir)
+        shutil.rmtree(self.workspace)
 
     def test_generate_creates_json_files(self):
         generate_counselor_json(self.counselors, self.zipcodes, self.tempdir)
@@ -44,6 +50,61 @@ class TestGeneratorCounselorJson(TestCase):
             ['20001.json', '20002.json']
         )
 
+    def test_generate_writes_manifest_outside_target(self):
+        generate_counselor_json(self.counselors, self.zipcodes, self.tempdir)
+        manifest_filename = default_manifest_filename(self.tempdir)
+        self.assertEqual(
+            manifest_filename,
+            os.path.join(self.workspace, 'jsons.manifest.json')
+        )
+        self.assertCountEqual(
+            load_manifest(manifest_filename).keys(),
+            ['20001', '20002']
+        )
+
+    def test_generate_writes_manifest_to_given_path(self):
+        manifest_filename = os.path.join(self.workspace, 'manifest.json')
+        generate_counselor_json(
+            self.counselors, self.zipcodes, self.tempdir,
+            manifest_filename=manifest_filename
+        )
+        self.assertCountEqual(
+            load_manifest(manifest_filename).keys(),
+            ['20001', '20002']
+        )
+
+    def test_generate_incremental_skips_unchanged_files(self):
+        counts = generate_counselor_json(
+            self.counselors, self.zipcodes, self.tempdir, incremental=True
+        )
+        self.assertEqual(counts, {'written': 2, 'skipped': 0})
+
+        counts = generate_counselor_json(
+            self.counselors, self.zipcodes, self.tempdir, incremental=True
+        )
+        self.assertEqual(counts, {'written': 0, 'skipped': 2})
+
+        self.counselors[1]['agc_ADDR_LONGITUDE'] = 101
+        counts = generate_counselor_json(
+            self.counselors, self.zipcodes, self.tempdir, incremental=True
+        )
+        self.assertEqual(counts, {'written': 2, 'skipped': 0})
+
+    def test_generate_incremental_rewrites_missing_files(self):
+        generate_counselor_json(self.counselors, self.zipcodes, self.tempdir)
+        os.remove(os.path.join(self.tempdir, '20001.json'))
+        counts = generate_counselor_json(
+            self.counselors, self.zipcodes, self.tempdir, incremental=True
+        )
+        self.assertEqual(counts, {'written': 1, 'skipped': 1})
+
+    def test_generate_not_incremental_rewrites_all_files(self):
+        generate_counselor_json(self.counselors, self.zipcodes, self.tempdir)
+        counts = generate_counselor_json(
+            self.counselors, self.zipcodes, self.tempdir
+        )
+        self.assertEqual(counts, {'written': 2, 'skipped': 0})
+
     def test_generate_creates_proper_json(self):
         generate_counselor_json(self.counselors, self.zipcodes, self.tempdir)
         with open(os.path.join(self.tempdir, '20001.json')) as f:
@@ -77,6 +138,130 @@ class TestGeneratorCounselorJson(TestCase):
             for k in a:
                 self.assertAlmostEqual(a[k], b[k])
 
+    def test_generate_with_processes_matches_serial(self):
+        serial_dir = os.path.join(self.tempdir, 'serial')
+        parallel_dir = os.path.join(self.tempdir, 'parallel')
+        os.mkdir(serial_dir)
+        os.mkdir(parallel_dir)
+
+        generate_counselor_json(self.counselors, self.zipcodes, serial_dir)
+        generate_counselor_json(
+            self.counselors, self.zipcodes, parallel_dir, processes=2
+        )
+
+        for filename in ['20001.json', '20002.json']:
+            with open(os.path.join(serial_dir, filename)) as f:
+                serial = f.read()
+            with open(os.path.join(parallel_dir, filename)) as f:
+                self.assertEqual(f.read(), serial)
+
+
+@mock.patch('housing_counselor.generator.loader.get_template')
+class TestGeneratorCounselorHtml(TestCase):
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.workspace = tempfile.mkdtemp()
+        self.target_dir = os.path.join(self.workspace, 'htmls')
+        os.mkdir(self.target_dir)
+
+        for zipcode in ['20001', '20002']:
+            self.write_json(zipcode, {'zip': {'zipcode': zipcode}})
+
+    def tearDown(self):
+        shutil.rmtree(self.source_dir)
+        shutil.rmtree(self.workspace)
+
+    def write_json(self, zipcode, data):
+        filename = os.path.join(self.source_dir, '{}.json'.format(zipcode))
+        with open(filename, 'w') as f:
+            f.write(json.dumps(data))
+
+    def test_generate_html(self, get_template):
+        get_template.return_value.render.return_value = '<html></html>'
+        counts = generate_counselor_html(self.source_dir, self.target_dir)
+        self.assertEqual(counts, {'written': 2, 'skipped': 0})
+
+        with open(os.path.join(self.target_dir, '20001.html')) as f:
+            self.assertEqual(f.read(), '<html></html>')
+        self.assertCountEqual(
+            os.listdir(self.target_dir),
+            ['20001.html', '20002.html']
+        )
+
+        get_template.return_value.render.assert_any_call({
+            'zipcode': '20001',
+            'zipcode_valid': True,
+            'api_json': {'zip': {'zipcode': '20001'}},
+        })
+
+    def test_generate_html_incremental(self, get_template):
+        get_template.return_value.render.return_value = '<html></html>'
+        generate_counselor_html(
+            self.source_dir, self.target_dir, incremental=True
+        )
+        self.write_json('20002', {'zip': {'zipcode': '20002'}, 'new': 1})
+
+        render = get_template.return_value.render
+        render.reset_mock()
+        counts = generate_counselor_html(
+            self.source_dir, self.target_dir, incremental=True
+        )
+        self.assertEqual(counts, {'written': 1, 'skipped': 1})
+        self.assertEqual(render.call_count, 1)
+
+
+class TestCounselorIndex(TestCase):
+    def setUp(self):
+        generator = random.Random(1234)
+        self.counselors = [
+            {
+                'id': i,
+                'agc_ADDR_LATITUDE': generator.uniform(18, 65),
+                'agc_ADDR_LONGITUDE': generator.uniform(-160, -65),
+            }
+            for i in range(500)
+        ]
+        # Duplicate locations are common, e.g. agencies geocoded by zipcode.
+        self.counselors.extend(dict(c, id=c['id'] + 500)
+                               for c in self.counselors[:50])
+        self.locations = [
+            (generator.uniform(18, 65), generator.uniform(-160, -65))
+            for _ in range(200)
+        ] + [
+            (c['agc_ADDR_LATITUDE'], c['agc_ADDR_LONGITUDE'])
+            for c in self.counselors[:20]
+        ]
+
+    def brute_force(self, latitude, longitude):
+        distances = sorted(
+            (
+                distance_in_miles(
+                    radians(c['agc_ADDR_LATITUDE']),
+                    radians(c['agc_ADDR_LONGITUDE']),
+                    radians(latitude),
+                    radians(longitude)
+                ),
+                i
+            )
+            for i, c in enumerate(self.counselors)
+        )
+        return [(self.counselors[i]['id'], d) for d, i in distances[:10]]
+
+    def test_nearest_matches_brute_force(self):
+        index = get_counselor_index(self.counselors)
+        for latitude, longitude in self.locations:
+            self.assertEqual(
+                [(c['id'], d) for c, d in index.nearest(latitude, longitude)],
+                self.brute_force(latitude, longitude)
+            )
+
+    def test_nearest_with_fewer_counselors_than_requested(self):
+        index = get_counselor_index(self.counselors[:3])
+        self.assertEqual(len(index.nearest(40, -75)), 3)
+
+    def test_nearest_with_no_counselors(self):
+        self.assertEqual(get_counselor_index([]).nearest(40, -75), [])
+
 
 class TestGetCounselorJsonFiles(TestCase):
     def setUp(self):
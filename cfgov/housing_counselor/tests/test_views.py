@@ -5,7 +5,8 @@ from django.test import TestCase, override_settings
 import requests
 
 from housing_counselor.views import (
-    HousingCounselorS3URLMixin, HousingCounselorView
+    HousingCounselorS3URLMixin, HousingCounselorView, counselor_cache,
+    counselor_cache_info, get_pooled_session
 )
 
 
@@ -64,6 +65,48 @@ class HousingCounselorViewTestCase(TestCase):
         self.assertIn('12345.pdf', response.context_data['pdf_url'])
 
 
+@mock.patch('housing_counselor.views.get_pooled_session')
+class HousingCounselorGetCounselorsTestCase(TestCase):
+    def setUp(self):
+        counselor_cache.clear()
+
+    def tearDown(self):
+        counselor_cache.clear()
+
+    def test_get_counselors_fetches_json(self, mock_session):
+        mock_session().get().json.return_value = {'zip': {}}
+        self.assertEqual(
+            HousingCounselorView.get_counselors(None, '20001'),
+            {'zip': {}}
+        )
+        mock_session().get.assert_called_with(
+            HousingCounselorS3URLMixin.s3_json_url('20001')
+        )
+
+    def test_get_counselors_caches_json(self, mock_session):
+        mock_session().get().json.return_value = {'zip': {}}
+        mock_session().get.reset_mock()
+        HousingCounselorView.get_counselors(None, '20001')
+        HousingCounselorView.get_counselors(None, '20001')
+        self.assertEqual(mock_session().get.call_count, 1)
+        info = counselor_cache_info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 1)
+        self.assertEqual(info.currsize, 1)
+
+    def test_get_counselors_does_not_cache_errors(self, mock_session):
+        mock_session().get().raise_for_status.side_effect = requests.HTTPError
+        for _ in range(2):
+            with self.assertRaises(requests.HTTPError):
+                HousingCounselorView.get_counselors(None, '00000')
+        self.assertEqual(counselor_cache_info().currsize, 0)
+
+
+class GetPooledSessionTestCase(TestCase):
+    def test_session_is_reused(self):
+        self.assertIs(get_pooled_session(), get_pooled_session())
+
+
 @override_settings(AWS_STORAGE_BUCKET_NAME='foo.bucket')
 class HousingCounselorPDFViewTestCase(TestCase):
 
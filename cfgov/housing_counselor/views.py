@@ -1,5 +1,6 @@
 import logging
 import re
+import threading
 
 from django.conf import settings
 from django.http import HttpResponseBadRequest
@@ -10,11 +11,22 @@ import requests
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 
+from core.utils import TTLCache
 from legacy.forms import HousingCounselorForm
 
 
 logger = logging.getLogger(__name__)
 
+# Per-ZIP counselor results are regenerated nightly, so they can safely be
+# reused for a while within a process.
+COUNSELOR_CACHE_SIZE = 2048
+COUNSELOR_CACHE_TTL = 60 * 60
+
+counselor_cache = TTLCache(COUNSELOR_CACHE_SIZE, COUNSELOR_CACHE_TTL)
+
+_session = None
+_session_lock = threading.Lock()
+
 
 def requests_retry_session(
     retries=3,
@@ -36,6 +48,25 @@ def requests_retry_session(
     return session
 
 
+def get_pooled_session():
+    """Return this process's shared session.
+
+    Reusing one session keeps connections to S3 alive between requests
+    instead of paying for a new connection and TLS handshake each time.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = requests_retry_session()
+    return _session
+
+
+def counselor_cache_info():
+    """Return hit, miss and size counters for the counselor cache."""
+    return counselor_cache.cache_info()
+
+
 class HousingCounselorS3URLMixin(object):
 
     @staticmethod
@@ -101,15 +132,23 @@ class HousingCounselorView(TemplateView, HousingCounselorS3URLMixin):
     def get_counselors(cls, request, zipcode):
         """Return list of housing counselors closest to a given zipcode.
 
+        Results are cached in this process for COUNSELOR_CACHE_TTL seconds.
+
         Raises requests.HTTPError on for nonexistent ZIP code.
         Raises requests.exceptions.ConnectionError for aborted connections.
         """
+        api_json = counselor_cache.get(zipcode)
+        if api_json is not None:
+            return api_json
+
         api_url = cls.s3_json_url(zipcode)
 
-        response = requests_retry_session().get(api_url)
+        response = get_pooled_session().get(api_url)
         response.raise_for_status()
 
-        return response.json()
+        api_json = response.json()
+        counselor_cache.set(zipcode, api_json)
+        return api_json
 
 
 class HousingCounselorPDFView(View, HousingCounselorS3URLMixin):
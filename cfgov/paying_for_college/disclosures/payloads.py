@@ -0,0 +1,209 @@
+"""
+Pre-serialized JSON payloads for the disclosure APIs.
+
+National stats, BLS expenses and constants are the same for every offer
+page, so each is read, serialized and hashed once per process:
+- File-backed payloads are keyed by the file's modification time, so an
+  updated file is picked up on the next request.
+- Constants are keyed by a generation counter in the database, which
+  ConstantCap and ConstantRate saves bump for every process.
+
+School and program JSON is cached the same way for the schools and
+programs that offer links actually ask for. Each school has a generation
+counter in the database, bumped when the school, its programs, aliases or
+nicknames are saved, and the update scripts bump a shared counter after
+bulk writes.
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+from core.models import (
+    bump_cache_version, get_cache_version, get_cache_versions
+)
+from paying_for_college.disclosures.scripts import nat_stats
+from paying_for_college.models import (
+    ConstantCap, ConstantRate, Program, School
+)
+
+
+CONSTANTS_GENERATION_NAME = 'paying_for_college_constants'
+DISCLOSURE_GENERATION_NAME = 'paying_for_college_disclosures'
+SCHOOL_GENERATION_NAME = 'paying_for_college_school:{}'
+SCHOOL_CACHE_SIZE = 4096
+PROGRAM_CACHE_SIZE = 8192
+
+JSONPayload = namedtuple('JSONPayload', ['content', 'etag'])
+# A JSONPayload with the fields the offer page shows, so it can be rendered
+# without a School or Program instance.
+DisclosurePayload = namedtuple(
+    'DisclosurePayload', ['content', 'etag', 'summary']
+)
+SchoolSummary = namedtuple('SchoolSummary', [
+    'primary_alias', 'city', 'state', 'control', 'operating',
+    'degrees_predominant', 'degrees_highest',
+])
+ProgramSummary = namedtuple('ProgramSummary', [
+    'program_name', 'level', 'level_name', 'completers', 'completion_cohort',
+])
+
+
+def make_payload(content):
+    """Encode JSON content once, with an ETag for conditional requests."""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+    return JSONPayload(content, etag)
+
+
+def get_mtime(filename):
+    try:
+        return os.stat(filename).st_mtime_ns
+    except OSError:
+        return None
+
+
+@lru_cache(maxsize=8)
+def _stats_payload(program_length, mtime):
+    return make_payload(json.dumps(
+        nat_stats.get_prepped_stats(program_length=program_length)
+    ))
+
+
+def get_stats_payload(program_length=None):
+    """Return national stats for a program length as a JSONPayload."""
+    return _stats_payload(program_length, get_mtime(nat_stats.NAT_DATA_FILE))
+
+
+@lru_cache(maxsize=4)
+def _file_payload(filename, mtime):
+    if mtime is None:
+        return
+    with open(filename, 'rb') as f:
+        content = f.read()
+    if content:
+        return make_payload(content)
+
+
+def get_file_payload(filename):
+    """Return a JSON file's contents as a JSONPayload, or None if empty."""
+    return _file_payload(filename, get_mtime(filename))
+
+
+def get_constants_generation():
+    return get_cache_version(CONSTANTS_GENERATION_NAME)
+
+
+def bump_constants_generation():
+    """Invalidate loaded constants in this and every other process."""
+    _constants_payload.cache_clear()
+    bump_cache_version(CONSTANTS_GENERATION_NAME)
+
+
+@lru_cache(maxsize=4)
+def _constants_payload(generation):
+    constants = OrderedDict()
+    for ccap in ConstantCap.objects.order_by('slug'):
+        constants[ccap.slug] = ccap.value
+    for crate in ConstantRate.objects.order_by('slug'):
+        constants[crate.slug] = "{0}".format(crate.value)
+    cy = constants['constantsYear']
+    constants['constantsYear'] = "{}-{}".format(cy, str(cy + 1)[2:])
+    return make_payload(json.dumps(constants))
+
+
+def get_constants_payload():
+    """Return stored constants as a JSONPayload."""
+    return _constants_payload(get_constants_generation())
+
+
+def get_school_generation(school_id):
+    return get_cache_versions(
+        DISCLOSURE_GENERATION_NAME, SCHOOL_GENERATION_NAME.format(school_id)
+    )
+
+
+def bump_school_generation(school_id):
+    """Invalidate a school's and its programs' payloads everywhere."""
+    _school_payload.cache_clear()
+    _program_payload.cache_clear()
+    bump_cache_version(SCHOOL_GENERATION_NAME.format(school_id))
+
+
+def bump_disclosure_generation():
+    """Invalidate every school and program payload, after bulk updates."""
+    _school_payload.cache_clear()
+    _program_payload.cache_clear()
+    bump_cache_version(DISCLOSURE_GENERATION_NAME)
+
+
+@lru_cache(maxsize=SCHOOL_CACHE_SIZE)
+def _school_payload(school_id, generation):
+    school = School.objects.filter(pk=school_id).first()
+    if not school:
+        return
+    content, etag = make_payload(school.as_json())
+    return DisclosurePayload(content, etag, SchoolSummary(
+        primary_alias=school.primary_alias,
+        city=school.city,
+        state=school.state,
+        control=school.control,
+        operating=school.operating,
+        degrees_predominant=school.degrees_predominant,
+        degrees_highest=school.degrees_highest,
+    ))
+
+
+def get_school_payload(school_id):
+    """Return a school's JSON as a DisclosurePayload, or None if not found."""
+    try:
+        school_id = int(school_id)
+    except (TypeError, ValueError):
+        return None
+    return _school_payload(school_id, get_school_generation(school_id))
+
+
+@lru_cache(maxsize=PROGRAM_CACHE_SIZE)
+def _program_payload(school_id, program_code, test, generation):
+    programs = Program.objects.filter(
+        institution_id=school_id, program_code=program_code
+    )
+    if test is not None:
+        programs = programs.filter(test=test)
+    program = programs.select_related('institution').order_by('-pk').first()
+    if not program:
+        return
+    content, etag = make_payload(program.as_json())
+    return DisclosurePayload(content, etag, ProgramSummary(
+        program_name=program.program_name,
+        level=program.level,
+        level_name=program.get_level(),
+        completers=program.completers,
+        completion_cohort=program.completion_cohort,
+    ))
+
+
+def get_program_payload(school_id, program_code, test=None):
+    """
+    Return a school's latest program with a code as a DisclosurePayload.
+
+    Pass `test` to only match test or non-test programs. Returns None if
+    no program is found.
+    """
+    try:
+        school_id = int(school_id)
+    except (TypeError, ValueError):
+        return None
+    return _program_payload(
+        school_id, program_code, test, get_school_generation(school_id)
+    )
+
+
+def clear_payloads():
+    _stats_payload.cache_clear()
+    _file_payload.cache_clear()
+    _constants_payload.cache_clear()
+    _school_payload.cache_clear()
+    _program_payload.cache_clear()
@@ -1,11 +1,12 @@
 import datetime
 import logging
+from bisect import bisect_right
+from collections import defaultdict
 
 import localflavor
 
-from paying_for_college.models.disclosures import (
-    DEFAULT_EXCLUSIONS, HIGHEST_DEGREES, School
-)
+from paying_for_college.disclosures.payloads import bump_disclosure_generation
+from paying_for_college.models.disclosures import DEFAULT_EXCLUSIONS, School
 
 
 STATES = sorted(
@@ -13,7 +14,13 @@ STATES = sorted(
     [tup[0] for tup in localflavor.us.us_states.NON_CONTIGUOUS_STATES] +
     ['PR']
 )
-DEGREE_COHORTS = {k: [] for k in HIGHEST_DEGREES.keys()}
+METRICS = ['grad_rate', 'repay_3yr', 'median_total_debt']
+RANKING_FIELDS = [
+    'cohort_ranking_by_state',
+    'cohort_ranking_by_control',
+    'cohort_ranking_by_highest_degree',
+]
+BATCH_SIZE = 500
 logger = logging.getLogger(__name__)
 
 
@@ -25,106 +32,109 @@ def get_grad_level(school):
         return school.degrees_highest
 
 
-def build_base_cohorts():
+def get_base_query():
     """
-    Pre-build the base highest-degree cohorts.
+    Return the schools that are ranked in cohorts.
 
     DEFAULT_EXCLUSIONS are the primary keys for the home offices of schools
     or school systems, plus our fake demo school, 999999.
     """
-    global DEGREE_COHORTS
-    base_query = School.objects.filter(
+    return School.objects.filter(
         operating=True, state__in=STATES).exclude(
         pk__in=DEFAULT_EXCLUSIONS).exclude(
             degrees_highest='')
-    for key in DEGREE_COHORTS:
-        DEGREE_COHORTS[key] += [
-            school for school in base_query if get_grad_level(school) == key
-        ]
-    return base_query
 
 
-def calculate_percentile_rank(array, score):
-    """Get a school score's percentile rank from an array of cohort scores."""
-    true_false_array = [value <= score for value in array]
-    if len(true_false_array) == 0:
+def get_cohort_keys(school):
+    """
+    Return the keys of the cohorts a school belongs to.
+
+    All cohorts are within a highest-degree cohort. For school control, we
+    want cohorts only for public and private; we do not want a special
+    cohort of for-profit schools, so all non-public schools share one.
+    """
+    grad_level = get_grad_level(school)
+    control = 'Public' if school.control == 'Public' else 'Private'
+    return {
+        'state': ('state', grad_level, school.state),
+        'control': ('control', grad_level, control),
+        'highest_degree': ('highest_degree', grad_level),
+    }
+
+
+def build_cohort_values(schools):
+    """
+    Group schools into cohorts once, with each metric's values sorted.
+
+    Returns {cohort key: {metric: sorted list of float values}}.
+    """
+    cohort_values = defaultdict(lambda: {metric: [] for metric in METRICS})
+    for school in schools:
+        for key in get_cohort_keys(school).values():
+            for metric in METRICS:
+                value = getattr(school, metric)
+                if value is not None:
+                    cohort_values[key][metric].append(float(value))
+    for values in cohort_values.values():
+        for array in values.values():
+            array.sort()
+    return cohort_values
+
+
+def sorted_percentile_rank(sorted_array, score):
+    """Get a score's percentile rank from a sorted array of cohort scores.
+
+    The rank is the percentage of cohort scores at or below the score.
+    """
+    if not sorted_array:
         return
-    raw_rank = float(sum(true_false_array)) / len(true_false_array)
+    raw_rank = float(bisect_right(sorted_array, score)) / len(sorted_array)
     return int(round(raw_rank * 100))
 
 
-def rank_by_metric(school, cohort, metric):
-    """Return a school's percentile rank among a cohort by 3 metrics."""
-    values = [
-        getattr(s, metric) for s in cohort if getattr(s, metric) is not None
-    ]
-    payload = {'cohort_count': len(values)}
-    array = [float(val) for val in values]
-    target_value = float(getattr(school, metric))
-    payload.update({
-        'percentile_rank': calculate_percentile_rank(array, target_value)
-    })
-    return payload
+def rank_school(school, cohort_values):
+    """Return a school's rankings by state, control and highest degree."""
+    rankings = {'state': {}, 'control': {}, 'highest_degree': {}}
+    keys = get_cohort_keys(school)
+    for metric in METRICS:
+        value = getattr(school, metric)
+        if value is None:
+            for ranking in rankings.values():
+                ranking[metric] = None
+            continue
+        score = float(value)
+        for cohort, key in keys.items():
+            # Schools without a control value aren't ranked by control,
+            # though they count in the non-public cohort.
+            if cohort == 'control' and not school.control:
+                continue
+            array = cohort_values[key][metric]
+            rankings[cohort][metric] = {
+                'cohort_count': len(array),
+                'percentile_rank': sorted_percentile_rank(array, score),
+            }
+    return rankings
 
 
 def run(single_school=None):
     """Get percentile rankings for schools by degree, control, and state."""
-    count = 0
     starter = datetime.datetime.now()
-    base_query = build_base_cohorts()
+    base_query = get_base_query().only(
+        'state', 'control', 'degrees_highest', *METRICS
+    )
+    schools = list(base_query)
+    cohort_values = build_cohort_values(schools)
     if single_school:
-        base_query = base_query.filter(pk=single_school)
-    for school in base_query:
-        by_degree = {}
-        by_state = {}
-        by_control = {}
-        count += 1
-        if count % 500 == 0:  # pragma: no cover
-            logger.info("{} schools processed".format(count))
-        # degree_cohort is the default, national base cohort
-        # base query weeds out schools without state or degrees_highest values
-        degree_cohort = DEGREE_COHORTS.get(get_grad_level(school))
-        state_cohort = [
-            s for s in degree_cohort
-            if s
-            and s.state
-            and s.state == school.state
-        ]
-        # For school control, we want cohorts only for public and private;
-        # We do not want a special cohort of for-profit schools
-        if not school.control:
-            control_cohort = None
-        elif school.control == 'Public':
-            control_cohort = [
-                s for s in degree_cohort if s.control == school.control
-            ]
-        else:
-            control_cohort = [
-                s for s in degree_cohort if s.control != 'Public'
-            ]
-        for metric in ['grad_rate', 'repay_3yr', 'median_total_debt']:
-            if getattr(school, metric) is None:
-                by_state.update({metric: None})
-                by_control.update({metric: None})
-                by_degree.update({metric: None})
-            else:
-                if state_cohort:
-                    by_state.update({
-                        metric: rank_by_metric(school, state_cohort, metric)
-                    })
-                if control_cohort:
-                    by_control.update({
-                        metric: rank_by_metric(school, control_cohort, metric)
-                    })
-                if degree_cohort:
-                    by_degree.update({
-                        metric: rank_by_metric(school, degree_cohort, metric)
-                    })
-        school.cohort_ranking_by_state = by_state
-        school.cohort_ranking_by_control = by_control
-        school.cohort_ranking_by_highest_degree = by_degree
-        school.save()
+        schools = list(base_query.filter(pk=single_school))
+    for school in schools:
+        rankings = rank_school(school, cohort_values)
+        school.cohort_ranking_by_state = rankings['state']
+        school.cohort_ranking_by_control = rankings['control']
+        school.cohort_ranking_by_highest_degree = rankings['highest_degree']
+    School.objects.bulk_update(schools, RANKING_FIELDS, batch_size=BATCH_SIZE)
+    # bulk_update skips save signals, so drop cached school JSON here.
+    bump_disclosure_generation()
     logger.info("\nCohort script took {} to process {} schools".format(
         datetime.datetime.now() - starter,
-        count
+        len(schools)
     ))
@@ -7,12 +7,16 @@ import datetime
 import logging
 import os
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 
 import requests
-from requests.exceptions import SSLError
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException, SSLError
 
+from paying_for_college.disclosures.payloads import bump_disclosure_generation
 from paying_for_college.disclosures.scripts import api_utils
 from paying_for_college.disclosures.scripts.api_utils import (
     DECIMAL_MAP, MODEL_MAP
@@ -32,6 +36,36 @@ ID_BASE = "{}?api_key={}".format(api_utils.SCHOOLS_ROOT, api_utils.API_KEY)
 FIELDS = sorted(MODEL_MAP.keys())
 FIELDSTRING = api_utils.build_field_string()
 
+# api.data.gov allows 1,000 requests per hour for each API key by default.
+RATE_LIMIT_PER_HOUR = 1000
+RATE_LIMIT_BURST = 10
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 2
+DEFAULT_WORKERS = 4
+BATCH_SIZE = 500
+
+# Every School field that apply_school_data can set
+SCHOOL_FIELDS = sorted(set(MODEL_MAP.values()) | set(DECIMAL_MAP.values()) | {
+    'avg_net_price',
+    'avg_net_price_slices',
+    'control',
+    'grad_rate',
+    'grad_rate_4yr',
+    'grad_rate_lt4',
+    'program_count',
+    'program_most_popular',
+})
+PROGRAM_FIELDS = [
+    'program_name',
+    'cip_code',
+    'completers',
+    'level',
+    'level_name',
+    'salary',
+    'median_student_loan_completers',
+    'median_monthly_debt',
+]
+
 
 def test_for_program_data(program_data):
     if (
@@ -43,6 +77,25 @@ def test_for_program_data(program_data):
         return False
 
 
+def get_program_values(entry):
+    """Return a program code and field values from a Scorecard entry."""
+    level = entry['credential']['level']
+    cip_code = entry['code']
+    program_code = "{}-{}".format(cip_code, level)
+    return program_code, {
+        'program_name': entry['title'],
+        'cip_code': cip_code,
+        'completers': entry['counts']['titleiv'],
+        'level': level,
+        'level_name': PROGRAM_LEVELS.get(level),
+        'salary': entry['earnings']['median_earnings'],
+        'median_student_loan_completers': (
+            entry['debt']['median_debt']),
+        'median_monthly_debt': (
+            entry['debt']['monthly_debt_payment'])
+    }
+
+
 def update_programs(api_data, school):
     """Create or update a school's program-level records."""
     create_count = 0
@@ -50,30 +103,57 @@ def update_programs(api_data, school):
     for entry in program_data:
         if not test_for_program_data(entry):
             continue
-        level = entry['credential']['level']
-        cip_code = entry['code']
-        program_code = "{}-{}".format(cip_code, level)
+        program_code, values = get_program_values(entry)
         program, _created = Program.objects.update_or_create(
             institution=school,
             program_code=program_code,
-            defaults={
-                'program_name': entry['title'],
-                'cip_code': cip_code,
-                'completers': entry['counts']['titleiv'],
-                'level': level,
-                'level_name': PROGRAM_LEVELS.get(level),
-                'salary': entry['earnings']['median_earnings'],
-                'median_student_loan_completers': (
-                    entry['debt']['median_debt']),
-                'median_monthly_debt': (
-                    entry['debt']['monthly_debt_payment'])
-            }
+            defaults=values
         )
         if _created:
             create_count += 1
     return create_count
 
 
+def bulk_update_programs(school_data):
+    """
+    Create or update program-level records for many schools in bulk.
+
+    Takes (school, api_data) pairs and stores the same records as calling
+    update_programs for each school. Returns the number of records created.
+    """
+    entries = {}
+    for school, api_data in school_data:
+        for entry in api_data.get('latest.programs.cip_4_digit') or []:
+            if not test_for_program_data(entry):
+                continue
+            program_code, values = get_program_values(entry)
+            entries[(school.pk, program_code)] = values
+    existing = {}
+    for program in Program.objects.filter(
+        institution_id__in={school_pk for school_pk, _ in entries}
+    ):
+        existing.setdefault(
+            (program.institution_id, program.program_code), program)
+    to_create = []
+    to_update = []
+    for (school_pk, program_code), values in entries.items():
+        program = existing.get((school_pk, program_code))
+        if program is None:
+            to_create.append(Program(
+                institution_id=school_pk,
+                program_code=program_code,
+                **values
+            ))
+        else:
+            for field, value in values.items():
+                setattr(program, field, value)
+            to_update.append(program)
+    Program.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+    Program.objects.bulk_update(
+        to_update, PROGRAM_FIELDS, batch_size=BATCH_SIZE)
+    return len(to_create)
+
+
 def fix_zip5(zip5):
     """Add leading zeros if they have been stripped by the scorecard db."""
     if len(zip5) == 4:
@@ -101,6 +181,105 @@ def get_scorecard_data(url):
     return response.json().get('results')[0]
 
 
+class TokenBucket(object):
+    """
+    Pace requests that are made from several threads.
+
+    Tokens are added at `rate` per second, up to `capacity`, and each
+    request takes one; acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_session(pool_size):
+    """Return a requests session that keeps a connection per worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_scorecard_page(session, bucket, url, params):
+    """
+    Get a page of Scorecard results, backing off when throttled.
+
+    A 429 response is retried after its Retry-After delay, or an
+    exponential backoff, up to MAX_RETRIES times.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        bucket.acquire()
+        try:
+            response = session.get(url, params=params)
+        except RequestException:
+            logger.exception("Error connecting with Scorecard")
+            return
+        if response.status_code == 429 and attempt < MAX_RETRIES:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = int(retry_after)
+            else:
+                delay = BACKOFF_SECONDS * 2 ** attempt
+            logger.info(
+                "API limit reached, retrying in {} seconds".format(delay))
+            time.sleep(delay)
+            continue
+        if not response.ok:
+            logger.info("request not OK, returned {}".format(response.reason))
+            return
+        return response.json()
+
+
+def get_scorecard_batch(session, bucket, school_ids, api_root=None):
+    """
+    Get Scorecard data for many schools, a page at a time.
+
+    Returns a dict of data by school ID, which leaves out any school the
+    API had no data for.
+    """
+    url = api_root or api_utils.SCHOOLS_ROOT
+    params = {
+        'api_key': api_utils.API_KEY,
+        'id': ','.join(str(school_id) for school_id in school_ids),
+        'fields': FIELDSTRING,
+        'per_page': api_utils.PAGE_MAX,
+        'page': 0,
+    }
+    results = {}
+    while True:
+        data = get_scorecard_page(session, bucket, url, params)
+        if not data:
+            break
+        for result in data.get('results') or []:
+            results[result['id']] = result
+        total = data.get('metadata', {}).get('total', 0)
+        if (params['page'] + 1) * params['per_page'] >= total:
+            break
+        params = dict(params, page=params['page'] + 1)
+    return results
+
+
 def set_school_grad_rate(school, api_data):
     """Set the appropriate grad rate for a given school."""
     four_year_raw = api_data.get(
@@ -160,6 +339,74 @@ def compile_net_prices(school, api_data):
     return school
 
 
+def apply_school_data(school, data):
+    """
+    Set a school's fields from its Scorecard data.
+
+    Returns False if the school has closed, in which case only its
+    operating status is changed.
+    """
+    if data.get('school.operating') == 0:
+        school.operating = False
+        return False
+    data['school.operating'] = True
+    for key in DECIMAL_MAP:
+        if data.get(key) is not None:
+            setattr(school, DECIMAL_MAP[key], Decimal(str(data[key])))
+    for key in MODEL_MAP:
+        if data.get(key) is not None:
+            setattr(school, MODEL_MAP[key], data[key])
+    if data.get('school.ownership'):
+        school.ownership = str(data['school.ownership'])
+        school.control = CONTROL_MAP[school.ownership]
+    set_school_grad_rate(school, data)
+    compile_net_prices(school, data)
+    program_data = api_utils.compile_school_programs(data)
+    if program_data and type(program_data.get('most_popular')) == list:
+        school.program_most_popular = program_data['most_popular']
+        school.program_count = program_data.get(
+            'program_count')
+    school.zip5 = fix_zip5(str(school.zip5))
+    return True
+
+
+def get_update_query(exclude_ids, single_school):
+    """Return the schools to update, or None if single_school is missing."""
+    excluded_ids = OFFICE_IDS + [FAKE_SCHOOL_PK] + exclude_ids
+    base_query = School.objects.exclude(pk__in=excluded_ids)
+    if single_school:
+        if not base_query.filter(pk=single_school).exists():
+            return
+        base_query = base_query.filter(pk=single_school)
+        logger.info("Updating {}".format(base_query[0]))
+    return base_query
+
+
+def summarize(update_count, no_data, closed, programs_created, starter):
+    """Log the results of an update and return a closing message."""
+    endmsg = """
+    Updated {} schools and found no data for {}\n\
+    Schools that closed since last run: {}\n\
+    \n{} took {} to run""".format(
+        update_count,
+        len(no_data),
+        len(closed),
+        SCRIPTNAME,
+        (datetime.datetime.now() - starter))
+    if programs_created:
+        logger.info("\nCreated {} program records".format(programs_created))
+    if no_data:
+        logger.info("\n\nSchools for which we found no data on {}:".format(
+            datetime.date.today().strftime("%b %-d, %Y")))
+        for school in no_data:
+            logger.info("- {}".format(school))
+    if closed:
+        logger.info("\n\nSchools that have closed since the last update:")
+        for school in closed:
+            logger.info("- {}".format(school))
+    return endmsg
+
+
 def update(exclude_ids=[], single_school=None, store_programs=False):
     """
     Update college-level data for the latest year.
@@ -168,7 +415,6 @@ def update(exclude_ids=[], single_school=None, store_programs=False):
     """
     programs_created = 0
 
-    excluded_ids = OFFICE_IDS + [FAKE_SCHOOL_PK] + exclude_ids
     no_data = []  # API failed to respond or provided no data
     closed = []  # schools that have closed since our last scrape
     job_msg = (
@@ -179,15 +425,12 @@ def update(exclude_ids=[], single_school=None, store_programs=False):
     processed = 0
     update_count = 0
     id_url = "{}&id={}&fields={}"
-    base_query = School.objects.exclude(pk__in=excluded_ids)
-    if single_school:
-        if not base_query.filter(pk=single_school).exists():
-            no_school_msg = "Could not find school with ID {}".format(
-                single_school)
-            return (no_data, no_school_msg)
-        base_query = base_query.filter(pk=single_school)
-        logger.info("Updating {}".format(base_query[0]))
-    else:
+    base_query = get_update_query(exclude_ids, single_school)
+    if base_query is None:
+        no_school_msg = "Could not find school with ID {}".format(
+            single_school)
+        return (no_data, no_school_msg)
+    if not single_school:
         logger.info(
             "Seeking updates for {} schools.".format(base_query.count()))
         logger.info(job_msg)
@@ -207,50 +450,76 @@ def update(exclude_ids=[], single_school=None, store_programs=False):
         sys.stdout.write('.')
         sys.stdout.flush()
         update_count += 1
-        if data.get('school.operating') == 0:
-            school.operating = False
+        if not apply_school_data(school, data):
             school.save()
             closed.append(school)
             continue
-        data['school.operating'] = True
-        for key in DECIMAL_MAP:
-            if data.get(key) is not None:
-                setattr(school, DECIMAL_MAP[key], Decimal(str(data[key])))
-        for key in MODEL_MAP:
-            if data.get(key) is not None:
-                setattr(school, MODEL_MAP[key], data[key])
-        if data.get('school.ownership'):
-            school.ownership = str(data['school.ownership'])
-            school.control = CONTROL_MAP[school.ownership]
-        set_school_grad_rate(school, data)
-        compile_net_prices(school, data)
-        program_data = api_utils.compile_school_programs(data)
-        if program_data and type(program_data.get('most_popular')) == list:
-            school.program_most_popular = program_data['most_popular']
-            school.program_count = program_data.get(
-                'program_count')
-        school.zip5 = fix_zip5(str(school.zip5))
         school.save()
         if store_programs:
             programs_created += update_programs(data, school)
-    endmsg = """
-    Updated {} schools and found no data for {}\n\
-    Schools that closed since last run: {}\n\
-    \n{} took {} to run""".format(
-        update_count,
-        len(no_data),
-        len(closed),
-        SCRIPTNAME,
-        (datetime.datetime.now() - starter))
-    if programs_created:
-        logger.info("\nCreated {} program records".format(programs_created))
-    if no_data:
-        logger.info("\n\nSchools for which we found no data on {}:".format(
-            datetime.date.today().strftime("%b %-d, %Y")))
-        for school in no_data:
-            logger.info("- {}".format(school))
-    if closed:
-        logger.info("\n\nSchools that have closed since the last update:")
-        for school in closed:
-            logger.info("- {}".format(school))
+    endmsg = summarize(
+        update_count, no_data, closed, programs_created, starter)
+    return (no_data, endmsg)
+
+
+def update_concurrently(exclude_ids=[], single_school=None,
+                        store_programs=False, workers=DEFAULT_WORKERS,
+                        api_root=None):
+    """
+    Update college-level data for the latest year, many schools at a time.
+
+    Like update(), but each API request covers a page of schools. Up to
+    `workers` requests are in flight at once over a shared session, paced
+    by a token bucket that matches the api.data.gov rate limit. Schools
+    and programs are saved in bulk as each page arrives.
+    """
+    programs_created = 0
+    no_data = []
+    closed = []
+    starter = datetime.datetime.now()
+    update_count = 0
+    base_query = get_update_query(exclude_ids, single_school)
+    if base_query is None:
+        no_school_msg = "Could not find school with ID {}".format(
+            single_school)
+        return (no_data, no_school_msg)
+    schools = list(base_query)
+    logger.info("Seeking updates for {} schools.".format(len(schools)))
+
+    page_size = api_utils.PAGE_MAX
+    batches = [
+        schools[i:i + page_size] for i in range(0, len(schools), page_size)
+    ]
+    session = get_session(workers)
+    bucket = TokenBucket(RATE_LIMIT_PER_HOUR / 3600.0, RATE_LIMIT_BURST)
+
+    def fetch(batch):
+        return batch, get_scorecard_batch(
+            session, bucket, [school.pk for school in batch], api_root)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch, results in executor.map(fetch, batches):
+            updated = []
+            program_data = []
+            for school in batch:
+                data = results.get(school.pk)
+                if not data:
+                    no_data.append(school)
+                    continue
+                update_count += 1
+                if apply_school_data(school, data):
+                    program_data.append((school, data))
+                else:
+                    closed.append(school)
+                updated.append(school)
+            School.objects.bulk_update(
+                updated, SCHOOL_FIELDS, batch_size=BATCH_SIZE)
+            if store_programs:
+                programs_created += bulk_update_programs(program_data)
+            logger.info("{} of {} schools processed".format(
+                update_count + len(no_data), len(schools)))
+    # Bulk writes skip save signals, so drop cached school JSON here.
+    bump_disclosure_generation()
+    endmsg = summarize(
+        update_count, no_data, closed, programs_created, starter)
     return (no_data, endmsg)
@@ -10,6 +10,10 @@ PARSER_HELP = """Optionally specify a single school to update \
 by passing '--school_id' and a college IPEDS ID."""
 PROGRAMS_HELP = """Optionally choose to harvest program-level data \
 by passing the '--save_programs' option."""
+CONCURRENT_HELP = """Optionally request pages of schools concurrently, \
+within the API rate limit, and save them in bulk by passing '--concurrent'."""
+WORKERS_HELP = """The number of concurrent API requests to allow \
+when using '--concurrent'."""
 ID_ERROR = "School could not be found for ID {}"
 
 
@@ -20,11 +24,23 @@ class Command(BaseCommand):
         parser.add_argument('--school_id', help=PARSER_HELP, default=False)
         parser.add_argument(
             '--save_programs', action='store_true', help=PROGRAMS_HELP)
+        parser.add_argument(
+            '--concurrent', action='store_true', help=CONCURRENT_HELP)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=update_colleges.DEFAULT_WORKERS,
+            help=WORKERS_HELP)
 
     def handle(self, *args, **options):
         save_programs = options.get('save_programs') or False
         single_school = options.get('school_id')
-        if save_programs and single_school:
+        if options.get('concurrent'):
+            (no_data, endmsg) = update_colleges.update_concurrently(
+                single_school=single_school or None,
+                store_programs=save_programs,
+                workers=options['workers'])
+        elif save_programs and single_school:
             (no_data, endmsg) = update_colleges.update(
                 single_school=single_school, store_programs=True)
         elif single_school:
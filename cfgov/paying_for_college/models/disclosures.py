@@ -9,6 +9,8 @@ from string import Template
 from django.contrib.postgres.fields import JSONField
 from django.core.mail import send_mail
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 import requests
 
@@ -142,6 +144,17 @@ class ConstantCap(models.Model):
         ordering = ['slug']
 
 
+@receiver(post_save, sender=ConstantCap)
+@receiver(post_delete, sender=ConstantCap)
+@receiver(post_save, sender=ConstantRate)
+@receiver(post_delete, sender=ConstantRate)
+def constant_changed(sender, **kwargs):
+    from paying_for_college.disclosures.payloads import (
+        bump_constants_generation
+    )
+    bump_constants_generation()
+
+
 # original data_json fields:
 # ALIAS -- not needed, DELETE
 # AVGMONTHLYPAY
@@ -854,6 +867,24 @@ class Nickname(models.Model):
         ordering = ['nickname']
 
 
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+def school_changed(sender, instance, **kwargs):
+    from paying_for_college.disclosures.payloads import bump_school_generation
+    bump_school_generation(instance.pk)
+
+
+@receiver(post_save, sender=Program)
+@receiver(post_delete, sender=Program)
+@receiver(post_save, sender=Alias)
+@receiver(post_delete, sender=Alias)
+@receiver(post_save, sender=Nickname)
+@receiver(post_delete, sender=Nickname)
+def school_detail_changed(sender, instance, **kwargs):
+    from paying_for_college.disclosures.payloads import bump_school_generation
+    bump_school_generation(instance.institution_id)
+
+
 class BAHRate(models.Model):
     """
     Basic Allowance for Housing (BAH) rates are zipcode-specific.
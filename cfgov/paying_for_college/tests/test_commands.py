@@ -61,6 +61,17 @@ class CommandTests(unittest.TestCase):
         self.assertTrue(mock_update.call_count == 4)
         self.assertTrue(mock_update.called_with(store_programs=True))
 
+    @mock.patch(
+        'paying_for_college.management.commands.'
+        'update_via_api.update_colleges.update_concurrently')
+    def test_api_command_calls_update_concurrently(self, mock_update):
+        mock_update.return_value = ([], 'OK')
+        call_command(
+            'update_via_api', '--concurrent', '--workers', '2',
+            '--save_programs')
+        mock_update.assert_called_once_with(
+            single_school=None, store_programs=True, workers=2)
+
     @mock.patch(
         'paying_for_college.management.commands.'
         'load_programs.load_programs.load')
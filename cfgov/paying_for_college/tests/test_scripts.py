@@ -1,10 +1,14 @@
 import copy
 import datetime
 import json
+import threading
 import unittest
 from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
 from unittest import mock
 from unittest.mock import mock_open, patch
+from urllib.parse import parse_qs, urlparse
 
 import django
 from django.conf import settings
@@ -22,7 +26,7 @@ from paying_for_college.disclosures.scripts.notification_tester import (
     send_test_notifications
 )
 from paying_for_college.models import (
-    FAKE_SCHOOL_PK, Alias, Notification, Program, School
+    FAKE_SCHOOL_PK, HIGHEST_DEGREES, Alias, Notification, Program, School
 )
 
 
@@ -165,6 +169,315 @@ class PurgeTests(django.test.TestCase):
         self.assertFalse(Notification.objects.exists())
 
 
+def legacy_degree_cohorts(base_query):
+    """Group schools by highest degree, as process_cohorts used to."""
+    cohorts = {key: [] for key in HIGHEST_DEGREES}
+    for school in base_query:
+        cohorts[process_cohorts.get_grad_level(school)].append(school)
+    return cohorts
+
+
+def legacy_percentile_rank(array, score):
+    """Get a percentile rank by scanning every cohort score."""
+    true_false_array = [value <= score for value in array]
+    if len(true_false_array) == 0:
+        return
+    raw_rank = float(sum(true_false_array)) / len(true_false_array)
+    return int(round(raw_rank * 100))
+
+
+def legacy_rank_by_metric(school, cohort, metric):
+    values = [
+        getattr(s, metric) for s in cohort if getattr(s, metric) is not None
+    ]
+    payload = {'cohort_count': len(values)}
+    array = [float(val) for val in values]
+    target_value = float(getattr(school, metric))
+    payload.update({
+        'percentile_rank': legacy_percentile_rank(array, target_value)
+    })
+    return payload
+
+
+def legacy_cohort_rankings(school, degree_cohorts):
+    """Rank a school by scanning its cohorts, as process_cohorts used to."""
+    by_degree = {}
+    by_state = {}
+    by_control = {}
+    degree_cohort = degree_cohorts.get(
+        process_cohorts.get_grad_level(school))
+    state_cohort = [
+        s for s in degree_cohort if s and s.state and s.state == school.state
+    ]
+    if not school.control:
+        control_cohort = None
+    elif school.control == 'Public':
+        control_cohort = [
+            s for s in degree_cohort if s.control == school.control
+        ]
+    else:
+        control_cohort = [
+            s for s in degree_cohort if s.control != 'Public'
+        ]
+    for metric in ['grad_rate', 'repay_3yr', 'median_total_debt']:
+        if getattr(school, metric) is None:
+            by_state.update({metric: None})
+            by_control.update({metric: None})
+            by_degree.update({metric: None})
+        else:
+            if state_cohort:
+                by_state.update({metric: legacy_rank_by_metric(
+                    school, state_cohort, metric)})
+            if control_cohort:
+                by_control.update({metric: legacy_rank_by_metric(
+                    school, control_cohort, metric)})
+            if degree_cohort:
+                by_degree.update({metric: legacy_rank_by_metric(
+                    school, degree_cohort, metric)})
+    return by_state, by_control, by_degree
+
+
+class CohortRankingTests(django.test.TestCase):
+
+    fixtures = ['test_fixture.json']
+
+    def setUp(self):
+        # Varied schools, with tied, missing and extreme metric values.
+        controls = ['Public', 'Private', 'For-profit', '']
+        states = ['DC', 'VA', 'PR']
+        grad_rates = [
+            None, Decimal('0.1'), Decimal('0.5'), Decimal('0.5'), Decimal('1')
+        ]
+        for i in range(60):
+            School.objects.create(
+                school_id=900000 + i,
+                operating=True,
+                state=states[i % 3],
+                control=controls[i % 4],
+                degrees_highest=str(i % 6),
+                grad_rate=grad_rates[i % 5],
+                repay_3yr=(
+                    None if i % 7 == 0
+                    else Decimal(i % 11) / Decimal(11)
+                ),
+                median_total_debt=Decimal(1000 * (i % 9)),
+            )
+
+    def test_sorted_percentile_rank_matches_scan(self):
+        values = [0.2, 0.5, 0.5, 0.7, 1.0]
+        for score in [0.0, 0.2, 0.5, 0.6, 1.0, 1.5]:
+            self.assertEqual(
+                process_cohorts.sorted_percentile_rank(values, score),
+                legacy_percentile_rank(values, score)
+            )
+
+    @unittest.skipUnless(
+        connection.vendor == 'postgresql', 'PostgreSQL-dependent')
+    def test_run_matches_legacy_rankings(self):
+        base_query = list(process_cohorts.get_base_query())
+        degree_cohorts = legacy_degree_cohorts(base_query)
+        expected = {
+            school.pk: legacy_cohort_rankings(school, degree_cohorts)
+            for school in base_query
+        }
+
+        process_cohorts.run()
+
+        self.assertGreater(len(expected), 60)
+        for school in process_cohorts.get_base_query():
+            self.assertEqual(
+                (
+                    school.cohort_ranking_by_state,
+                    school.cohort_ranking_by_control,
+                    school.cohort_ranking_by_highest_degree,
+                ),
+                expected[school.pk],
+                school.pk
+            )
+
+
+class FakeScorecardAPI(ThreadingMixIn, HTTPServer):
+    """A local stand-in for the Scorecard schools API.
+
+    Serves `results` by school ID, honoring the id, per_page and page
+    parameters, and answers the first `throttle` requests with a 429.
+    """
+    daemon_threads = True
+
+    def __init__(self, results, throttle=0):
+        super().__init__(('127.0.0.1', 0), FakeScorecardHandler)
+        self.results = results
+        self.throttle = throttle
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/schools.json'.format(self.server_port)
+
+
+class FakeScorecardHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        with self.server.lock:
+            self.server.requests.append(params)
+            throttled = len(self.server.requests) <= self.server.throttle
+        if throttled:
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        ids = [int(i) for i in params['id'][0].split(',')]
+        per_page = int(params['per_page'][0])
+        page = int(params['page'][0])
+        matches = [
+            self.server.results[i] for i in ids if i in self.server.results
+        ]
+        body = json.dumps({
+            'metadata': {
+                'total': len(matches), 'page': page, 'per_page': per_page
+            },
+            'results': matches[page * per_page:(page + 1) * per_page],
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ConcurrentUpdateTests(django.test.TestCase):
+
+    fixtures = ['test_fixture.json']
+    api_fixture = '{}/fixtures/sample_4yr_api_result.json'.format(COLLEGE_ROOT)
+
+    with open(api_fixture, 'r') as f:
+        sample_result = json.loads(f.read())['results'][0]
+
+    program_entry = {
+        'earnings': {'median_earnings': 3000},
+        'debt': {'median_debt': 20000, 'monthly_debt_payment': 400},
+        'credential': {'level': '5'},
+        'code': '5101',
+        'title': 'Nursing',
+        'counts': {'titleiv': 3000},
+    }
+
+    def api_result(self, school_id, **kwargs):
+        result = copy.deepcopy(self.sample_result)
+        result['id'] = school_id
+        result['latest.programs.cip_4_digit'] = [self.program_entry]
+        result.update(kwargs)
+        return result
+
+    def start_api(self, results, throttle=0):
+        server = FakeScorecardAPI(results, throttle=throttle)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_update_concurrently(self):
+        server = self.start_api({
+            408039: self.api_result(408039),
+            100636: self.api_result(100636, **{'school.operating': 0}),
+        })
+        (no_data, endmsg) = update_colleges.update_concurrently(
+            api_root=server.url)
+        school = School.objects.get(pk=408039)
+        self.assertEqual(school.city, 'Lubbock')
+        self.assertEqual(school.grad_rate, school.grad_rate_4yr)
+        self.assertIsNotNone(school.avg_net_price_slices)
+        self.assertFalse(School.objects.get(pk=100636).operating)
+        self.assertEqual(
+            {school.pk for school in no_data},
+            set(update_colleges.get_update_query([], None).values_list(
+                'pk', flat=True)) - {408039, 100636}
+        )
+        self.assertIn('closed since last run: 1', endmsg)
+        # All schools fit in one page, so one request covers them all.
+        self.assertEqual(len(server.requests), 1)
+
+    def test_update_concurrently_pages_requests(self):
+        results = {
+            pk: self.api_result(pk)
+            for pk in update_colleges.get_update_query(
+                [], None).values_list('pk', flat=True)
+        }
+        server = self.start_api(results)
+        with patch.object(api_utils, 'PAGE_MAX', 2):
+            (no_data, endmsg) = update_colleges.update_concurrently(
+                workers=2, api_root=server.url)
+        self.assertEqual(no_data, [])
+        self.assertEqual(len(server.requests), (len(results) + 1) // 2)
+        for params in server.requests:
+            self.assertEqual(params['per_page'], ['2'])
+            self.assertLessEqual(len(params['id'][0].split(',')), 2)
+
+    def test_update_concurrently_retries_when_throttled(self):
+        server = self.start_api(
+            {408039: self.api_result(408039)}, throttle=2)
+        (no_data, endmsg) = update_colleges.update_concurrently(
+            single_school=408039, api_root=server.url)
+        self.assertEqual(no_data, [])
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(School.objects.get(pk=408039).city, 'Lubbock')
+
+    @patch.object(update_colleges, 'MAX_RETRIES', 1)
+    def test_update_concurrently_gives_up_when_throttled(self):
+        server = self.start_api(
+            {408039: self.api_result(408039)}, throttle=5)
+        (no_data, endmsg) = update_colleges.update_concurrently(
+            single_school=408039, api_root=server.url)
+        self.assertEqual([school.pk for school in no_data], [408039])
+        self.assertEqual(len(server.requests), 2)
+
+    def test_update_concurrently_stores_programs_in_bulk(self):
+        server = self.start_api({408039: self.api_result(408039)})
+        update_colleges.update_concurrently(
+            single_school=408039, store_programs=True, api_root=server.url)
+        program = Program.objects.get(
+            institution_id=408039, program_code='5101-5')
+        self.assertEqual(program.salary, 3000)
+
+        self.program_entry = dict(
+            self.program_entry, earnings={'median_earnings': 3500})
+        server.results[408039] = self.api_result(408039)
+        update_colleges.update_concurrently(
+            single_school=408039, store_programs=True, api_root=server.url)
+        program = Program.objects.get(
+            institution_id=408039, program_code='5101-5')
+        self.assertEqual(program.salary, 3500)
+
+    def test_update_concurrently_single_school_failure(self):
+        (no_data, msg) = update_colleges.update_concurrently(
+            single_school=99999)
+        self.assertIn("Could not find", msg)
+
+    def test_token_bucket_waits_for_tokens(self):
+        clock = [100.0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        with patch.object(
+            update_colleges.time, 'monotonic', side_effect=lambda: clock[0]
+        ), patch.object(
+            update_colleges.time, 'sleep', side_effect=sleep
+        ) as mock_sleep:
+            bucket = update_colleges.TokenBucket(rate=4, capacity=2)
+            for _ in range(3):
+                bucket.acquire()
+        self.assertEqual(mock_sleep.call_count, 1)
+        self.assertEqual(mock_sleep.call_args[0][0], 0.25)
+
+
 class TestScripts(django.test.TestCase):
 
     fixtures = ['test_fixture.json', 'test_contacts.json']
@@ -239,22 +552,21 @@ class TestScripts(django.test.TestCase):
             None
         )
 
-    def test_build_base_cohorts(self):
+    def test_build_cohort_values(self):
         school = School.objects.get(pk=100654)
-        base_query = process_cohorts.build_base_cohorts()
-        cohort = process_cohorts.DEGREE_COHORTS.get(school.degrees_highest)
-        metric = 'grad_rate'
+        base_query = process_cohorts.get_base_query()
+        cohort_values = process_cohorts.build_cohort_values(base_query)
         self.assertEqual(
             base_query.count(), 6)
         self.assertEqual(
-            process_cohorts.rank_by_metric(school, cohort, metric).get(
-                'percentile_rank'),
+            process_cohorts.rank_school(school, cohort_values)[
+                'highest_degree']['grad_rate']['percentile_rank'],
             80
         )
 
     def test_percentile_rank_blank_array(self):
         self.assertIs(
-            process_cohorts.calculate_percentile_rank([], 0.50),
+            process_cohorts.sorted_percentile_rank([], 0.50),
             None
         )
 
@@ -1,5 +1,8 @@
 import copy
 import json
+import os
+import shutil
+import tempfile
 import unittest
 from unittest import mock
 
@@ -7,7 +10,10 @@ import django
 from django.http import HttpRequest
 from django.urls import reverse
 
-from paying_for_college.models import Program, School
+from core.models import bump_cache_version
+from paying_for_college.disclosures import payloads
+from paying_for_college.disclosures.scripts import nat_stats
+from paying_for_college.models import Alias, ConstantCap, Program, School
 from paying_for_college.views import (
     EXPENSE_FILE, Feedback, get_json_file, get_program, get_program_length,
     get_school, validate_oid, validate_pid
@@ -137,6 +143,10 @@ class OfferTest(django.test.TestCase):
 
     fixtures = ["test_fixture.json", "test_program.json"]
 
+    def setUp(self):
+        payloads.clear_payloads()
+        self.addCleanup(payloads.clear_payloads)
+
     # /paying-for-college2/understanding-your-financial-aid-offer/offer/?[QUERYSTRING]
     def test_offer(self):
         """request for offer disclosure."""
@@ -206,6 +216,32 @@ class OfferTest(django.test.TestCase):
         self.assertTrue(resp10.context["warning"] == "")
         self.assertTrue(resp10.status_code == 200)
 
+    def test_offer_renders_cached_payloads(self):
+        url = reverse("paying_for_college:disclosures:offer")
+        qstring = (
+            "?iped=408039&pid=981&"
+            "oid=f38283b5b7c939a058889f997949efa566c616c5"
+        )
+        resp = self.client.get(url + qstring)
+        self.assertEqual(resp.context["warning"], "")
+        self.assertEqual(resp.context["school"].city, "Fort Wayne")
+        self.assertEqual(
+            resp.context["program"].program_name,
+            "Occupational Therapy Assistant - 981",
+        )
+        program = Program.objects.get(pk=1)
+        self.assertEqual(resp.context["programData"], program.as_json())
+        self.assertEqual(
+            resp.context["schoolData"], program.institution.as_json())
+        self.assertContains(resp, "Occupational Therapy Assistant - 981")
+        self.assertContains(resp, program.get_level())
+
+        with mock.patch.object(School, "as_json") as mock_school_json:
+            with mock.patch.object(Program, "as_json") as mock_program_json:
+                self.client.get(url + qstring)
+        mock_school_json.assert_not_called()
+        mock_program_json.assert_not_called()
+
 
 class APITests(django.test.TestCase):
 
@@ -215,6 +251,10 @@ class APITests(django.test.TestCase):
         "test_program.json",
     ]
 
+    def setUp(self):
+        payloads.clear_payloads()
+        self.addCleanup(payloads.clear_payloads)
+
     # /paying-for-college2/understanding-your-financial-aid-offer/api/school/155317.json
     def test_school_json(self):
         """api call for school details."""
@@ -260,14 +300,162 @@ class APITests(django.test.TestCase):
         resp = self.client.get(url)
         self.assertIn(b"Other", resp.content)
 
-    @mock.patch("paying_for_college.views.get_json_file")
-    def test_expense_json_failure(self, mock_get_json):
+    @mock.patch("paying_for_college.views.get_file_payload")
+    def test_expense_json_failure(self, mock_get_payload):
         """failed api call for BLS expense data"""
         url = reverse("paying_for_college:disclosures:expenses-json")
-        mock_get_json.return_value = ""
+        mock_get_payload.return_value = None
         resp = self.client.get(url)
         self.assertIn(b"No expense", resp.content)
 
+    def test_json_apis_return_not_modified_for_matching_etag(self):
+        for url in [
+            reverse("paying_for_college:disclosures:constants-json"),
+            reverse("paying_for_college:disclosures:expenses-json"),
+            reverse(
+                "paying_for_college:disclosures:national-stats-json",
+                args=["408039"],
+            ),
+            reverse(
+                "paying_for_college:disclosures:school-json", args=["155317"]
+            ),
+            reverse(
+                "paying_for_college:disclosures:program-json",
+                args=["408039_981"],
+            ),
+        ]:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            etag = resp["ETag"]
+            resp2 = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp2.status_code, 304)
+            self.assertEqual(resp2.content, b"")
+
+    def test_constants_are_loaded_once(self):
+        payload = payloads.get_constants_payload()
+        # Only the generation is looked up.
+        with self.assertNumQueries(1):
+            self.assertEqual(payloads.get_constants_payload(), payload)
+        self.assertIn(b"institutionalLoanRate", payload.content)
+
+    def test_constants_reload_after_another_process_saves(self):
+        payloads.get_constants_payload()
+        ConstantCap.objects.filter(slug="constantsYear").update(value=2030)
+        # Another process's save bumps the generation without clearing
+        # this process's copy.
+        bump_cache_version(payloads.CONSTANTS_GENERATION_NAME)
+        payload = payloads.get_constants_payload()
+        self.assertEqual(
+            json.loads(payload.content)["constantsYear"], "2030-31")
+
+    def test_constants_json_reloads_after_save(self):
+        url = reverse("paying_for_college:disclosures:constants-json")
+        etag = self.client.get(url)["ETag"]
+        cap = ConstantCap.objects.get(slug="constantsYear")
+        cap.value = 2030
+        cap.save()
+        resp = self.client.get(url)
+        self.assertNotEqual(resp["ETag"], etag)
+        self.assertEqual(
+            json.loads(resp.content)["constantsYear"], "2030-31")
+
+    def test_national_stats_json_reloads_when_file_changes(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        stats_file = os.path.join(tempdir, "national_stats.json")
+        shutil.copy(nat_stats.NAT_DATA_FILE, stats_file)
+        url = reverse("paying_for_college:disclosures:national-stats-json",
+                      args=["000000"])
+
+        with mock.patch.object(nat_stats, "NAT_DATA_FILE", stats_file):
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            with mock.patch.object(
+                nat_stats, "get_national_stats"
+            ) as mock_get_stats:
+                self.client.get(url)
+            mock_get_stats.assert_not_called()
+
+            with open(stats_file, "r") as f:
+                data = json.load(f)
+            data["net_price"]["median"] = 12345
+            with open(stats_file, "w") as f:
+                json.dump(data, f)
+            stat = os.stat(stats_file)
+            os.utime(stats_file, ns=(stat.st_atime_ns,
+                                     stat.st_mtime_ns + 10 ** 9))
+            resp2 = self.client.get(url)
+        self.assertEqual(
+            json.loads(resp2.content)["netPriceMedian"], 12345)
+        self.assertNotEqual(resp2["ETag"], resp["ETag"])
+
+    def test_school_and_program_payloads_are_loaded_once(self):
+        school = payloads.get_school_payload("408039")
+        program = payloads.get_program_payload("408039", "981")
+        # Only the generations are looked up.
+        with self.assertNumQueries(2):
+            self.assertEqual(payloads.get_school_payload(408039), school)
+            self.assertEqual(
+                payloads.get_program_payload(408039, "981"), program)
+        self.assertIn(b"Fort Wayne", school.content)
+        self.assertEqual(school.summary.city, "Fort Wayne")
+        self.assertEqual(program.summary.level, "4")
+
+    def test_missing_school_and_program_payloads(self):
+        self.assertIsNone(payloads.get_school_payload("xxx"))
+        self.assertIsNone(payloads.get_school_payload("111111"))
+        self.assertIsNone(payloads.get_program_payload("408039", "xxx"))
+        self.assertIsNone(
+            payloads.get_program_payload("408039", "981", test=True))
+        url = reverse(
+            "paying_for_college:disclosures:school-json", args=["111111"]
+        )
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_school_json_reloads_after_save(self):
+        url = reverse(
+            "paying_for_college:disclosures:school-json", args=["155317"]
+        )
+        etag = self.client.get(url)["ETag"]
+        school = School.objects.get(pk=155317)
+        school.city = "Topeka"
+        school.save()
+        resp = self.client.get(url)
+        self.assertNotEqual(resp["ETag"], etag)
+        self.assertEqual(json.loads(resp.content)["city"], "Topeka")
+
+    def test_program_json_reloads_after_school_alias_changes(self):
+        url = reverse(
+            "paying_for_college:disclosures:program-json", args=["408039_981"]
+        )
+        self.client.get(url)
+        alias = Alias.objects.create(
+            institution_id=408039, alias="Brown Mackie", is_primary=True)
+        resp = self.client.get(url)
+        self.assertEqual(
+            json.loads(resp.content)["institution"], "Brown Mackie")
+        alias.delete()
+        resp2 = self.client.get(url)
+        self.assertEqual(
+            json.loads(resp2.content)["institution"], "Not Available")
+
+    def test_payloads_reload_after_bulk_update(self):
+        payload = payloads.get_school_payload(155317)
+        School.objects.filter(pk=155317).update(city="Topeka")
+        self.assertEqual(payloads.get_school_payload(155317), payload)
+        payloads.bump_disclosure_generation()
+        self.assertEqual(
+            payloads.get_school_payload(155317).summary.city, "Topeka")
+
+    def test_payloads_reload_after_another_process_saves(self):
+        payloads.get_school_payload(155317)
+        School.objects.filter(pk=155317).update(city="Topeka")
+        # Another process's save bumps the school's generation without
+        # clearing this process's copies.
+        bump_cache_version(payloads.SCHOOL_GENERATION_NAME.format(155317))
+        self.assertEqual(
+            payloads.get_school_payload(155317).summary.city, "Topeka")
+
     # /paying-for-college2/understanding-your-financial-aid-offer/api/program/408039_981/
     def test_program_json(self):
         """api call for program details."""
@@ -1,18 +1,21 @@
 import json
 import os
 import re
-from collections import OrderedDict
 
-from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
-from django.shortcuts import get_object_or_404, render
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
+)
+from django.shortcuts import render
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
 from django.views.generic import TemplateView, View
 
-from paying_for_college.disclosures.scripts import nat_stats
-from paying_for_college.forms import FeedbackForm
-from paying_for_college.models import (
-    ConstantCap, ConstantRate, Feedback, Notification, Program, School
+from paying_for_college.disclosures.payloads import (
+    get_constants_payload, get_file_payload, get_program_payload,
+    get_school_payload, get_stats_payload
 )
+from paying_for_college.forms import FeedbackForm
+from paying_for_college.models import Feedback, Notification, Program, School
 from paying_for_college.models.search import SchoolSearch
 
 
@@ -32,6 +35,16 @@ def get_json_file(filename):
         return ''
 
 
+def payload_response(request, payload):
+    """Serve a JSONPayload, or a 304 if the client already has it."""
+    not_modified = get_conditional_response(request, etag=payload.etag)
+    if not_modified is not None:
+        return not_modified
+    response = HttpResponse(payload.content, content_type='application/json')
+    response['ETag'] = payload.etag
+    return response
+
+
 def validate_oid(oid):
     """
     Make sure an offer ID is valid according to our specifications.
@@ -88,6 +101,14 @@ def get_school(schoolID):
             return school
 
 
+def get_operating_school(schoolID):
+    """Return an operating school's DisclosurePayload, or None"""
+    payload = get_school_payload(schoolID)
+    if payload and payload.summary.operating:
+        return payload
+    return None
+
+
 def get_program(school, programCode):
     """Try to get latest program; return either program or empty string"""
     if not validate_pid(programCode):
@@ -138,22 +159,22 @@ class OfferView(TemplateView):
             OID = ''
         if 'iped' in request.GET and request.GET['iped']:
             iped = request.GET['iped']
-            school = get_school(iped)
-            if school:
-                school_data = school.as_json()
+            school_payload = get_operating_school(iped)
+            if school_payload:
+                school = school_payload.summary
+                school_data = school_payload.content.decode('utf-8')
                 if 'pid' in request.GET and request.GET['pid']:
                     PID = request.GET['pid']
                     if not validate_pid(PID):
                         warning = PID_ERROR
                         PID = ''
                     if PID:
-                        programs = Program.objects.filter(
-                            program_code=PID,
-                            institution=school,
-                            test=test).order_by('-pk')
-                        if programs:
-                            program = programs[0]
-                            program_data = program.as_json()
+                        program_payload = get_program_payload(
+                            iped, PID, test=test)
+                        if program_payload:
+                            program = program_payload.summary
+                            program_data = program_payload.content.decode(
+                                'utf-8')
                         else:
                             warning = PID_ERROR
                 else:
@@ -209,19 +230,20 @@ class FeedbackView(TemplateView):
 class SchoolRepresentation(View):
 
     def get_school(self, school_id):
-        return get_object_or_404(School, pk=school_id)
+        payload = get_school_payload(school_id)
+        if not payload:
+            raise Http404("No school found")
+        return payload
 
     def get(self, request, school_id, **kwargs):
-        school = self.get_school(school_id)
-        return HttpResponse(school.as_json(), content_type='application/json')
+        return payload_response(request, self.get_school(school_id))
 
 
 class ProgramRepresentation(View):
 
     def get_program(self, program_code):
         ids = program_code.split('_')
-        return Program.objects.filter(institution__school_id=int(ids[0]),
-                                      program_code=ids[1]).first()
+        return get_program_payload(ids[0], ids[1])
 
     def get(self, request, program_code, **kwargs):
         ids = program_code.split('_')
@@ -232,63 +254,54 @@ class ProgramRepresentation(View):
         PID = ids[1]
         if not validate_pid(PID):
             return HttpResponseBadRequest("Error: Invalid program ID")
-        if not get_school(ids[0]):
+        if not get_operating_school(ids[0]):
             return HttpResponseBadRequest("Error: No school found")
         program = self.get_program(program_code)
         if not program:
             p_error = "Error: No program found"
             return HttpResponseBadRequest(p_error)
-        return HttpResponse(program.as_json(),
-                            content_type='application/json')
+        return payload_response(request, program)
 
 
 class StatsRepresentation(View):
 
-    def get_stats(self, school, programID):
-        program = get_program(school, programID)
-        national_stats = nat_stats.get_prepped_stats(
-            program_length=get_program_length(program, school)
-        )
-        return json.dumps(national_stats)
+    def get_stats(self, school_id, programID):
+        school = get_operating_school(school_id)
+        program = None
+        if school and validate_pid(programID):
+            program = get_program_payload(school_id, programID)
+        return get_stats_payload(get_program_length(
+            program and program.summary, school and school.summary))
 
     def get(self, request, id_pair=''):
         school_id = id_pair.split('_')[0]
-        school = get_school(school_id)
         try:
             program_id = id_pair.split('_')[1]
         except Exception:
             program_id = None
-        stats = self.get_stats(school, program_id)
-        return HttpResponse(stats, content_type='application/json')
+        stats = self.get_stats(school_id, program_id)
+        return payload_response(request, stats)
 
 
 class ExpenseRepresentation(View):
     """deliver BLS expense data in json form"""
 
     def get(self, request):
-        expense_json = get_json_file(EXPENSE_FILE)
-        if not expense_json:
+        expenses = get_file_payload(EXPENSE_FILE)
+        if not expenses:
             error = "No expense data could be found"
             return HttpResponseBadRequest(error)
-        return HttpResponse(expense_json, content_type='application/json')
+        return payload_response(request, expenses)
 
 
 class ConstantsRepresentation(View):
     """deliver stored Constants in json form"""
 
     def get_constants(self):
-        constants = OrderedDict()
-        for ccap in ConstantCap.objects.order_by('slug'):
-            constants[ccap.slug] = ccap.value
-        for crate in ConstantRate.objects.order_by('slug'):
-            constants[crate.slug] = "{0}".format(crate.value)
-        cy = constants['constantsYear']
-        constants['constantsYear'] = "{}-{}".format(cy, str(cy + 1)[2:])
-        return json.dumps(constants)
+        return get_constants_payload()
 
     def get(self, request):
-        return HttpResponse(self.get_constants(),
-                            content_type='application/json')
+        return payload_response(request, self.get_constants())
 
 
 def school_autocomplete(request):
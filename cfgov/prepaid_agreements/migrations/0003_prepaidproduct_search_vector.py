@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2020-09-16 15:21
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def populate_search_vector(apps, schema_editor):
+    PrepaidProduct = apps.get_model('prepaid_agreements', 'PrepaidProduct')
+    PrepaidProduct.objects.update(search_vector=SearchVector(
+        'issuer_name',
+        'other_relevant_parties',
+        'name',
+        'program_manager',
+        'prepaid_type',
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prepaid_agreements', '0002_add_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prepaidproduct',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='prepaidproduct',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='prepaidproduct_search_gin'),
+        ),
+        migrations.RunPython(
+            populate_search_vector, migrations.RunPython.noop
+        ),
+    ]
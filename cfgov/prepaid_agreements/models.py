@@ -1,10 +1,29 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 
 
+# Fields covered by the stored search vector.
+SEARCH_FIELDS = [
+    'issuer_name',
+    'other_relevant_parties',
+    'name',
+    'program_manager',
+    'prepaid_type',
+]
+
+# The unfiltered search filters, cached until the next import.
+AVAILABLE_FILTERS_CACHE_KEY = 'prepaid_agreements_available_filters'
+
+
 class PrepaidProductQuerySet(models.QuerySet):
     def valid(self):
         return self.filter(deleted_at=None)
 
+    def update_search_vector(self):
+        """Recompute the stored search vector of these products."""
+        return self.update(search_vector=SearchVector(*SEARCH_FIELDS))
+
 
 class PrepaidProduct(models.Model):
     name = models.CharField(blank=True, max_length=255)
@@ -17,12 +36,17 @@ class PrepaidProduct(models.Model):
     status = models.TextField(blank=True, null=True)
     withdrawal_date = models.DateField(blank=True, null=True)
     deleted_at = models.DateTimeField(blank=True, null=True)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     objects = PrepaidProductQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super(PrepaidProduct, self).save(*args, **kwargs)
+        PrepaidProduct.objects.filter(pk=self.pk).update_search_vector()
+
     @property
     def most_recent_agreement(self):
         """ Gets most recent agreement, as determined by its created time."""
@@ -30,6 +54,12 @@ class PrepaidProduct(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            GinIndex(
+                fields=['search_vector'],
+                name='prepaidproduct_search_gin'
+            ),
+        ]
 
 
 class PrepaidAgreement(models.Model):
@@ -1,19 +1,47 @@
+import logging
+import time
 from datetime import datetime
 
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
 
 import pytz
 import requests
 
-from prepaid_agreements.models import PrepaidAgreement, PrepaidProduct
+from prepaid_agreements.models import (
+    AVAILABLE_FILTERS_CACHE_KEY, PrepaidAgreement, PrepaidProduct
+)
 
 
+logger = logging.getLogger(__name__)
+
 S3_PATH = 'https://files.consumerfinance.gov/a/assets/prepaid-agreements/'
 METADATA_FILENAME = 'prepaid_metadata.json'
+BATCH_SIZE = 1000
+
+PRODUCT_FIELDS = [
+    'name',
+    'issuer_name',
+    'prepaid_type',
+    'program_manager',
+    'program_manager_exists',
+    'other_relevant_parties',
+    'status',
+    'withdrawal_date',
+]
+AGREEMENT_FIELDS = [
+    'product_id',
+    'created_time',
+    'effective_date',
+    'compressed_files_url',
+    'bulk_download_path',
+    'filename',
+]
 
 
 def mark_deleted_products(valid_products):
-    PrepaidProduct.objects.exclude(
+    return PrepaidProduct.objects.exclude(
         pk__in=valid_products
     ).exclude(
         deleted_at__isnull=False
@@ -22,73 +50,196 @@ def mark_deleted_products(valid_products):
     )
 
 
+def get_product_id(item):
+    return item['product_id'].replace('PRODUCT-', '')
+
+
+def parse_product(item):
+    """Return the pk and field values of a product in the metadata."""
+    pk = get_product_id(item)
+
+    withdrawal_date = item['withdrawal_date']
+    if withdrawal_date:
+        withdrawal_date = datetime.strptime(
+            withdrawal_date, "%m/%d/%Y").date()
+
+    return pk, {
+        'name': item['product_name'],
+        'issuer_name': item['issuer_name'],
+        'prepaid_type': item['prepaid_type'],
+        'program_manager': item['program_manager'],
+        'program_manager_exists': item['program_manager_exists'],
+        'other_relevant_parties': item['other_relevant_parties'],
+        'status': item['status'],
+        'withdrawal_date': withdrawal_date
+    }
+
+
+def parse_agreement(item, product):
+    """Return the pk and field values of an agreement in the metadata.
+
+    `product` is the agreement's PrepaidProduct, with its imported name
+    and issuer.
+    """
+    pk = item['agreement_id'].replace('IFL-', '')
+
+    effective_date = item['effective_date']
+    if effective_date and effective_date != 'None':
+        effective_date = datetime.strptime(
+            effective_date, '%m/%d/%Y').date()
+    else:
+        effective_date = None
+
+    created_time = datetime.strptime(
+        item['created_date'],
+        '%Y-%m-%d %H:%M:%S'
+    )
+    created_time = created_time.replace(tzinfo=pytz.timezone('EST'))
+
+    url = S3_PATH + item['agreements_files_location']
+
+    if "_" in product.name:
+        bulk_path = item['path'].split("/")[2]
+        bulk_download_path = \
+            product.issuer_name + '/' + product.name + '/' + bulk_path
+    else:
+        bulk_download_path = item['path'].replace("_", " ")
+
+    return pk, {
+        'product': product,
+        'created_time': created_time,
+        'effective_date': effective_date,
+        'compressed_files_url': url,
+        'bulk_download_path': bulk_download_path,
+        'filename': item['agreements_files_location']
+    }
+
+
 def import_products_data(products_data):
     imported_products = []
     for item in products_data:
-        pk = item['product_id'].replace('PRODUCT-', '')
+        pk, defaults = parse_product(item)
         imported_products.append(pk)
-
-        withdrawal_date = item['withdrawal_date']
-        if withdrawal_date:
-            withdrawal_date = datetime.strptime(
-                withdrawal_date, "%m/%d/%Y").date()
-
-        PrepaidProduct.objects.update_or_create(pk=pk, defaults={
-            'name': item['product_name'],
-            'issuer_name': item['issuer_name'],
-            'prepaid_type': item['prepaid_type'],
-            'program_manager': item['program_manager'],
-            'program_manager_exists': item['program_manager_exists'],
-            'other_relevant_parties': item['other_relevant_parties'],
-            'status': item['status'],
-            'withdrawal_date': withdrawal_date
-        })
+        PrepaidProduct.objects.update_or_create(pk=pk, defaults=defaults)
     return imported_products
 
 
 def import_agreements_data(agreements_data):
     for item in agreements_data:
-        pk = item['agreement_id'].replace('IFL-', '')
-
-        effective_date = item['effective_date']
-        if effective_date and effective_date != 'None':
-            effective_date = datetime.strptime(
-                effective_date, '%m/%d/%Y').date()
-        else:
-            effective_date = None
-
-        created_time = datetime.strptime(
-            item['created_date'],
-            '%Y-%m-%d %H:%M:%S'
-        )
-        created_time = created_time.replace(tzinfo=pytz.timezone('EST'))
-
-        product_id = item['product_id'].replace('PRODUCT-', '')
-        product = PrepaidProduct.objects.get(pk=product_id)
-        url = S3_PATH + item['agreements_files_location']
-
-        if "_" in product.name:
-            bulk_path = item['path'].split("/")[2]
-            bulk_download_path = \
-                product.issuer_name + '/' + product.name + '/' + bulk_path
+        product = PrepaidProduct.objects.get(pk=get_product_id(item))
+        pk, defaults = parse_agreement(item, product)
+        PrepaidAgreement.objects.update_or_create(pk=pk, defaults=defaults)
+
+
+def diff_rows(model, rows, fields):
+    """Compare parsed rows with the ones already stored.
+
+    `rows` maps integer pks to field values. Returns new instances to
+    create, changed instances to update and a count of unchanged rows.
+    """
+    existing = model.objects.in_bulk(list(rows))
+    to_create = []
+    to_update = []
+    unchanged = 0
+    for pk, values in rows.items():
+        instance = existing.get(pk)
+        if instance is None:
+            to_create.append(model(pk=pk, **values))
+            continue
+        changed = False
+        for field in fields:
+            if getattr(instance, field) != values[field]:
+                setattr(instance, field, values[field])
+                changed = True
+        if changed:
+            to_update.append(instance)
         else:
-            bulk_download_path = item['path'].replace("_", " ")
-
-        PrepaidAgreement.objects.update_or_create(pk=pk, defaults={
-            'product': product,
-            'created_time': created_time,
-            'effective_date': effective_date,
-            'compressed_files_url': url,
-            'bulk_download_path': bulk_download_path,
-            'filename': item['agreements_files_location']
-        })
+            unchanged += 1
+    return to_create, to_update, unchanged
+
+
+def write_rows(model, to_create, to_update, fields):
+    model.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+    model.objects.bulk_update(to_update, fields, batch_size=BATCH_SIZE)
+
+
+def bulk_import_data(data):
+    """Import the metadata with a few bulk queries in one transaction.
+
+    Existing products and agreements are loaded up front and compared with
+    the metadata, and only new or changed rows are written. Returns counts
+    of products and agreements created, updated and unchanged, and of
+    products marked deleted.
+    """
+    products = {}
+    for item in data['products']:
+        pk, values = parse_product(item)
+        products[int(pk)] = values
+
+    counts = {}
+    with transaction.atomic():
+        to_create, to_update, unchanged = diff_rows(
+            PrepaidProduct, products, PRODUCT_FIELDS)
+        write_rows(PrepaidProduct, to_create, to_update, PRODUCT_FIELDS)
+        counts['products'] = {
+            'created': len(to_create),
+            'updated': len(to_update),
+            'unchanged': unchanged,
+        }
+        PrepaidProduct.objects.filter(
+            pk__in=[product.pk for product in to_create + to_update]
+        ).update_search_vector()
+
+        agreement_products = PrepaidProduct.objects.in_bulk([
+            int(get_product_id(item)) for item in data['agreements']
+        ])
+        agreements = {}
+        for item in data['agreements']:
+            product = agreement_products[int(get_product_id(item))]
+            pk, values = parse_agreement(item, product)
+            values['product_id'] = values.pop('product').pk
+            agreements[int(pk)] = values
+
+        to_create, to_update, unchanged = diff_rows(
+            PrepaidAgreement, agreements, AGREEMENT_FIELDS)
+        write_rows(PrepaidAgreement, to_create, to_update, AGREEMENT_FIELDS)
+        counts['agreements'] = {
+            'created': len(to_create),
+            'updated': len(to_update),
+            'unchanged': unchanged,
+        }
+
+        counts['deleted'] = mark_deleted_products(list(products))
+    return counts
 
 
 def run(*args):
+    """Import prepaid product and agreement metadata.
+
+    Run with `--script-args bulk` to use bulk_import_data.
+    """
+    start = time.monotonic()
     source_url = S3_PATH + METADATA_FILENAME
     resp = requests.get(url=source_url)
     data = resp.json()
 
-    imported_products = import_products_data(data['products'])
-    import_agreements_data(data['agreements'])
-    mark_deleted_products(imported_products)
+    if 'bulk' in args:
+        counts = bulk_import_data(data)
+        for kind in ['products', 'agreements']:
+            logger.info(
+                '%s: %d created, %d updated, %d unchanged',
+                kind.capitalize(),
+                counts[kind]['created'],
+                counts[kind]['updated'],
+                counts[kind]['unchanged']
+            )
+        logger.info('%d products marked deleted', counts['deleted'])
+    else:
+        imported_products = import_products_data(data['products'])
+        import_agreements_data(data['agreements'])
+        mark_deleted_products(imported_products)
+    cache.delete(AVAILABLE_FILTERS_CACHE_KEY)
+    logger.info(
+        'Imported prepaid agreements data in %.1f seconds',
+        time.monotonic() - start
+    )
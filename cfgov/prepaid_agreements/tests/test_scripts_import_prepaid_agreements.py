@@ -1,140 +1,211 @@
+import copy
 import unittest
 
+from django.test import TestCase
+
+from prepaid_agreements.models import PrepaidAgreement, PrepaidProduct
 from prepaid_agreements.scripts.import_prepaid_agreements_data import (
-    import_agreements_data, import_products_data
+    bulk_import_data, import_agreements_data, import_products_data
 )
 
 
+SAMPLE_DATA = {
+    "agreements": [
+        {
+            "agreement_id": "IFL-1",
+            "agreements_files_location": "Bank1_of_CFPB_200101.zip",
+            "created_date": "2020-01-01 12:34:56",
+            "effective_date": "01/01/2020",
+            "path": "CFPB Bank1/Bank1 of CFPB/20200101",
+            "product_id": "PRODUCT-1"
+        },
+        {
+            "agreement_id": "IFL-2",
+            "agreements_files_location": "Bank2_of_CFPB_20200202.zip",
+            "created_date": "2020-02-02 12:34:56",
+            "effective_date": "02/02/2020",
+            "path": "CFPB Bank2/Bank2_of_CFPB/20200202",
+            "product_id": "PRODUCT-2"
+        },
+        {
+            "agreement_id": "IFL-3",
+            "agreements_files_location": "Bank3_of_CFPB_20200303.zip",
+            "created_date": "2020-03-03 12:34:56",
+            "effective_date": "03/03/2020",
+            "path": "CFPB Bank3/Bank3_of CFPB/20200303",
+            "product_id": "PRODUCT-3"
+        },
+        {
+            "agreement_id": "IFL-4",
+            "agreements_files_location": "Bank4_of_CFPB_20200404.zip",
+            "created_date": "2020-04-04 12:34:56",
+            "effective_date": "04/04/2020",
+            "path": "CFPB Bank4/Bank4 of CFPB/20200404",
+            "product_id": "PRODUCT-4"
+        },
+        {
+            "agreement_id": "IFL-5",
+            "agreements_files_location": "Bank5_of_CFPB_20200505.zip",
+            "created_date": "2020-05-05 12:34:56",
+            "effective_date": "05/05/2020",
+            "path": "CFPB Bank5/Bank5_of_CFPB/20200505",
+            "product_id": "PRODUCT-5"
+        },
+        {
+            "agreement_id": "IFL-6",
+            "agreements_files_location": "Bank6_of_CFPB_20200606.zip",
+            "created_date": "2020-06-06 12:34:56",
+            "effective_date": "06/06/2020",
+            "path": "CFPB Bank6/Bank6_of CFPB/20200606",
+            "product_id": "PRODUCT-6"
+        }
+    ],
+    "products": [
+        {
+            "issuer_id": "1",
+            "issuer_name": "CFPB Bank1",
+            "other_relevant_parties": "Party",
+            "prepaid_type": "Payroll",
+            "product_id": "PRODUCT-1",
+            "product_name": "Bank1 of CFPB",
+            "program_manager": "CFPB",
+            "program_manager_exists": "Yes",
+            "status": "Active",
+            "withdrawal_date": "01/01/2020"
+        },
+        {
+            "issuer_id": "2",
+            "issuer_name": "CFPB Bank2",
+            "other_relevant_parties": "Party",
+            "prepaid_type": "Prison release",
+            "product_id": "PRODUCT-2",
+            "product_name": "Bank2_of_CFPB",
+            "program_manager": "CFPB",
+            "program_manager_exists": "Yes",
+            "status": "Active",
+            "withdrawal_date": "02/02/2020"
+        },
+        {
+            "issuer_id": "3",
+            "issuer_name": "CFPB Bank3",
+            "other_relevant_parties": "Party",
+            "prepaid_type": "Refunds",
+            "product_id": "PRODUCT-3",
+            "product_name": "Bank3 of CFPB",
+            "program_manager": "CFPB",
+            "program_manager_exists": "Yes",
+            "status": "Active",
+            "withdrawal_date": "03/03/2020"
+        },
+        {
+            "issuer_id": "4",
+            "issuer_name": "CFPB Bank4",
+            "other_relevant_parties": "Party",
+            "prepaid_type": "Student",
+            "product_id": "PRODUCT-4",
+            "product_name": "Bank4_of CFPB",
+            "program_manager": "CFPB",
+            "program_manager_exists": "Yes",
+            "status": "Active",
+            "withdrawal_date": "04/04/2020"
+        },
+        {
+            "issuer_id": "5",
+            "issuer_name": "CFPB Bank5",
+            "other_relevant_parties": "Party",
+            "prepaid_type": "Tax",
+            "product_id": "PRODUCT-5",
+            "product_name": "Bank5 of CFPB",
+            "program_manager": "CFPB",
+            "program_manager_exists": "Yes",
+            "status": "Active",
+            "withdrawal_date": "05/05/2020"
+        },
+        {
+            "issuer_id": "6",
+            "issuer_name": "CFPB Bank6",
+            "other_relevant_parties": "Party",
+            "prepaid_type": "Travel",
+            "product_id": "PRODUCT-6",
+            "product_name": "Bank6_of_CFPB",
+            "program_manager": "CFPB",
+            "program_manager_exists": "Yes",
+            "status": "Active",
+            "withdrawal_date": "06/06/2020"
+        }
+    ]
+}
+
+
 class TestImports(unittest.TestCase):
     def test_import_data(self):
-        data = {
-            "agreements": [
-                {
-                    "agreement_id": "IFL-1",
-                    "agreements_files_location": "Bank1_of_CFPB_200101.zip",
-                    "created_date": "2020-01-01 12:34:56",
-                    "effective_date": "01/01/2020",
-                    "path": "CFPB Bank1/Bank1 of CFPB/20200101",
-                    "product_id": "PRODUCT-1"
-                },
-                {
-                    "agreement_id": "IFL-2",
-                    "agreements_files_location": "Bank2_of_CFPB_20200202.zip",
-                    "created_date": "2020-02-02 12:34:56",
-                    "effective_date": "02/02/2020",
-                    "path": "CFPB Bank2/Bank2_of_CFPB/20200202",
-                    "product_id": "PRODUCT-2"
-                },
-                {
-                    "agreement_id": "IFL-3",
-                    "agreements_files_location": "Bank3_of_CFPB_20200303.zip",
-                    "created_date": "2020-03-03 12:34:56",
-                    "effective_date": "03/03/2020",
-                    "path": "CFPB Bank3/Bank3_of CFPB/20200303",
-                    "product_id": "PRODUCT-3"
-                },
-                {
-                    "agreement_id": "IFL-4",
-                    "agreements_files_location": "Bank4_of_CFPB_20200404.zip",
-                    "created_date": "2020-04-04 12:34:56",
-                    "effective_date": "04/04/2020",
-                    "path": "CFPB Bank4/Bank4 of CFPB/20200404",
-                    "product_id": "PRODUCT-4"
-                },
-                {
-                    "agreement_id": "IFL-5",
-                    "agreements_files_location": "Bank5_of_CFPB_20200505.zip",
-                    "created_date": "2020-05-05 12:34:56",
-                    "effective_date": "05/05/2020",
-                    "path": "CFPB Bank5/Bank5_of_CFPB/20200505",
-                    "product_id": "PRODUCT-5"
-                },
-                {
-                    "agreement_id": "IFL-6",
-                    "agreements_files_location": "Bank6_of_CFPB_20200606.zip",
-                    "created_date": "2020-06-06 12:34:56",
-                    "effective_date": "06/06/2020",
-                    "path": "CFPB Bank6/Bank6_of CFPB/20200606",
-                    "product_id": "PRODUCT-6"
-                }
-            ],
-            "products": [
-                {
-                    "issuer_id": "1",
-                    "issuer_name": "CFPB Bank1",
-                    "other_relevant_parties": "Party",
-                    "prepaid_type": "Payroll",
-                    "product_id": "PRODUCT-1",
-                    "product_name": "Bank1 of CFPB",
-                    "program_manager": "CFPB",
-                    "program_manager_exists": "Yes",
-                    "status": "Active",
-                    "withdrawal_date": "01/01/2020"
-                },
-                {
-                    "issuer_id": "2",
-                    "issuer_name": "CFPB Bank2",
-                    "other_relevant_parties": "Party",
-                    "prepaid_type": "Prison release",
-                    "product_id": "PRODUCT-2",
-                    "product_name": "Bank2_of_CFPB",
-                    "program_manager": "CFPB",
-                    "program_manager_exists": "Yes",
-                    "status": "Active",
-                    "withdrawal_date": "02/02/2020"
-                },
-                {
-                    "issuer_id": "3",
-                    "issuer_name": "CFPB Bank3",
-                    "other_relevant_parties": "Party",
-                    "prepaid_type": "Refunds",
-                    "product_id": "PRODUCT-3",
-                    "product_name": "Bank3 of CFPB",
-                    "program_manager": "CFPB",
-                    "program_manager_exists": "Yes",
-                    "status": "Active",
-                    "withdrawal_date": "03/03/2020"
-                },
-                {
-                    "issuer_id": "4",
-                    "issuer_name": "CFPB Bank4",
-                    "other_relevant_parties": "Party",
-                    "prepaid_type": "Student",
-                    "product_id": "PRODUCT-4",
-                    "product_name": "Bank4_of CFPB",
-                    "program_manager": "CFPB",
-                    "program_manager_exists": "Yes",
-                    "status": "Active",
-                    "withdrawal_date": "04/04/2020"
-                },
-                {
-                    "issuer_id": "5",
-                    "issuer_name": "CFPB Bank5",
-                    "other_relevant_parties": "Party",
-                    "prepaid_type": "Tax",
-                    "product_id": "PRODUCT-5",
-                    "product_name": "Bank5 of CFPB",
-                    "program_manager": "CFPB",
-                    "program_manager_exists": "Yes",
-                    "status": "Active",
-                    "withdrawal_date": "05/05/2020"
-                },
-                {
-                    "issuer_id": "6",
-                    "issuer_name": "CFPB Bank6",
-                    "other_relevant_parties": "Party",
-                    "prepaid_type": "Travel",
-                    "product_id": "PRODUCT-6",
-                    "product_name": "Bank6_of_CFPB",
-                    "program_manager": "CFPB",
-                    "program_manager_exists": "Yes",
-                    "status": "Active",
-                    "withdrawal_date": "06/06/2020"
-                }
-            ]
-        }
+        data = copy.deepcopy(SAMPLE_DATA)
         imported_products = import_products_data(data['products'])
         self.assertEqual(imported_products, ['1', '2', '3', '4', '5', '6'])
 
         imported_agreements = import_agreements_data(data['agreements'])
         self.assertEqual(imported_agreements, None)
+
+
+class TestBulkImport(TestCase):
+    def get_rows(self):
+        return (
+            list(PrepaidProduct.objects.order_by('pk').values()),
+            list(PrepaidAgreement.objects.order_by('pk').values()),
+        )
+
+    def test_bulk_import_matches_row_by_row_import(self):
+        data = copy.deepcopy(SAMPLE_DATA)
+        import_products_data(data['products'])
+        import_agreements_data(data['agreements'])
+        rows = self.get_rows()
+        PrepaidAgreement.objects.all().delete()
+        PrepaidProduct.objects.all().delete()
+
+        counts = bulk_import_data(data)
+        self.assertEqual(
+            counts['products'],
+            {'created': 6, 'updated': 0, 'unchanged': 0}
+        )
+        self.assertEqual(
+            counts['agreements'],
+            {'created': 6, 'updated': 0, 'unchanged': 0}
+        )
+        self.assertEqual(counts['deleted'], 0)
+        self.assertEqual(self.get_rows(), rows)
+
+    def test_bulk_import_only_writes_changes(self):
+        data = copy.deepcopy(SAMPLE_DATA)
+        bulk_import_data(data)
+
+        data['products'][0]['status'] = 'Withdrawn'
+        data['agreements'][1]['effective_date'] = 'None'
+        counts = bulk_import_data(data)
+        self.assertEqual(
+            counts['products'],
+            {'created': 0, 'updated': 1, 'unchanged': 5}
+        )
+        self.assertEqual(
+            counts['agreements'],
+            {'created': 0, 'updated': 1, 'unchanged': 5}
+        )
+        self.assertEqual(PrepaidProduct.objects.get(pk=1).status, 'Withdrawn')
+        self.assertIsNone(PrepaidAgreement.objects.get(pk=2).effective_date)
+
+    def test_bulk_import_marks_missing_products_deleted(self):
+        data = copy.deepcopy(SAMPLE_DATA)
+        bulk_import_data(data)
+
+        data['products'] = data['products'][:5]
+        data['agreements'] = data['agreements'][:5]
+        counts = bulk_import_data(data)
+        self.assertEqual(counts['deleted'], 1)
+        self.assertEqual(PrepaidProduct.objects.valid().count(), 5)
+
+    def test_bulk_import_updates_search_vector(self):
+        data = copy.deepcopy(SAMPLE_DATA)
+        bulk_import_data(data)
+        self.assertEqual(
+            PrepaidProduct.objects.filter(search_vector='payroll').count(),
+            1
+        )
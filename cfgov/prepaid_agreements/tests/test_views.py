@@ -1,14 +1,17 @@
 import unittest
 
+from django.core.cache import cache
 from django.db import connection
 from django.http import HttpRequest
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
-from prepaid_agreements.models import PrepaidProduct
+from prepaid_agreements.models import (
+    AVAILABLE_FILTERS_CACHE_KEY, PrepaidProduct
+)
 from prepaid_agreements.views import (
-    filter_products, get_available_filters, get_detail_page_breadcrumb,
-    search_products
+    filter_products, get_all_available_filters, get_available_filters,
+    get_detail_page_breadcrumb, search_products
 )
 
 
@@ -44,12 +47,40 @@ class TestViews(TestCase):
         self.assertEqual(
             get_available_filters(products),
             {
-                'prepaid_type': ['Tax', 'Travel', 'Payroll'],
+                'prepaid_type': ['Payroll', 'Tax', 'Travel'],
                 'status': ['Active', 'Withdrawn'],
-                'issuer_name': ['Bank of CFPB', 'ABC Bank']
+                'issuer_name': ['ABC Bank', 'Bank of CFPB']
             }
         )
 
+    def test_get_available_filters_skips_blank_values(self):
+        PrepaidProduct.objects.create(issuer_name='', prepaid_type='')
+        with self.assertNumQueries(3):
+            available_filters = get_available_filters(PrepaidProduct.objects)
+        self.assertNotIn('', available_filters['prepaid_type'])
+        self.assertNotIn('', available_filters['issuer_name'])
+        self.assertNotIn(None, available_filters['status'])
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    })
+    def test_get_all_available_filters_is_cached(self):
+        cache.delete(AVAILABLE_FILTERS_CACHE_KEY)
+        available_filters = get_all_available_filters()
+        self.assertEqual(
+            available_filters['status'], ['Active', 'Withdrawn']
+        )
+        PrepaidProduct.objects.create(status='Pending')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_all_available_filters(), available_filters)
+        cache.delete(AVAILABLE_FILTERS_CACHE_KEY)
+        self.assertEqual(
+            get_all_available_filters()['status'],
+            ['Active', 'Pending', 'Withdrawn']
+        )
+
     @unittest.skipUnless(
         connection.vendor == 'postgresql', 'PostgreSQL-dependent')
     def test_search_products_issuer_name(self):
@@ -73,6 +104,32 @@ class TestViews(TestCase):
         self.assertIn(self.product2, results)
         self.assertEqual(results.count(), 2)
 
+    @unittest.skipUnless(
+        connection.vendor == 'postgresql', 'PostgreSQL-dependent')
+    def test_search_products_single_field(self):
+        results = search_products(
+            search_term='cfpb',
+            search_field='program_manager',
+            products=PrepaidProduct.objects.all()
+        )
+        self.assertEqual(list(results), [self.product2])
+
+    @unittest.skipUnless(
+        connection.vendor == 'postgresql', 'PostgreSQL-dependent')
+    def test_search_products_uses_stored_vector(self):
+        # Bypass save() so the stored search vector goes stale.
+        PrepaidProduct.objects.filter(pk=self.product3.pk).update(
+            name='CFPB Product'
+        )
+        products = PrepaidProduct.objects.all()
+        self.assertNotIn(
+            self.product3, search_products('cfpb', 'all', products)
+        )
+        products.update_search_vector()
+        self.assertIn(
+            self.product3, search_products('cfpb', 'all', products)
+        )
+
     def test_filter_products(self):
         results = filter_products(
             filters={
@@ -1,6 +1,7 @@
 from urllib.parse import urlparse
 
 from django.contrib.postgres.search import SearchVector
+from django.core.cache import cache
 from django.core.paginator import Paginator
 from django.db.models import Q
 from django.shortcuts import get_object_or_404, render
@@ -8,45 +9,56 @@ from django.template.response import TemplateResponse
 from django.urls import reverse
 
 from prepaid_agreements.forms import FilterForm, SearchForm
-from prepaid_agreements.models import PrepaidProduct
+from prepaid_agreements.models import (
+    AVAILABLE_FILTERS_CACHE_KEY, SEARCH_FIELDS, PrepaidProduct
+)
 from v1.models.snippets import ReusableText
 
 
-def get_available_filters(products):
-    available_filters = {'prepaid_type': [], 'status': [], 'issuer_name': []}
-
-    for product in products.all():
-        prepaid_type = product.prepaid_type
-        if prepaid_type and prepaid_type != '':
-            if prepaid_type not in available_filters['prepaid_type']:
-                available_filters['prepaid_type'].append(prepaid_type)
+AVAILABLE_FILTERS_CACHE_TIMEOUT = 60 * 60
 
-        status = product.status
-        if status and status not in available_filters['status']:
-            available_filters['status'].append(status)
-
-        issuer_name = product.issuer_name
-        if issuer_name and issuer_name not in available_filters['issuer_name']:
-            available_filters['issuer_name'].append(issuer_name)
 
+def get_available_filters(products):
+    """Return the distinct, non-blank filter values of some products."""
+    return {
+        field: list(
+            products.exclude(**{field + '__isnull': True})
+            .exclude(**{field: ''})
+            .order_by(field)
+            .values_list(field, flat=True)
+            .distinct()
+        )
+        for field in ['prepaid_type', 'status', 'issuer_name']
+    }
+
+
+def get_all_available_filters():
+    """Return the filter values of every valid product.
+
+    These only change when products are imported, which clears the cache.
+    The timeout bounds how stale they can get on other servers.
+    """
+    available_filters = cache.get(AVAILABLE_FILTERS_CACHE_KEY)
+    if available_filters is None:
+        available_filters = get_available_filters(
+            PrepaidProduct.objects.valid()
+        )
+        cache.set(
+            AVAILABLE_FILTERS_CACHE_KEY,
+            available_filters,
+            AVAILABLE_FILTERS_CACHE_TIMEOUT
+        )
     return available_filters
 
 
 def search_products(search_term, search_field, products):
-    search_fields = [
-        'issuer_name',
-        'other_relevant_parties',
-        'name',
-        'program_manager',
-        'prepaid_type',
-    ]
-    if search_field and search_field in search_fields:
-        search_fields = [search_field]
-    products = products.annotate(
-        search=SearchVector(
-            *search_fields
-        ),
-    ).filter(search=search_term)
+    # The stored search vector covers every search field and is indexed.
+    products = products.filter(search_vector=search_term)
+    if search_field and search_field in SEARCH_FIELDS:
+        # Narrow the indexed matches to the one field requested.
+        products = products.annotate(
+            search=SearchVector(search_field),
+        ).filter(search=search_term)
 
     return products
 
@@ -115,7 +127,10 @@ def index(request):
     # Get the available filters for products in the search results and then set
     # those filter choices on the filter form
     filters = {}
-    available_filters = get_available_filters(products)
+    if search_term:
+        available_filters = get_available_filters(products)
+    else:
+        available_filters = get_all_available_filters()
     filter_form = FilterForm(request.GET)
     filter_form.set_issuer_name_choices(available_filters['issuer_name'])
     filter_form.set_prepaid_type_choices(available_filters['prepaid_type'])
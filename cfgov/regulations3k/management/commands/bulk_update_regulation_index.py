@@ -0,0 +1,178 @@
+import datetime
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from regulations3k.management.commands.update_regulation_index import (
+    _run_elasticsearch_rebuild
+)
+from regulations3k.models import Part, Section, SectionParagraph
+from regulations3k.models.django import extract_section_graphs
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def delete_paragraphs(pks):
+    """Delete section paragraphs by pk with plain DELETE statements."""
+    connection = connections[SectionParagraph.objects.db]
+    meta = SectionParagraph._meta
+    sql = 'DELETE FROM {} WHERE {} IN ({{}})'.format(
+        connection.ops.quote_name(meta.db_table),
+        connection.ops.quote_name(meta.pk.column)
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), BATCH_SIZE):
+            batch = pks[start:start + BATCH_SIZE]
+            cursor.execute(
+                sql.format(', '.join(['%s'] * len(batch))), batch)
+
+
+def parse_section(section):
+    """Parse one (pk, label, contents) section tuple in a worker process."""
+    pk, label, contents = section
+    return pk, label, extract_section_graphs(contents)
+
+
+def parse_sections(sections, processes):
+    if processes > 1 and len(sections) > 1:
+        # Workers only parse regdown; drop our connections so forked
+        # processes don't share them.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return list(executor.map(parse_section, sections, chunksize=8))
+    return [parse_section(section) for section in sections]
+
+
+def diff_paragraphs(part_number, parsed, existing):
+    """Compare parsed section paragraphs with stored ones.
+
+    `parsed` is a list of (section pk, section label, graphs) and `existing`
+    maps (section pk, paragraph ID, paragraph) to a stored pk. Counting
+    follows Section.extract_graphs. Returns the paragraphs to create, the
+    stored pks to keep, and the counts.
+    """
+    to_create = []
+    keep = set()
+    counter = {'created': 0, 'kept': 0, 'dupes': []}
+    for section_pk, label, graphs in parsed:
+        section_tag = "{}-{}".format(part_number, label)
+        seen = set()
+        known_ids = set()
+        for pid, index_graph in graphs:
+            key = (section_pk, pid, index_graph)
+            if key not in existing and key not in seen:
+                seen.add(key)
+                to_create.append(SectionParagraph(
+                    section_id=section_pk,
+                    paragraph_id=pid,
+                    paragraph=index_graph))
+                counter['created'] += 1
+                continue
+            if key in existing:
+                keep.add(existing[key])
+            full_id = "{}-{}".format(section_tag, pid)
+            if full_id in known_ids:
+                counter['dupes'].append(full_id)
+            else:
+                known_ids.add(full_id)
+                counter['kept'] += 1
+    return to_create, keep, counter
+
+
+def reindex_version(version, processes):
+    """Re-extract and store the paragraphs of every section in a version."""
+    part = version.part
+    sections = list(Section.objects.filter(
+        subpart__version=version).values_list('pk', 'label', 'contents'))
+    labels = {label for _, label, _ in sections}
+
+    parsed = parse_sections(sections, processes)
+
+    # Like extract_graphs, paragraphs stored for same-labeled sections of
+    # the part's other versions are replaced by this version's.
+    stored = SectionParagraph.objects.filter(
+        section__subpart__version__part=part,
+        section__label__in=labels
+    ).values_list('pk', 'section_id', 'paragraph_id', 'paragraph')
+    existing = {}
+    stored_pks = []
+    for pk, section_pk, pid, paragraph in stored:
+        existing.setdefault((section_pk, pid, paragraph), pk)
+        stored_pks.append(pk)
+
+    to_create, keep, counter = diff_paragraphs(
+        part.part_number, parsed, existing)
+    stale = [pk for pk in stored_pks if pk not in keep]
+
+    with transaction.atomic():
+        if stale:
+            # The search index is rebuilt afterwards, so per-row delete
+            # signals aren't needed.
+            delete_paragraphs(stale)
+        SectionParagraph.objects.bulk_create(
+            to_create, batch_size=BATCH_SIZE)
+    counter['deleted'] = len(stale)
+    return counter
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-extract section paragraphs for every regulation's effective "
+        "version in bulk, then rebuild the regulations search index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of processes used to parse sections'
+        )
+
+    def handle(self, *args, **options):
+        counter = {
+            'created': 0,
+            'deleted': 0,
+            'kept': 0,
+            'dupes': [],
+        }
+        regulations = Part.objects.all()
+        starter = datetime.datetime.now()
+        for part in regulations:
+            version = part.effective_version
+            if not version:
+                continue
+            part_starter = datetime.datetime.now()
+            part_count = reindex_version(version, options['processes'])
+            for key in ['created', 'deleted', 'kept']:
+                counter[key] += part_count[key]
+            counter['dupes'] += part_count['dupes']
+            self.stdout.write(
+                "Part {}: {} created, {} kept, {} deleted in {}".format(
+                    part.part_number,
+                    part_count['created'],
+                    part_count['kept'],
+                    part_count['deleted'],
+                    datetime.datetime.now() - part_starter))
+        dupes = sorted(set(counter['dupes']))
+        logger.info(
+            "Section paragraphs have been extracted for {} regulations "
+            "in {}.\n"
+            "{} were created, {} were unchanged, {} were deleted, and "
+            "{} dupes were found".format(
+                regulations.count(),
+                datetime.datetime.now() - starter,
+                counter['created'],
+                counter['kept'],
+                counter['deleted'],
+                len(dupes)))
+        if dupes:
+            logger.info("These paragraph IDs were dupes: \n{}".format(
+                "\n".join(dupes)))
+        _run_elasticsearch_rebuild()
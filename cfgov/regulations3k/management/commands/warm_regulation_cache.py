@@ -0,0 +1,44 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from regulations3k.models import EffectiveVersion, RegulationPage
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Render and cache every section of each approved effective version, "
+        "on every regulation page that serves it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--part',
+            action='append',
+            dest='parts',
+            help="Only warm this part number. Can be given more than once."
+        )
+
+    def handle(self, *args, **options):
+        pages = RegulationPage.objects.live().filter(
+            regulation__isnull=False
+        ).select_related('regulation')
+        if options['parts']:
+            pages = pages.filter(regulation__part_number__in=options['parts'])
+        for page in pages:
+            versions = EffectiveVersion.objects.filter(
+                part=page.regulation, draft=False
+            )
+            for version in versions:
+                try:
+                    page.warm_section_cache(version)
+                except Exception:
+                    logger.exception(
+                        "Unable to warm rendered sections for {} on {}".format(
+                            version, page.url))
+                else:
+                    logger.info("Warmed rendered sections for {} on {}".format(
+                        version, page.url))
@@ -15,6 +15,10 @@ from wagtail.contrib.frontend_cache.utils import PurgeBatch
 
 import regdown
 
+from core.models import bump_cache_version, get_cache_version
+
+
+VERSION_GENERATION_NAME = 'regulations3k_version:{}'
 
 # Labels always require at least 1 alphanumeric character, then any number of
 # alphanumeric characters and hyphens.
@@ -51,6 +55,19 @@ def sortable_label(label, separator='-'):
     return tuple(segments)
 
 
+def extract_section_graphs(contents):
+    """Return (paragraph ID, indexable text) for each of a section's
+    labeled paragraphs, in the order they appear."""
+    extractor = regdown.extract_labeled_paragraph
+    graphs = []
+    paragraph_ids = re.findall(r'[^{]*{(?P<label>[\w\-]+)}', contents)
+    for pid in paragraph_ids:
+        raw_graph = extractor(pid, contents, exact=True)
+        markup_graph = regdown.regdown(raw_graph)
+        graphs.append((pid, strip_tags(markup_graph).strip()))
+    return graphs
+
+
 class Part(models.Model):
     cfr_title_number = models.CharField(max_length=255)
     chapter = models.CharField(max_length=255)
@@ -250,18 +267,13 @@ class Section(models.Model):
         """Break out and store a section's paragraphs for indexing."""
         part = self.subpart.version.part
         section_tag = "{}-{}".format(part.part_number, self.label)
-        extractor = regdown.extract_labeled_paragraph
-        paragraph_ids = re.findall(r'[^{]*{(?P<label>[\w\-]+)}', self.contents)
         created = 0
         deleted = 0
         kept = 0
         exclude_from_deletion = []
         known_ids = []
         dupes = []
-        for pid in paragraph_ids:
-            raw_graph = extractor(pid, self.contents, exact=True)
-            markup_graph = regdown.regdown(raw_graph)
-            index_graph = strip_tags(markup_graph).strip()
+        for pid, index_graph in extract_section_graphs(self.contents):
             full_id = "{}-{}".format(section_tag, pid)
             graph, cr = SectionParagraph.objects.get_or_create(
                 paragraph=index_graph,
@@ -334,9 +346,25 @@ class SectionParagraph(models.Model):
             self.section.part, self.section.label, self.paragraph_id)
 
 
+def get_version_generation(version_pk):
+    """ Return the rendered-section cache generation for a version """
+    return get_cache_version(VERSION_GENERATION_NAME.format(version_pk))
+
+
+def bump_version_generation(version_pk):
+    """ Invalidate every cached rendered section of a version.
+
+    Sections embed interpretations from other sections of the same version,
+    so a change to any one of them invalidates the whole version. """
+    from regulations3k.resolver import clear_version_resolvers
+    clear_version_resolvers()
+    bump_cache_version(VERSION_GENERATION_NAME.format(version_pk))
+
+
 @receiver(post_save, sender=EffectiveVersion)
 def effective_version_saved(sender, instance, **kwargs):
     """ Invalidate the cache if the effective_version is not a draft """
+    bump_version_generation(instance.pk)
     if not instance.draft:
         batch = PurgeBatch()
         for page in instance.part.page.all():
@@ -347,6 +375,7 @@ def effective_version_saved(sender, instance, **kwargs):
 
 @receiver(post_save, sender=Section)
 def section_saved(sender, instance, **kwargs):
+    bump_version_generation(instance.subpart.version_id)
     if not instance.subpart.version.draft:
         batch = PurgeBatch()
         for page in instance.subpart.version.part.page.all():
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import re
 import urllib
@@ -6,12 +7,14 @@ from datetime import date
 from functools import partial
 from urllib.parse import urljoin
 
+from django.core.cache import caches
 from django.core.paginator import InvalidPage, Paginator
 from django.db import models
 from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import redirect
 from django.template.loader import get_template
 from django.template.response import TemplateResponse
+from django.utils import translation
 
 from wagtail.admin.edit_handlers import (
     FieldPanel, ObjectList, StreamFieldPanel, TabbedInterface
@@ -25,16 +28,32 @@ from jinja2 import Markup
 from regdown import regdown
 
 from ask_cfpb.models.pages import SecondaryNavigationJSMixin
+from core.utils import TTLCache
 from regulations3k.blocks import RegulationsListingFullWidthText
 from regulations3k.documents import SectionParagraphDocument
 from regulations3k.models import Part, Section, label_re_str
+from regulations3k.models.django import get_version_generation
 from regulations3k.resolver import get_contents_resolver, get_url_resolver
+from search.elasticsearch_helpers import (
+    SearchResults, get_page_number, hits_total, normalize_term
+)
 from v1.atomic_elements import molecules, organisms
 from v1.models import CFGOVPage, CFGOVPageManager
 
 
 logger = logging.getLogger(__name__)
 
+RENDERED_SECTION_KEY = 'regulations3k_section:{}:{}:{}:{}'
+SECTION_CACHE = 'regulations3k_sections'
+
+# Enough terms aggregation buckets to count hits in every regulation.
+PART_AGGREGATION_SIZE = 100
+
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 60
+
+search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
 
 class RegulationsSearchPage(RoutablePageMixin, CFGOVPage):
     """A page for the custom search interface for regulations."""
@@ -75,53 +94,42 @@ class RegulationsSearchPage(RoutablePageMixin, CFGOVPage):
                 request,
                 self.get_template(request),
                 self.get_context(request))
-        search = SectionParagraphDocument.search().query(
-            'match', text={"query": search_query, "operator": "AND"})
-        search = search.highlight(
-            'text', pre_tags="<strong>", post_tags="</strong>")
-        total_results = search.count()
+        num_results = validate_num_results(request)
+        page_number = get_page_number(request, num_results)
+        start = (page_number - 1) * num_results
+        _, current_count, part_counts = search_regulations(
+            search_query, regs, order, start, num_results
+        )
         all_regs = [{
                     'short_name': reg.short_name,
                     'id': reg.part_number,
-                    'num_results': search.filter(
-                        'term', part=reg.part_number).count(),
+                    'num_results': part_counts.get(reg.part_number, 0),
                     'selected': reg.part_number in regs}
                     for reg in all_regs
                     ]
+        parent_url = self.parent().url
+
+        def fetch_page(page_start):
+            return search_regulations(
+                search_query, regs, order, page_start, num_results
+            )[0]
+
+        def add_url(hit):
+            return dict(hit, url="{}{}/{}/#{}".format(
+                parent_url, hit['part'], hit['section_label'], hit['id']))
+
+        # Only the page being shown is fetched from Elasticsearch.
+        results = SearchResults(
+            fetch_page, current_count, num_results, transform=add_url
+        )
         payload.update({
+            'results': results,
             'all_regs': all_regs,
-            'total_count': total_results
+            'total_count': sum(part_counts.values()),
+            'current_count': current_count,
         })
-        if regs:
-            search = search.filter('terms', part=regs)
-        if order == 'regulation':
-            search = search.sort('part', 'section_order')
-        search = search[0:total_results]
-        response = search.execute()
-        for hit in response[0:total_results]:
-            try:
-                snippet = Markup("".join(hit.meta.highlight.text[0]))
-            except TypeError as e:
-                logger.warning(
-                    "Query string {} produced a TypeError: {}".format(
-                        search_query, e))
-                continue
-            hit_payload = {
-                'id': hit.paragraph_id,
-                'part': hit.part,
-                'reg': hit.short_name,
-                'label': hit.title,
-                'snippet': snippet,
-                'url': "{}{}/{}/#{}".format(
-                    self.parent().url, hit.part,
-                    hit.section_label, hit.paragraph_id),
-            }
-            payload['results'].append(hit_payload)
-
-        payload.update({'current_count': search.count()})
         self.results = payload
         context = self.get_context(request)
-        num_results = validate_num_results(request)
         paginator = Paginator(payload['results'], num_results)
         page_number = validate_page_number(request, paginator)
         paginated_page = paginator.page(page_number)
@@ -142,6 +150,61 @@ class RegulationsSearchPage(RoutablePageMixin, CFGOVPage):
             context)
 
 
+def search_regulations(search_query, regs, order, start, size):
+    """Search regulation paragraphs for one page of highlighted hits.
+
+    Returns the hits on the page, the number of hits in the selected
+    regulations and a {part number: hit count} dict for all regulations,
+    all from a single Elasticsearch request. Results are cached briefly by
+    normalized query, selected regulations, order and page.
+    """
+    search_query = normalize_term(search_query)
+    key = (search_query, tuple(sorted(regs)), order, start, size)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
+    search = SectionParagraphDocument.search().query(
+        'match', text={"query": search_query, "operator": "AND"})
+    search = search.highlight(
+        'text', pre_tags="<strong>", post_tags="</strong>")
+    search.aggs.bucket(
+        'parts', 'terms', field='part', size=PART_AGGREGATION_SIZE)
+    if regs:
+        # A post filter narrows the hits but not the aggregation, so the
+        # per-regulation counts still cover every regulation.
+        search = search.post_filter('terms', part=regs)
+    if order == 'regulation':
+        search = search.sort('part', 'section_order')
+    search = search.extra(track_total_hits=True)[start:start + size]
+    response = search.execute()
+
+    hits = []
+    for hit in response:
+        try:
+            snippet = Markup("".join(hit.meta.highlight.text[0]))
+        except TypeError as e:
+            logger.warning(
+                "Query string {} produced a TypeError: {}".format(
+                    search_query, e))
+            continue
+        hits.append({
+            'id': hit.paragraph_id,
+            'part': hit.part,
+            'reg': hit.short_name,
+            'label': hit.title,
+            'snippet': snippet,
+            'section_label': hit.section_label,
+        })
+    part_counts = {
+        bucket['key']: bucket['doc_count']
+        for bucket in response.aggregations.parts.buckets
+    }
+    result = (hits, hits_total(response), part_counts)
+    search_cache.set(key, result)
+    return result
+
+
 class RegulationLandingPage(RoutablePageMixin, CFGOVPage):
     """Landing page for eregs."""
 
@@ -347,6 +410,56 @@ class RegulationPage(RoutablePageMixin, SecondaryNavigationJSMixin, CFGOVPage):
             for section in sections.all():
                 yield urljoin(version_url, section.label) + '/'
 
+    def rendered_section_key(self, section, effective_version, date_str=None):
+        """ Cache key for a section's rendered HTML on this page.
+
+        The key includes a hash of everything the rendered output depends on,
+        and the version's generation, which is bumped whenever the version or
+        any of its sections is saved. """
+        content_hash = hashlib.md5('|'.join([
+            section.contents,
+            self.url or '',
+            date_str or '',
+            self.language,
+        ]).encode('utf-8')).hexdigest()
+        return RENDERED_SECTION_KEY.format(
+            get_version_generation(effective_version.pk),
+            effective_version.pk,
+            section.pk,
+            content_hash
+        )
+
+    def render_section(self, section, effective_version, date_str=None):
+        """ Render a section's regdown to HTML, caching the result """
+        cache_key = self.rendered_section_key(
+            section, effective_version, date_str=date_str
+        )
+        section_cache = caches[SECTION_CACHE]
+        content = section_cache.get(cache_key)
+        if content is None:
+            content = regdown(
+                section.contents,
+                url_resolver=get_url_resolver(self, date_str=date_str),
+                contents_resolver=get_contents_resolver(effective_version),
+                render_block_reference=partial(
+                    self.render_interp, {'regulation': self.regulation}
+                )
+            )
+            section_cache.set(cache_key, content)
+        return content
+
+    def warm_section_cache(self, effective_version):
+        """ Render and cache every section of a version as it is served """
+        date_str = None
+        if not effective_version.live_version:
+            date_str = str(effective_version.effective_date)
+        sections = self.get_section_query(effective_version=effective_version)
+        with translation.override(self.language):
+            for section in sections.all():
+                self.render_section(
+                    section, effective_version, date_str=date_str
+                )
+
     def render_interp(self, context, raw_contents, **kwargs):
         template = get_template('regulations3k/inline_interps.html')
 
@@ -464,11 +577,8 @@ class RegulationPage(RoutablePageMixin, SecondaryNavigationJSMixin, CFGOVPage):
             request, section, sections=sections, **kwargs
         )
 
-        content = regdown(
-            section.contents,
-            url_resolver=get_url_resolver(self, date_str=date_str),
-            contents_resolver=get_contents_resolver(effective_version),
-            render_block_reference=partial(self.render_interp, context)
+        content = self.render_section(
+            section, effective_version, date_str=date_str
         )
 
         next_section = get_next_section(sections, current_index)
@@ -586,11 +696,7 @@ def validate_page_number(request, paginator):
     This should catch invalid page numbers and always return
     a valid page number, defaulting to 1.
     """
-    raw_page = request.GET.get('page', 1)
-    try:
-        page_number = int(raw_page)
-    except ValueError:
-        page_number = 1
+    page_number = get_page_number(request, paginator.per_page)
     try:
         paginator.page(page_number)
     except InvalidPage:
@@ -1,10 +1,12 @@
 import re
+from functools import lru_cache
 
 from django.conf import settings
 
-from regdown import extract_labeled_paragraph
+from regdown import LabeledParagraphProcessor
 
 from regulations3k.models import Section
+from regulations3k.models.django import get_version_generation
 
 
 DEFAULT_REGULATIONS_REFERENCE_MAPPING = [
@@ -15,6 +17,17 @@ DEFAULT_REGULATIONS_REFERENCE_MAPPING = [
     ),
 ]
 
+VERSION_RESOLVER_CACHE_SIZE = 32
+
+
+@lru_cache(maxsize=None)
+def compile_reference_mapping(reference_mapping):
+    """ Compile a reference mapping's regexes once per distinct mapping """
+    return [
+        (re.compile(pattern), section_format, paragraph_format)
+        for pattern, section_format, paragraph_format in reference_mapping
+    ]
+
 
 def resolve_reference(reference):
     """ Given a reference, return destination section and paragraph labels
@@ -26,41 +39,115 @@ def resolve_reference(reference):
         'REGULATIONS_REFERENCE_MAPPING',
         DEFAULT_REGULATIONS_REFERENCE_MAPPING
     )
+    compiled_mapping = compile_reference_mapping(
+        tuple(tuple(reference_map) for reference_map in reference_mapping)
+    )
 
-    for reference_map in reference_mapping:
-        reference_re = re.compile(reference_map[0])
+    for reference_re, section_format, paragraph_format in compiled_mapping:
         match = reference_re.match(reference)
         if match:
-            dest_section_label = reference_map[1].format(**match.groupdict())
-            dest_paragraph_label = reference_map[2].format(**match.groupdict())
+            dest_section_label = section_format.format(**match.groupdict())
+            dest_paragraph_label = paragraph_format.format(**match.groupdict())
             return (dest_section_label, dest_paragraph_label)
 
     return (None, None)
 
 
+class SectionIndex(object):
+    """ An index of the labeled paragraphs in a section's contents
+    Lookups return the same text as regdown's
+    extract_labeled_paragraph(label, contents, exact=False), without
+    rescanning the contents. """
+
+    def __init__(self, contents):
+        self.contents = contents
+        self.labels = []
+        self.offsets = []
+        self.first_match = {}
+        self.spans = {}
+
+        offset = 0
+        for line in contents.splitlines(True):
+            match = LabeledParagraphProcessor.RE.search(line)
+            if match:
+                label = match.group('label')
+                # The first labeled line that starts with each prefix is
+                # where a non-exact extraction of that prefix begins.
+                for end in range(len(label) + 1):
+                    self.first_match.setdefault(label[:end], len(self.labels))
+                self.labels.append(label)
+                self.offsets.append(offset)
+            offset += len(line)
+
+    def span(self, label):
+        """ Return the (start, end) offsets of a label's text, or None """
+        if label not in self.spans:
+            first = self.first_match.get(label)
+            if first is None:
+                self.spans[label] = None
+            else:
+                last = first + 1
+                while (last < len(self.labels) and
+                       self.labels[last].startswith(label)):
+                    last += 1
+                end = (self.offsets[last] if last < len(self.labels)
+                       else len(self.contents))
+                self.spans[label] = (self.offsets[first], end)
+        return self.spans[label]
+
+    def paragraph(self, label):
+        span = self.span(label)
+        if span is None:
+            return ''
+        return self.contents[span[0]:span[1]]
+
+
+class VersionResolver(object):
+    """ Resolve references against every section of an EffectiveVersion
+    All sections are loaded with a single query and indexed by label, so
+    each reference is resolved without touching the database. """
+
+    def __init__(self, effective_version_id):
+        self.sections = {
+            label: SectionIndex(contents)
+            for label, contents in Section.objects.filter(
+                subpart__version_id=effective_version_id
+            ).values_list('label', 'contents')
+        }
+
+    def contents_resolver(self, reference):
+        dest_section_label, dest_paragraph_label = resolve_reference(reference)
+        section_index = self.sections.get(dest_section_label)
+        if section_index is None:
+            return ''
+        return section_index.paragraph(dest_paragraph_label)
+
+
+@lru_cache(maxsize=VERSION_RESOLVER_CACHE_SIZE)
+def _version_resolver(effective_version_id, generation):
+    return VersionResolver(effective_version_id)
+
+
+def get_version_resolver(effective_version):
+    """ Return the shared VersionResolver for an EffectiveVersion
+    Resolvers are reused across requests until the version or one of its
+    sections is saved. """
+    return _version_resolver(
+        effective_version.pk,
+        get_version_generation(effective_version.pk)
+    )
+
+
+def clear_version_resolvers():
+    _version_resolver.cache_clear()
+
+
 def get_contents_resolver(effective_version):
     """ Return a Regdown contents_resolver function for the RegulationPage
     This constructs a contents_resolver that will resolve references and
     return their contents for all sections that are part of the current
     EffectiveVersion served by the given page. """
-    section_query = Section.objects.filter(
-        subpart__version=effective_version
-    )
-
-    def contents_resolver(reference):
-        dest_section_label, dest_paragraph_label = resolve_reference(reference)
-        try:
-            dest_section = section_query.get(label=dest_section_label)
-        except Section.DoesNotExist:
-            return ''
-        dest_paragraph = extract_labeled_paragraph(
-            dest_paragraph_label,
-            dest_section.contents,
-            exact=False
-        )
-        return dest_paragraph
-
-    return contents_resolver
+    return get_version_resolver(effective_version).contents_resolver
 
 
 def get_url_resolver(page, date_str=None):
@@ -72,16 +159,18 @@ def get_url_resolver(page, date_str=None):
     section_kwargs = {}
     if date_str is not None:
         section_kwargs['date_str'] = date_str
+    section_urls = {}
 
     def url_resolver(reference):
         dest_section_label, dest_paragraph_label = resolve_reference(reference)
-        section_kwargs['section_label'] = dest_section_label
-        return '{page_url}{section_url}#{paragraph_label}'.format(
-            page_url=page.url,
-            section_url=page.reverse_subpage(
-                'section',
-                kwargs=section_kwargs
-            ),
+        if dest_section_label not in section_urls:
+            section_kwargs['section_label'] = dest_section_label
+            section_urls[dest_section_label] = '{}{}'.format(
+                page.url,
+                page.reverse_subpage('section', kwargs=section_kwargs)
+            )
+        return '{section_url}#{paragraph_label}'.format(
+            section_url=section_urls[dest_section_label],
             paragraph_label=dest_paragraph_label
         )
 
@@ -3,7 +3,9 @@ import unittest
 from unittest import mock
 
 from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.core.paginator import Paginator
 from django.http import Http404, HttpRequest, QueryDict
 from django.test import (
@@ -18,19 +20,65 @@ from core.testutils.mock_cache_backend import CACHE_PURGED_URLS
 from regulations3k.documents import SectionParagraphDocument
 from regulations3k.models.django import (
     EffectiveVersion, Part, Section, SectionParagraph, Subpart,
-    effective_version_saved, section_saved, sortable_label, validate_label
+    bump_version_generation, effective_version_saved, get_version_generation,
+    section_saved, sortable_label, validate_label
 )
 from regulations3k.models.pages import (
     RegulationLandingPage, RegulationPage, RegulationsSearchPage,
     get_next_section, get_previous_section, get_secondary_nav_items,
-    get_section_url, validate_num_results, validate_order,
-    validate_page_number, validate_regs_list
+    get_section_url, search_cache, search_regulations, validate_num_results,
+    validate_order, validate_page_number, validate_regs_list
 )
 
 
+def mock_reg_hit(highlight=True):
+    hit = mock.Mock()
+    hit.text = (
+        'i. Mortgage escrow accounts for collecting taxes',
+        'and property insurance premiums.')
+    hit.title = 'Comment for 1030.2 - Definitions'
+    hit.part = '1030'
+    hit.date = datetime.datetime(2011, 12, 30, 0, 0)
+    hit.section_order = 'interp-0002'
+    hit.section_label = 'Interp-2'
+    hit.short_name = 'Regulation DD'
+    hit.paragraph_id = '2-a-Interp-2-i'
+    if highlight:
+        hit.meta.highlight.text = ["<strong>Mortgage</strong> highlight"]
+    return hit
+
+
+def mock_reg_search(mock_search, hits, total, part_counts):
+    """Chain a mocked Search's methods and return one response."""
+    search = mock_search.return_value
+    for method in ['query', 'highlight', 'post_filter', 'sort', 'extra',
+                   '__getitem__']:
+        getattr(search, method).return_value = search
+    response = mock.MagicMock()
+    response.__iter__.return_value = iter(hits)
+    response.hits.total = mock.Mock(value=total)
+    response.aggregations.parts.buckets = [
+        {'key': part, 'doc_count': count}
+        for part, count in part_counts.items()
+    ]
+    search.execute.return_value = response
+    return search
+
+
+SECTION_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    'regulations3k_sections': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
 class RegModelTests(DjangoTestCase):
     def setUp(self):
         from v1.models import HomePage
+        search_cache.clear()
         self.factory = RequestFactory()
         self.superuser = User.objects.create_superuser(
             username='supertest', password='test', email='test@email.com'
@@ -346,6 +394,84 @@ class RegModelTests(DjangoTestCase):
     def test_sortable_label(self):
         self.assertEqual(sortable_label('1-A-Interp'), ('0001', 'A', 'interp'))
 
+    @override_settings(CACHES=SECTION_CACHES)
+    def test_render_section_is_cached(self):
+        with mock.patch(
+            'regulations3k.models.pages.regdown', return_value='<p>4</p>'
+        ) as mock_regdown:
+            first = self.reg_page.render_section(
+                self.section_num4, self.effective_version)
+            second = self.reg_page.render_section(
+                self.section_num4, self.effective_version)
+        self.assertEqual(first, '<p>4</p>')
+        self.assertEqual(second, '<p>4</p>')
+        self.assertEqual(mock_regdown.call_count, 1)
+
+    @override_settings(CACHES=SECTION_CACHES)
+    def test_render_section_cache_varies_by_date_str(self):
+        with mock.patch(
+            'regulations3k.models.pages.regdown', return_value='<p>4</p>'
+        ) as mock_regdown:
+            self.reg_page.render_section(
+                self.section_num4, self.effective_version)
+            self.reg_page.render_section(
+                self.section_num4, self.effective_version,
+                date_str='2014-01-18')
+        self.assertEqual(mock_regdown.call_count, 2)
+
+    @override_settings(CACHES=SECTION_CACHES)
+    def test_section_saved_invalidates_rendered_sections(self):
+        with mock.patch(
+            'regulations3k.models.pages.regdown', return_value='<p>A</p>'
+        ) as mock_regdown:
+            self.reg_page.render_section(
+                self.section_alpha, self.effective_version)
+            # Saving another section of the same version invalidates the
+            # version, since sections embed each other's interpretations.
+            self.section_interps.save()
+            self.reg_page.render_section(
+                self.section_alpha, self.effective_version)
+        self.assertEqual(mock_regdown.call_count, 2)
+
+    @override_settings(CACHES=SECTION_CACHES)
+    def test_effective_version_saved_invalidates_rendered_sections(self):
+        with mock.patch(
+            'regulations3k.models.pages.regdown', return_value='<p>4</p>'
+        ) as mock_regdown:
+            self.reg_page.render_section(
+                self.section_num4, self.effective_version)
+            self.effective_version.save()
+            self.assertEqual(mock_regdown.call_count, 1)
+            self.reg_page.render_section(
+                self.section_num4, self.effective_version)
+        self.assertEqual(mock_regdown.call_count, 2)
+
+    @override_settings(CACHES=SECTION_CACHES)
+    def test_version_generation_survives_cache_clear(self):
+        bump_version_generation(self.effective_version.pk)
+        generation = get_version_generation(self.effective_version.pk)
+        self.assertGreater(generation, 0)
+        caches['regulations3k_sections'].clear()
+        self.assertEqual(
+            get_version_generation(self.effective_version.pk), generation)
+
+    @override_settings(CACHES=SECTION_CACHES)
+    def test_warm_regulation_cache_command(self):
+        call_command('warm_regulation_cache', '--part', '1002')
+        with mock.patch('regulations3k.models.pages.regdown') as mock_regdown:
+            response = self.client.get('/reg-landing/1002/4/')
+        self.assertEqual(response.status_code, 200)
+        mock_regdown.assert_not_called()
+
+    @override_settings(CACHES=SECTION_CACHES)
+    def test_warm_regulation_cache_command_skips_other_parts(self):
+        call_command('warm_regulation_cache', '--part', '1030')
+        with mock.patch(
+            'regulations3k.models.pages.regdown', return_value='<p>4</p>'
+        ) as mock_regdown:
+            self.client.get('/reg-landing/1002/4/')
+        mock_regdown.assert_called()
+
     def test_render_interp(self):
         result = self.reg_page.render_interp({}, 'some contents')
         self.assertIn('some contents', result)
@@ -391,26 +517,8 @@ class RegModelTests(DjangoTestCase):
 
     @mock.patch.object(SectionParagraphDocument, 'search')
     def test_routable_search_page_calls_elasticsearch(self, mock_search):
-        mock_hit = mock.Mock()
-        mock_hit.text = (
-            'i. Mortgage escrow accounts for collecting taxes',
-            'and property insurance premiums.')
-        mock_hit.title = 'Comment for 1030.2 - Definitions'
-        mock_hit.part = '1030'
-        mock_hit.date = datetime.datetime(2011, 12, 30, 0, 0)
-        mock_hit.section_order = 'interp-0002'
-        mock_hit.section_label = 'Interp-2'
-        mock_hit.short_name = 'Regulation DD'
-        mock_hit.paragraph_id = '2-a-Interp-2-i'
-        mock_hit.meta.highlight.text = ["<strong>Mortgage</strong> highlight"]
-        mock_search().query() \
-            .highlight().filter().sort() \
-            .__getitem__().execute.return_value = [mock_hit]
-        mock_count = mock.Mock(return_value=1)
-        mock_search().query().highlight().count = mock_count
-        mock_search().query() \
-            .highlight().filter().sort() \
-            .__getitem__().count = mock_count
+        search = mock_reg_search(
+            mock_search, [mock_reg_hit()], 1, {'1030': 1, '1002': 3})
         response = self.client.get(
             self.reg_search_page.url + self.reg_search_page.reverse_subpage(
                 'regulation_results_page'),
@@ -418,30 +526,64 @@ class RegModelTests(DjangoTestCase):
              'regs': '1030',
              'order': 'regulation',
              'results': '50'})
-        self.assertEqual(mock_search.call_count, 4)
+        self.assertEqual(mock_search.call_count, 1)
+        self.assertEqual(search.execute.call_count, 1)
+        search.post_filter.assert_called_once_with('terms', part=['1030'])
+        search.sort.assert_called_once_with('part', 'section_order')
+        search.__getitem__.assert_called_once_with(slice(0, 50))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data['current_count'], 1)
+        self.assertEqual(response.context_data['total_count'], 4)
+        result = response.context_data['results'][0]
+        self.assertEqual(
+            result['snippet'], '<strong>Mortgage</strong> highlight')
+        self.assertEqual(
+            result['url'], '/reg-landing/1030/Interp-2/#2-a-Interp-2-i')
+
+    @mock.patch.object(SectionParagraphDocument, 'search')
+    def test_routable_search_page_counts_hits_per_regulation(self, mock_search):  # noqa: E501
+        mock_reg_search(mock_search, [mock_reg_hit()], 1, {'1002': 3})
+        response = self.client.get(
+            self.reg_search_page.url + self.reg_search_page.reverse_subpage(
+                'regulation_results_page'),
+            {'q': 'mortgage'})
+        counts = {
+            reg['id']: reg['num_results']
+            for reg in self.reg_search_page.results['all_regs']
+        }
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(counts, {'1002': 3, '1030': 0})
+
+    @mock.patch.object(SectionParagraphDocument, 'search')
+    def test_routable_search_page_requests_one_page(self, mock_search):
+        search = mock_reg_search(
+            mock_search, [mock_reg_hit()] * 25, 60, {'1002': 60})
+        response = self.client.get(
+            self.reg_search_page.url + self.reg_search_page.reverse_subpage(
+                'regulation_results_page'),
+            {'q': 'mortgage', 'page': '2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data['current_page'], 2)
+        self.assertEqual(response.context_data['paginator'].num_pages, 3)
+        search.__getitem__.assert_called_once_with(slice(25, 50))
+        self.assertEqual(search.execute.call_count, 1)
+
+    @mock.patch.object(SectionParagraphDocument, 'search')
+    def test_routable_search_page_past_result_window(self, mock_search):
+        search = mock_reg_search(
+            mock_search, [mock_reg_hit()] * 50, 30000, {'1002': 30000})
+        response = self.client.get(
+            self.reg_search_page.url + self.reg_search_page.reverse_subpage(
+                'regulation_results_page'),
+            {'q': 'mortgage', 'page': '500', 'results': '50'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data['current_page'], 1)
+        search.__getitem__.assert_called_once_with(slice(0, 50))
 
     @mock.patch.object(SectionParagraphDocument, 'search')
     def test_routable_search_page_handles_null_highlights(self, mock_search):  # noqa: E501
-        mock_hit = mock.Mock()
-        mock_hit.text = (
-            'i. Mortgage escrow accounts for collecting',
-            ' taxes and property insurance premiums.')
-        mock_hit.title = 'Comment for 1030.2 - Definitions'
-        mock_hit.part = '1030'
-        mock_hit.date = datetime.datetime(2011, 12, 30, 0, 0)
-        mock_hit.section_order = 'interp-0002'
-        mock_hit.section_label = 'Interp-2'
-        mock_hit.short_name = 'Regulation DD'
-        mock_hit.paragraph_id = '2-a-Interp-2-i'
-        mock_search().query() \
-            .highlight().filter().sort() \
-            .__getitem__().execute.return_value = [mock_hit]
-        mock_count = mock.Mock(return_value=1)
-        mock_search().query().highlight().count = mock_count
-        mock_search().query() \
-            .highlight().filter().sort() \
-            .__getitem__().count = mock_count
+        mock_reg_search(
+            mock_search, [mock_reg_hit(highlight=False)], 1, {'1030': 1})
         response = self.client.get(
             self.reg_search_page.url +
             self.reg_search_page.reverse_subpage(
@@ -450,9 +592,21 @@ class RegModelTests(DjangoTestCase):
              'regs': '1030',
              'order': 'regulation',
              'results': '50'})
-        self.assertEqual(mock_search.call_count, 4)
+        self.assertEqual(mock_search.call_count, 1)
         self.assertEqual(response.status_code, 200)
 
+    @mock.patch.object(SectionParagraphDocument, 'search')
+    def test_search_regulations_caches_results(self, mock_search):
+        search = mock_reg_search(
+            mock_search, [mock_reg_hit()], 1, {'1030': 1})
+        first = search_regulations('Mortgage', ['1030'], 'relevance', 0, 25)
+        second = search_regulations(
+            ' mortgage ', ['1030'], 'relevance', 0, 25)
+        self.assertEqual(first, second)
+        self.assertEqual(search.execute.call_count, 1)
+        self.assertEqual(first[1], 1)
+        self.assertEqual(first[2], {'1030': 1})
+
     @mock.patch.object(SectionParagraphDocument, 'search')
     def test_search_page_refuses_single_character_search_elasticsearch(self, mock_search):  # noqa: E501
         response = self.client.get(
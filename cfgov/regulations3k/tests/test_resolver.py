@@ -4,14 +4,17 @@ import datetime
 from django.test import TestCase, override_settings
 
 from model_bakery import baker
-from regdown import DEFAULT_RENDER_BLOCK_REFERENCE, regdown
+from regdown import (
+    DEFAULT_RENDER_BLOCK_REFERENCE, extract_labeled_paragraph, regdown
+)
 
 from regulations3k.models import (
     EffectiveVersion, Part, RegulationLandingPage, RegulationPage, Section,
     Subpart
 )
 from regulations3k.resolver import (
-    get_contents_resolver, get_url_resolver, resolve_reference
+    SectionIndex, clear_version_resolvers, get_contents_resolver,
+    get_url_resolver, get_version_resolver, resolve_reference
 )
 
 
@@ -31,6 +34,7 @@ class ReferenceResolutionTestCase(TestCase):
 
     def setUp(self):
         from v1.models import HomePage
+        clear_version_resolvers()
         self.ROOT_PAGE = HomePage.objects.get(slug='cfgov')
         self.landing_page = RegulationLandingPage(
             title='Reg Landing', slug='reg-landing')
@@ -128,3 +132,62 @@ class ReferenceResolutionTestCase(TestCase):
         url_resolver = get_url_resolver(self.reg_page)
         result = url_resolver('2-c-Interp')
         self.assertEqual(result, '/reg-landing/1002/Interp-2/#c-Interp')
+
+    def test_get_contents_resolver_queries_once(self):
+        contents_resolver = get_contents_resolver(self.effective_version)
+        with self.assertNumQueries(0):
+            self.assertIn(
+                'Interpreting adverse action',
+                contents_resolver('2-c-Interp')
+            )
+            self.assertEqual(contents_resolver('3-b-Interp'), '')
+
+    def test_version_resolver_is_reused(self):
+        self.assertIs(
+            get_version_resolver(self.effective_version),
+            get_version_resolver(self.effective_version)
+        )
+
+    def test_version_resolver_reloads_after_section_saved(self):
+        resolver = get_version_resolver(self.effective_version)
+        self.section_interp2.contents = '{c-Interp}\nRevised\n'
+        self.section_interp2.save()
+        contents_resolver = get_contents_resolver(self.effective_version)
+        self.assertIsNot(
+            get_version_resolver(self.effective_version), resolver)
+        self.assertEqual(
+            contents_resolver('2-c-Interp'), '{c-Interp}\nRevised\n')
+
+    def test_get_url_resolver_with_date_str(self):
+        url_resolver = get_url_resolver(self.reg_page, date_str='2014-01-18')
+        self.assertEqual(
+            url_resolver('2-c-Interp'),
+            '/reg-landing/1002/2014-01-18/Interp-2/#c-Interp'
+        )
+        self.assertEqual(
+            url_resolver('2-d-Interp'),
+            '/reg-landing/1002/2014-01-18/Interp-2/#d-Interp'
+        )
+
+
+class SectionIndexTestCase(TestCase):
+
+    contents = (
+        '{a}\n(a) Paragraph a.\n'
+        '{a-1}\n(1) Paragraph a-1.\n\n'
+        '{a-2}\n(2) Paragraph a-2.\n'
+        '{b}\n(b) Paragraph b.\n'
+        '{b-Interp}\nInterpreting b.\n'
+        '{c}\n(c) Paragraph c.'
+    )
+
+    def test_matches_extract_labeled_paragraph(self):
+        index = SectionIndex(self.contents)
+        for label in ['a', 'a-1', 'a-2', 'b', 'b-Interp', 'c', 'x', '']:
+            self.assertEqual(
+                index.paragraph(label),
+                extract_labeled_paragraph(label, self.contents, exact=False)
+            )
+
+    def test_missing_label(self):
+        self.assertEqual(SectionIndex(self.contents).paragraph('d'), '')
@@ -1,9 +1,13 @@
+from io import StringIO
 from unittest import mock
 
 from django.core.management import call_command
 from django.test import TestCase
 
 from regulations3k.management.commands import update_regulation_index
+from regulations3k.management.commands.bulk_update_regulation_index import (
+    reindex_version
+)
 from regulations3k.models import Section, SectionParagraph
 
 
@@ -32,3 +36,48 @@ class RegulationIndexTestCase(TestCase):
     def test_run_elasticsearch_rebuild(self, mock_call):
         update_regulation_index._run_elasticsearch_rebuild()
         self.assertEqual(mock_call.call_count, 1)
+
+
+@mock.patch('regulations3k.management.commands'
+            '.bulk_update_regulation_index._run_elasticsearch_rebuild')
+class BulkRegulationIndexTestCase(TestCase):
+
+    fixtures = ['tree_limb.json']
+
+    def test_bulk_index_management_command(self, mock_elasticsearch):
+        call_command(
+            'bulk_update_regulation_index', '--processes', '1',
+            stdout=StringIO())
+        self.assertEqual(SectionParagraph.objects.count(), 113)
+        self.assertEqual(mock_elasticsearch.call_count, 1)
+
+    def test_bulk_index_matches_update_regulation_index(
+            self, mock_elasticsearch):
+        with mock.patch('regulations3k.management.commands'
+                        '.update_regulation_index._run_elasticsearch_rebuild'):
+            call_command('update_regulation_index')
+        expected = set(SectionParagraph.objects.values_list(
+            'section_id', 'paragraph_id', 'paragraph'))
+        SectionParagraph.objects.all().delete()
+        call_command(
+            'bulk_update_regulation_index', '--processes', '1',
+            stdout=StringIO())
+        self.assertEqual(
+            set(SectionParagraph.objects.values_list(
+                'section_id', 'paragraph_id', 'paragraph')),
+            expected)
+
+    def test_bulk_index_keeps_and_deletes(self, mock_elasticsearch):
+        section = Section.objects.order_by('pk').first()
+        section.extract_graphs()
+        kept = SectionParagraph.objects.get(
+            section=section, paragraph_id='a')
+        stale = SectionParagraph.objects.create(
+            section=section, paragraph_id='zz', paragraph='Stale paragraph.')
+        counter = reindex_version(section.subpart.version, processes=1)
+        self.assertEqual(counter['deleted'], 1)
+        self.assertEqual(counter['created'], 100)
+        self.assertTrue(SectionParagraph.objects.filter(pk=kept.pk).exists())
+        self.assertFalse(
+            SectionParagraph.objects.filter(pk=stale.pk).exists())
+        self.assertEqual(SectionParagraph.objects.count(), 113)
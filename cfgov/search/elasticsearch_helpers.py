@@ -70,3 +70,96 @@ def environment_specific_index(base_name):
         return base_name
     else:
         return f'{settings.DEPLOY_ENVIRONMENT}-{base_name}'
+
+
+# Elasticsearch's default index.max_result_window. It refuses requests for
+# hits past this many, however many match.
+MAX_RESULT_WINDOW = 10000
+
+
+def get_page_number(request, per_page=None):
+    """Parse the requested page number, defaulting to 1.
+
+    Given the number of hits per page, pages that reach past
+    Elasticsearch's result window also default to 1.
+    """
+    try:
+        page_number = int(request.GET.get('page', 1))
+    except ValueError:
+        return 1
+    if page_number < 1:
+        return 1
+    if per_page and page_number * per_page > MAX_RESULT_WINDOW:
+        return 1
+    return page_number
+
+
+def normalize_term(term):
+    """Lowercase a search term and collapse its whitespace.
+
+    Elasticsearch's analyzers do the same, so normalized terms match the
+    same documents and can share cached results.
+    """
+    return ' '.join(term.lower().split())
+
+
+def hits_total(response):
+    total = response.hits.total
+    # Elasticsearch 7 reports the total as {'value': n, 'relation': 'eq'}.
+    return int(getattr(total, 'value', total))
+
+
+class SearchResults(object):
+    """A sequence of search hits that are fetched a page at a time.
+
+    len() is the total number of hits. Slicing fetches only the pages the
+    slice covers, so Django's Paginator can page through every hit while
+    asking Elasticsearch for one page per request.
+    """
+
+    def __init__(self, fetch_page, total, per_page, transform=None):
+        self.fetch_page = fetch_page
+        self.total = total
+        self.per_page = per_page
+        self.transform = transform
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        for start in range(0, self.total, self.per_page):
+            yield from self[start:start + self.per_page]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            if index < 0:
+                index += self.total
+            if not 0 <= index < self.total:
+                raise IndexError('search result index out of range')
+            return self[index:index + 1][0]
+
+        start, stop, step = index.indices(self.total)
+        first_page = start - start % self.per_page
+        hits = []
+        for page_start in range(first_page, stop, self.per_page):
+            hits.extend(self.fetch_page(page_start))
+        hits = hits[start - first_page:stop - first_page:step]
+        if self.transform:
+            return [self.transform(hit) for hit in hits]
+        return hits
+
+    def map(self, transform):
+        """Return these results with transform applied to each hit.
+
+        The transform is applied after any this sequence already has.
+        """
+        if self.transform:
+            previous = self.transform
+
+            def composed(hit):
+                return transform(previous(hit))
+        else:
+            composed = transform
+        return SearchResults(
+            self.fetch_page, self.total, self.per_page, composed
+        )
@@ -1,6 +1,14 @@
+import unittest
+from unittest import mock
+
+from django.core.paginator import Paginator
+from django.http import HttpRequest
 from django.test import TestCase, override_settings
 
-from search.elasticsearch_helpers import environment_specific_index
+from search.elasticsearch_helpers import (
+    SearchResults, environment_specific_index, get_page_number, hits_total,
+    normalize_term
+)
 
 
 class TestEnvironmentSpecificIndex(TestCase):
@@ -24,3 +32,93 @@ class TestEnvironmentSpecificIndex(TestCase):
     def test_environment_specific_index_includes_deploy_env(self):
         name = environment_specific_index('index')
         self.assertEqual(name, 'test-index')
+
+
+class TestNormalizeTerm(unittest.TestCase):
+
+    def test_normalize_term(self):
+        self.assertEqual(
+            normalize_term(' Payday\tLOANS  now '), 'payday loans now')
+
+
+class TestGetPageNumber(unittest.TestCase):
+
+    def get_page_number(self, page, per_page=None):
+        request = HttpRequest()
+        if page is not None:
+            request.GET.update({"page": page})
+        return get_page_number(request, per_page)
+
+    def test_get_page_number(self):
+        self.assertEqual(self.get_page_number(None), 1)
+        self.assertEqual(self.get_page_number("3"), 3)
+        self.assertEqual(self.get_page_number("<script>"), 1)
+        self.assertEqual(self.get_page_number("0"), 1)
+        self.assertEqual(self.get_page_number("-2"), 1)
+
+    def test_page_past_result_window_defaults_to_1(self):
+        self.assertEqual(self.get_page_number("500", 20), 500)
+        self.assertEqual(self.get_page_number("501", 20), 1)
+        self.assertEqual(self.get_page_number("99999999", 20), 1)
+        self.assertEqual(self.get_page_number("99999999"), 99999999)
+
+
+class TestHitsTotal(unittest.TestCase):
+
+    def test_hits_total_reads_value(self):
+        response = mock.Mock()
+        response.hits.total = mock.Mock(value=12, relation='eq')
+        self.assertEqual(hits_total(response), 12)
+
+    def test_hits_total_accepts_int(self):
+        response = mock.Mock()
+        response.hits.total = 7
+        self.assertEqual(hits_total(response), 7)
+
+
+class SearchResultsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.hits = list(range(45))
+        self.fetched = []
+
+        def fetch_page(start):
+            self.fetched.append(start)
+            return self.hits[start:start + 20]
+
+        self.results = SearchResults(fetch_page, len(self.hits), 20)
+
+    def test_len_is_total(self):
+        self.assertEqual(len(self.results), 45)
+        self.assertEqual(self.fetched, [])
+
+    def test_slice_fetches_covered_pages(self):
+        self.assertEqual(self.results[20:40], self.hits[20:40])
+        self.assertEqual(self.fetched, [20])
+        self.assertEqual(self.results[15:25], self.hits[15:25])
+        self.assertEqual(self.fetched, [20, 0, 20])
+
+    def test_index(self):
+        self.assertEqual(self.results[44], 44)
+        self.assertEqual(self.results[-1], 44)
+        with self.assertRaises(IndexError):
+            self.results[45]
+
+    def test_iter(self):
+        self.assertEqual(list(self.results), self.hits)
+        self.assertEqual(self.fetched, [0, 20, 40])
+
+    def test_map(self):
+        doubled = self.results.map(lambda hit: hit * 2)
+        self.assertEqual(len(doubled), 45)
+        self.assertEqual(doubled[0:3], [0, 2, 4])
+
+    def test_map_composes_transforms(self):
+        mapped = self.results.map(lambda hit: hit + 1).map(lambda hit: hit * 2)
+        self.assertEqual(mapped[0:3], [2, 4, 6])
+        self.assertEqual(self.results[0:3], [0, 1, 2])
+
+    def test_paginator(self):
+        paginator = Paginator(self.results, 20)
+        self.assertEqual(paginator.num_pages, 3)
+        self.assertEqual(list(paginator.page(3)), self.hits[40:])
+        self.assertEqual(self.fetched, [40])
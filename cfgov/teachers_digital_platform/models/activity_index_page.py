@@ -4,6 +4,7 @@ from collections import OrderedDict
 from django.contrib.postgres.fields import JSONField
 from django.core.paginator import InvalidPage, Paginator
 from django.db import models
+from django.utils.functional import cached_property
 
 from wagtail.admin.edit_handlers import (
     ObjectList, StreamFieldPanel, TabbedInterface
@@ -12,6 +13,10 @@ from wagtail.core.fields import StreamField
 
 from elasticsearch_dsl import Q
 
+from core.utils import TTLCache
+from search.elasticsearch_helpers import (
+    SearchResults, get_page_number, hits_total, normalize_term
+)
 from teachers_digital_platform.documents import ActivityPageDocument
 from teachers_digital_platform.models.django import (
     ActivityAgeRange, ActivityBloomsTaxonomyLevel, ActivityBuildingBlock,
@@ -58,6 +63,15 @@ SEARCH_FIELDS = [
     'what_students_will_do'
 ]
 
+ACTIVITY_SETUP_CACHE_TTL = 300
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 300
+
+# The ActivitySetUp returned by get_activity_setup.
+setup_cache = TTLCache(1, ACTIVITY_SETUP_CACHE_TTL)
+# Pages of activity IDs and facet counts from search_activities.
+search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
 
 class ActivityIndexPage(CFGOVPage):
     """A model for the Activity Search page."""
@@ -101,7 +115,11 @@ class ActivityIndexPage(CFGOVPage):
         return template
 
     def dsl_search(self, request, *args, **kwargs):
-        """Search using Elasticsearch 7 and django-elasticsearch-dsl."""
+        """Search using Elasticsearch 7 and django-elasticsearch-dsl.
+
+        The current page of hits, the total and the facet counts are
+        fetched in a single request by search_activities.
+        """
         all_facets = copy.copy(self.activity_setups.facet_setup)
         selected_facets = {}
         card_setup = self.activity_setups.ordered_cards
@@ -110,6 +128,7 @@ class ActivityIndexPage(CFGOVPage):
         facet_called = any(
             [request.GET.get(facet, '') for facet in FACET_LIST]
         )
+        results_per_page = validate_results_per_page(request)
         # If there's no query or facet request, we can return cached setups:
         if not search_query and not facet_called:
             payload = {
@@ -122,7 +141,6 @@ class ActivityIndexPage(CFGOVPage):
                 'expanded_facets': ALWAYS_EXPANDED,
             }
             self.results = payload
-            results_per_page = validate_results_per_page(request)
             paginator = Paginator(payload['results'], results_per_page)
             current_page = validate_page_number(request, paginator)
             paginated_page = paginator.page(current_page)
@@ -137,16 +155,6 @@ class ActivityIndexPage(CFGOVPage):
             }
             return context_update
 
-        dsl_search = ActivityPageDocument().search()
-        if search_query:
-            terms = search_query.split()
-            for term in terms:
-                dsl_search = dsl_search.query(
-                    "bool",
-                    must=Q("multi_match", query=term, fields=SEARCH_FIELDS)
-                )
-        else:
-            dsl_search = dsl_search.sort('-date')
         for facet, facet_config in FACET_MAP:
             if facet in request.GET and request.GET.get(facet):
                 facet_ids = [
@@ -154,22 +162,24 @@ class ActivityIndexPage(CFGOVPage):
                     if value.isdigit()
                 ]
                 selected_facets[facet] = facet_ids
-        for facet, pks in selected_facets.items():
-            dsl_search = dsl_search.query(
-                "bool",
-                should=[Q("match", **{facet: pk}) for pk in pks]
-            )
-        facet_search = dsl_search.update_from_dict(FACET_DICT)
-        total_results = dsl_search.count()
-        dsl_search = dsl_search[:total_results]
-        response = dsl_search.execute()
-        results = [
-            card_setup[str(hit.id)] for hit in response[:total_results]
-        ]
-        facet_response = facet_search.execute()
-        facet_counts = {facet: getattr(
-            facet_response.aggregations, f"{facet}_terms").buckets
-            for facet in FACET_LIST}
+        page_number = get_page_number(request, results_per_page)
+        start = (page_number - 1) * results_per_page
+        _, total_results, facet_counts = search_activities(
+            search_query, selected_facets, start, results_per_page
+        )
+
+        def fetch_page(page_start):
+            return search_activities(
+                search_query, selected_facets, page_start, results_per_page
+            )[0]
+
+        # Only the cards for the page being shown are looked up.
+        results = SearchResults(
+            fetch_page,
+            total_results,
+            results_per_page,
+            transform=card_setup.__getitem__
+        )
         all_facets = parse_dsl_facets(
             all_facets, facet_counts, selected_facets
         )
@@ -193,7 +203,6 @@ class ActivityIndexPage(CFGOVPage):
             'expanded_facets': expanded_facets,
         })
         self.results = payload
-        results_per_page = validate_results_per_page(request)
         paginator = Paginator(payload['results'], results_per_page)
         current_page = validate_page_number(request, paginator)
         paginated_page = paginator.page(current_page)
@@ -220,45 +229,103 @@ class ActivityIndexPage(CFGOVPage):
         verbose_name = "TDP Activity search page"
 
 
+def search_activities(search_query, selected_facets, start, size):
+    """Search for one page of activities.
+
+    Returns a list of the activity IDs on the page, the total number of
+    matching activities and the facet counts, all from a single
+    Elasticsearch request. Results are cached briefly by normalized query
+    and facet selection.
+    """
+    search_query = normalize_term(search_query)
+    key = (
+        search_query,
+        tuple(sorted(
+            (facet, tuple(sorted(pks)))
+            for facet, pks in selected_facets.items()
+        )),
+        start,
+        size,
+    )
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
+    dsl_search = ActivityPageDocument().search()
+    if search_query:
+        terms = search_query.split()
+        for term in terms:
+            dsl_search = dsl_search.query(
+                "bool",
+                must=Q("multi_match", query=term, fields=SEARCH_FIELDS)
+            )
+    else:
+        dsl_search = dsl_search.sort('-date')
+    for facet, pks in selected_facets.items():
+        dsl_search = dsl_search.query(
+            "bool",
+            should=[Q("match", **{facet: pk}) for pk in pks]
+        )
+    dsl_search = dsl_search.update_from_dict(FACET_DICT)
+    dsl_search = dsl_search.extra(track_total_hits=True)[start:start + size]
+    response = dsl_search.execute()
+
+    facet_counts = {
+        facet: [
+            {'key': bucket['key'], 'doc_count': bucket['doc_count']}
+            for bucket in getattr(
+                response.aggregations, f"{facet}_terms"
+            ).buckets
+        ]
+        for facet in FACET_LIST
+    }
+    result = (
+        [str(hit.id) for hit in response],
+        hits_total(response),
+        facet_counts,
+    )
+    search_cache.set(key, result)
+    return result
+
+
 def parse_dsl_facets(all_facets, facet_counts, selected_facets):
+    """Mark selected facets and drop those that no results have.
+
+    Facets are looked up by ID in sets, and updated facets are copies, so
+    the shared facet setup that all_facets came from is left untouched.
+    """
     for facet, facet_config in FACET_MAP:
-        returned_facet_ids = [hit['key'] for hit in facet_counts[facet]]
+        returned_facet_ids = {hit['key'] for hit in facet_counts[facet]}
         is_nested = facet_config[1]
-        selections = selected_facets.get(facet, '')
+        selections = set(selected_facets.get(facet, []))
         if is_nested:
-            for pi, parent in enumerate(all_facets[facet]):
-                if parent['id'] in selections:
-                    parent['selected'] = True
-                    parent['child_selected'] = True
-                    for i, child in enumerate(parent['children']):
-                        child['selected'] = True
-                else:
-                    for i, child in enumerate(parent['children']):
-                        if selections and child['id'] in selections:
-                            child['selected'] = True
-                            parent['child_selected'] = True
-                all_facets[facet][pi].update(parent)
-            for pi, parent in enumerate(all_facets[facet]):
-                for child in parent['children']:
-                    if child['id'] not in returned_facet_ids:
-                        parent['children'].remove(child)
-                all_facets[facet][pi].update(parent)
+            parents = []
             for parent in all_facets[facet]:
-                if not parent['children']:
-                    all_facets[facet].remove(parent)
+                parent = dict(parent)
+                children = []
+                for child in parent['children']:
+                    if parent['id'] in selections:
+                        parent['selected'] = True
+                        parent['child_selected'] = True
+                        child = dict(child, selected=True)
+                    elif child['id'] in selections:
+                        parent['child_selected'] = True
+                        child = dict(child, selected=True)
+                    if child['id'] in returned_facet_ids:
+                        children.append(child)
+                parent['children'] = children
+                if children:
+                    parents.append(parent)
+            all_facets[facet] = parents
         else:
-            for i, flat_facet in enumerate(all_facets[facet]):
-                flat_id = flat_facet['id']
-                if selections and flat_id in selections:
-                    flat_facet['selected'] = True
-                    all_facets[facet][i].update(flat_facet)
+            flat_facets = []
             for flat_facet in all_facets[facet]:
                 flat_id = flat_facet['id']
-                if (
-                        flat_id not in returned_facet_ids
-                        and flat_id not in selections
-                ):
-                    all_facets[facet].remove(flat_facet)
+                if flat_id in selections:
+                    flat_facet = dict(flat_facet, selected=True)
+                if flat_id in returned_facet_ids or flat_id in selections:
+                    flat_facets.append(flat_facet)
+            all_facets[facet] = flat_facets
     return all_facets
 
 
@@ -362,7 +429,7 @@ class ActivitySetUp(models.Model):
             _card_setup.update({str(activity.pk): payload})
         self.card_setup = _card_setup
 
-    @property
+    @cached_property
     def ordered_cards(self):
         return OrderedDict({
             str(pk): self.card_setup[str(pk)] for pk in self.card_order
@@ -373,15 +440,30 @@ class ActivitySetUp(models.Model):
         self.update_cards()
         self.save()
 
+    def save(self, *args, **kwargs):
+        super(ActivitySetUp, self).save(*args, **kwargs)
+        self.__dict__.pop('ordered_cards', None)
+        setup_cache.clear()
+
 
 def get_activity_setup(refresh=False):
-    if not ActivitySetUp.objects.exists():
-        ActivitySetUp().update_setups()
-        return ActivitySetUp.objects.first()
+    """Return the activity setup, creating it if there isn't one.
+
+    The setup is kept in memory for a few minutes instead of being loaded
+    from the database for every request. Saving an ActivitySetUp drops
+    this process's copy; other processes pick it up when theirs expires.
+    """
+    if not refresh:
+        map_obj = setup_cache.get('setup')
+        if map_obj is not None:
+            return map_obj
     map_obj = ActivitySetUp.objects.first()
-    if refresh:
+    if map_obj is None:
+        map_obj = ActivitySetUp()
+        map_obj.update_setups()
+    elif refresh:
         map_obj.update_setups()
-        map_obj.refresh_from_db()
+    setup_cache.set('setup', map_obj)
     return map_obj
 
 
@@ -406,11 +488,7 @@ def validate_page_number(request, paginator):
     This should catch invalid page numbers and always return
     a valid page number, defaulting to 1.
     """
-    raw_page = request.GET.get('page', 1)
-    try:
-        page_number = int(raw_page)
-    except ValueError:
-        page_number = 1
+    page_number = get_page_number(request, paginator.per_page)
     try:
         paginator.page(page_number)
     except InvalidPage:
@@ -1,3 +1,4 @@
+import copy
 from collections import OrderedDict
 from unittest import mock
 
@@ -20,7 +21,8 @@ from teachers_digital_platform.models import (
     ActivityTeachingStrategy, ActivityTopic, ActivityType, get_activity_setup
 )
 from teachers_digital_platform.models.activity_index_page import (
-    Paginator, parse_dsl_facets, validate_page_number
+    Paginator, parse_dsl_facets, search_cache, setup_cache,
+    validate_page_number
 )
 from v1.models import HomePage
 
@@ -71,6 +73,8 @@ class ActivitySetUpTests(TestCase):
     fixtures = ['tdp_initial_data']
 
     def setUp(self):
+        search_cache.clear()
+        setup_cache.clear()
         self.doc = baker.make(Document, pk=1)
         self.home_page = HomePage.objects.get(slug='cfgov')
         self.home_page.save_revision().publish()
@@ -252,6 +256,106 @@ class ActivitySetUpTests(TestCase):
             response.content.decode('utf8')
         )
 
+    def test_dsl_facet_parsing_leaves_setup_untouched(self):
+        setup = get_activity_setup(refresh=True)
+        original_facets = copy.deepcopy(setup.facet_setup)
+        facet_counts = {facet: [] for facet in FACET_LIST}
+        facet_counts['school_subject'] = [{"key": "2", "doc_count": 1}]
+        facet_counts['topic'] = [{"key": "14", "doc_count": 1}]
+        all_facets = parse_dsl_facets(
+            copy.copy(setup.facet_setup),
+            facet_counts,
+            {"topic": ["14"], "grade_level": ["1"]}
+        )
+        self.assertEqual(setup.facet_setup, original_facets)
+        # Facets without results are all dropped, not just every other one.
+        self.assertEqual(
+            [facet['id'] for facet in all_facets['school_subject']], ["2"]
+        )
+        self.assertEqual(
+            [facet['id'] for facet in all_facets['grade_level']], ["1"]
+        )
+        self.assertTrue(all_facets['grade_level'][0]['selected'])
+        self.assertEqual(len(all_facets['topic']), 1)
+        parent = all_facets['topic'][0]
+        self.assertTrue(parent['child_selected'])
+        self.assertEqual(
+            [(child['id'], child['selected']) for child in parent['children']],
+            [("14", True)]
+        )
+
+    @mock.patch.object(ActivityPageDocument, 'search')
+    def test_search_fetches_page_and_facets_in_one_request(
+        self, mock_search
+    ):
+        get_activity_setup(refresh=True)
+        dsl_search = mock_search.return_value
+        for method in ['query', 'sort', 'update_from_dict', 'extra',
+                       '__getitem__']:
+            getattr(dsl_search, method).return_value = dsl_search
+        mock_hit = mock.Mock()
+        mock_hit.id = self.activity_page.pk
+        mock_response = mock.MagicMock()
+        mock_response.__iter__.return_value = iter([mock_hit])
+        mock_response.hits.total = mock.Mock(value=6)
+        getattr(mock_response.aggregations, 'topic_terms').buckets = [
+            {'key': '14', 'doc_count': 1}
+        ]
+        dsl_search.execute.return_value = mock_response
+
+        response = self.client.get(
+            self.search_page.url, {'q': 'Savings', 'topic': '14'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dsl_search.execute.call_count, 1)
+        dsl_search.__getitem__.assert_called_once_with(slice(0, 5))
+        self.assertEqual(response.context_data['total_results'], 6)
+        self.assertEqual(response.context_data['paginator'].num_pages, 2)
+        self.assertEqual(
+            [card['title'] for card in response.context_data['activities']],
+            [self.activity_page.title]
+        )
+
+        # The same search, differently spelled, is served from the cache.
+        self.client.get(
+            self.search_page.url, {'q': ' savings ', 'topic': '14'}
+        )
+        self.assertEqual(dsl_search.execute.call_count, 1)
+
+    @mock.patch.object(ActivityPageDocument, 'search')
+    def test_search_page_past_result_window_shows_first_page(
+        self, mock_search
+    ):
+        get_activity_setup(refresh=True)
+        dsl_search = mock_search.return_value
+        for method in ['query', 'sort', 'update_from_dict', 'extra',
+                       '__getitem__']:
+            getattr(dsl_search, method).return_value = dsl_search
+        mock_response = mock.MagicMock()
+        mock_response.__iter__.return_value = iter([])
+        mock_response.hits.total = mock.Mock(value=0)
+        dsl_search.execute.return_value = mock_response
+
+        response = self.client.get(
+            self.search_page.url, {'q': 'Savings', 'page': '99999999'}
+        )
+        self.assertEqual(response.status_code, 200)
+        dsl_search.__getitem__.assert_called_once_with(slice(0, 5))
+        self.assertEqual(response.context_data['current_page'], 1)
+
+    def test_activity_setup_is_cached(self):
+        setup = get_activity_setup()
+        with self.assertNumQueries(0):
+            cached_setup = get_activity_setup()
+        self.assertEqual(cached_setup.card_setup, setup.card_setup)
+
+        # Saving the setup drops the cached copy.
+        setup.card_order = []
+        setup.save()
+        reloaded = get_activity_setup()
+        self.assertIsNot(reloaded, setup)
+        self.assertEqual(reloaded.card_order, [])
+
     def test_taxonomy_model_str(self):
         taxonomy_instance = ActivityBuildingBlock.objects.first()
         self.assertEqual(
@@ -285,6 +389,7 @@ class TestActivityIndexPageSearch(TestCase):
 
     def setUp(self):
         # super(TestActivityIndexPageSearch, self).setUp()
+        setup_cache.clear()
         self.root_page = HomePage.objects.get(slug='cfgov')
         self.root_page.save_revision().publish()
         self.site = Site.objects.get(is_default_site=True)